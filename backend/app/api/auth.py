@@ -1,26 +1,33 @@
 """
 用戶認證相關 API 路由
 """
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import Dict, Optional
 from datetime import timedelta
 from psycopg2.extras import RealDictCursor
+import logging
 
 from ..core.database import get_db
+from ..core.async_database import fetch_one
 from ..core.security import (
-    verify_password,
-    get_password_hash,
+    verify_password_async,
+    get_password_hash_async,
     create_access_token,
     decode_access_token,
+    client_key,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from ..services.user_cache import get_user_cache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 # OAuth2 配置
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
 
 class UserCreate(BaseModel):
@@ -81,10 +88,27 @@ def get_user_by_email(db, email: str):
     return result
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db = Depends(get_db)
-):
+async def fetch_user_by_username(username: str):
+    """根據用戶名獲取用戶 (非同步讀取，不佔用事件迴圈)"""
+    return await fetch_one("""
+        SELECT id, username, email, hashed_password, full_name, is_active,
+               created_at::text as created_at
+        FROM users
+        WHERE username = $1
+    """, username)
+
+
+async def fetch_user_profile(username: str):
+    """根據用戶名獲取用戶 (不含密碼哈希，供認證快取使用)"""
+    return await fetch_one("""
+        SELECT id, username, email, full_name, is_active,
+               created_at::text as created_at
+        FROM users
+        WHERE username = $1
+    """, username)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     """獲取當前登入用戶"""
     payload = decode_access_token(token)
 
@@ -96,17 +120,51 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user = get_user_by_username(db, username)
+    cache = get_user_cache()
+    user = cache.get(username)
     if user is None:
+        version = cache.version()
+        user = await fetch_user_profile(username)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="使用者不存在或已被刪除，請重新登入",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        cache.put(username, user, version)
+
+    if not user['is_active']:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="使用者不存在或已被刪除，請重新登入",
+            detail="帳號已停用，請聯絡管理員",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
     return user
 
 
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[Dict]:
+    """已登入時回傳用戶，未登入或 Token 無效時為 None (不拒絕請求)"""
+    if not token:
+        return None
+    try:
+        return await get_current_user(token)
+    except HTTPException:
+        return None
+
+
+async def get_client_key(
+    request: Request,
+    token: Optional[str] = Depends(optional_oauth2_scheme)
+) -> str:
+    """
+    識別呼叫者 (用於配額)：有效 Token 為 user:<username>，否則為 ip:<client ip>
+
+    不查詢資料庫，也不因 Token 無效而拒絕請求
+    """
+    return client_key(token, request.client.host if request.client else None)
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(user: UserCreate, db = Depends(get_db)):
     """用戶註冊"""
@@ -127,7 +185,7 @@ async def register(user: UserCreate, db = Depends(get_db)):
 
         # 創建新用戶
         cursor = db.cursor(cursor_factory=RealDictCursor)
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash_async(user.password)
 
         cursor.execute("""
             INSERT INTO users (username, email, hashed_password, full_name)
@@ -144,7 +202,7 @@ async def register(user: UserCreate, db = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Registration error: {str(e)}")
+        logger.error(f"Registration error: {e}", extra={'username': user.username})
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Registration failed: {str(e)}"
@@ -152,16 +210,13 @@ async def register(user: UserCreate, db = Depends(get_db)):
 
 
 @router.post("/login", response_model=Token)
-async def login(
-    form_data: OAuth2PasswordRequestForm = Depends(),
-    db = Depends(get_db)
-):
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """用戶登入"""
     # 獲取用戶
-    user = get_user_by_username(db, form_data.username)
+    user = await fetch_user_by_username(form_data.username)
 
     # 驗證用戶和密碼
-    if not user or not verify_password(form_data.password, user['hashed_password']):
+    if not user or not await verify_password_async(form_data.password, user['hashed_password']):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -1,18 +1,57 @@
 """
 回測相關 API 路由
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
-from psycopg2.extras import RealDictCursor
+from typing import AsyncIterator, Callable, Dict, FrozenSet, List, Optional, Tuple
+import numpy as np
 import pandas as pd
-from datetime import datetime
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from datetime import timedelta
 
-from ..core.database import get_db
+from ..core.async_database import fetch_all
+from ..core.database import db_connection
+from ..core.encoding import encoded_response, sse_event
+from ..core.metrics import BACKTEST_BARS, BACKTEST_BARS_PER_SECOND, BACKTEST_DURATION
 from ..services.stock_crawler import StockCrawler
 from ..services.backtest_engine import BacktestEngine
+from ..services.indicators import IndicatorCache, IndicatorKey
+from ..services.price_loader import arrays_to_frame, load_price_arrays
+from ..services.bar_aggregator import TIMEFRAMES, bars_per_session, query_bars
+from ..services.trading_calendar import get_trading_calendar
+from ..services.single_flight import get_single_flight
+from ..services.backtest_executor import (
+    BacktestQueueFull,
+    BacktestUserLimitExceeded,
+    get_backtest_executor,
+)
+from ..services.backtest_history import get_backtest, list_backtests, save_backtest
+from ..services.data_versions import get_price_range_version
+from ..services.result_cache import get_result_cache, result_key
+from .auth import get_client_key, get_current_user, get_optional_user
+from .stocks import parse_date
+from ..core.config import settings
 
 router = APIRouter(prefix="/api/backtest", tags=["backtest"])
+logger = logging.getLogger(__name__)
+
+# 並行中的相同抓取 / 相同回測只執行一次 (回測的所有用戶端都斷線時取消)
+fetch_flight = get_single_flight("stock_fetch")
+backtest_flight = get_single_flight("backtest", cancel_abandoned=True)
+
+SUPPORTED_STRATEGIES = ("moving_average", "rsi", "macd", "bollinger_bands", "grid_trading")
+
+# 休市日資料涵蓋範圍之前的區間無法精確計算交易日數，改以平日數估計：
+# 筆數需達平日數的 UNCOVERED_WEEKDAY_RATIO (每年休市的平日約 15~20 天)，
+# 短區間另外容許 UNCOVERED_HOLIDAY_SLACK 個平日 (農曆春節等連續休市)
+UNCOVERED_WEEKDAY_RATIO = 0.9
+UNCOVERED_HOLIDAY_SLACK = 10
 
 
 class BacktestRequest(BaseModel):
@@ -22,6 +61,7 @@ class BacktestRequest(BaseModel):
     end_date: str
     initial_capital: float = 100000
     strategy_type: str = "moving_average"
+    interval: str = "1d"  # 1d 日 K；1m / 5m / 15m 為由逐筆彙整的盤中 K 線
 
     # Moving Average
     short_period: Optional[int] = 5
@@ -48,140 +88,760 @@ class BacktestRequest(BaseModel):
     grid_investment_per_grid: Optional[float] = 10000
 
 
+def request_hash(request: BacktestRequest) -> str:
+    """回測請求的標準化雜湊 (欄位排序後的 JSON)"""
+    canonical = json.dumps(request.model_dump(), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+async def query_price_frame(symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """從資料庫讀取區間內的日 K 線 (二進位 COPY 直接解碼為欄位陣列)"""
+    arrays = await load_price_arrays(symbol, parse_date(start_date), parse_date(end_date))
+    return arrays_to_frame(arrays)
+
+
+async def fetch_and_store(symbol: str, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
+    """
+    抓取並存入資料庫
+
+    同一 (symbol, 區間) 的並行請求只會抓取、寫入一次
+    """
+    async def work():
+        df = await asyncio.to_thread(StockCrawler.fetch_stock_data, symbol, start_date, end_date)
+        if df is None or df.empty:
+            return df
+        with db_connection() as conn:
+            summary = StockCrawler.ingest(conn, symbol, df)
+        logger.info("Fetched prices", extra={
+            'symbol': symbol, 'saved': summary['saved'], 'quarantined': summary['quarantined']
+        })
+        return summary['data']
+
+    return await fetch_flight.do((symbol, start_date, end_date), work)
+
+
+def load_intraday_bars(request: BacktestRequest) -> pd.DataFrame:
+    """讀取盤中 K 線 (只來自匯入的逐筆資料，不會自動抓取)"""
+    if request.interval not in TIMEFRAMES:
+        raise HTTPException(status_code=400, detail=f"Unsupported interval: {request.interval}")
+
+    with db_connection() as conn:
+        df = query_bars(conn, request.symbol, request.interval, request.start_date, request.end_date)
+    logger.debug("Loaded intraday bars", extra={'interval': request.interval, 'bars': len(df)})
+    if df.empty:
+        raise HTTPException(status_code=404, detail="查無盤中 K 線資料，請先匯入逐筆資料")
+    return df
+
+
+def has_price_coverage(df: pd.DataFrame, start_date: str, end_date: str) -> bool:
+    """
+    資料庫中的日 K 是否足以涵蓋區間
+
+    休市日資料涵蓋的部分依交易日曆計算應有的交易日數 (排除週末、休市日與尚未收盤的今日)，
+    筆數需達 DATA_COVERAGE_RATIO；更早的部分沒有休市日資料，筆數需達該段平日數的
+    UNCOVERED_WEEKDAY_RATIO (短區間容許 UNCOVERED_HOLIDAY_SLACK 個平日)，
+    國定假日不會被當成缺漏，缺少的年份仍會重新抓取
+    """
+    calendar = get_trading_calendar()
+    start = parse_date(start_date)
+    last_session = min(parse_date(end_date), calendar.last_completed_session())
+    covered_start = max(start, calendar.first_day)
+    dates = df['date'].to_numpy()
+    covered_rows = int(np.count_nonzero(dates >= covered_start.isoformat()))
+
+    if start < covered_start:
+        uncovered_end = min(covered_start - timedelta(days=1), last_session)
+        weekdays = calendar.count_sessions(start, uncovered_end)
+        required = min(weekdays * UNCOVERED_WEEKDAY_RATIO, weekdays - UNCOVERED_HOLIDAY_SLACK)
+        if len(df) - covered_rows < required:
+            return False
+
+    expected_sessions = calendar.count_sessions(covered_start, last_session) if covered_start <= last_session else 0
+    logger.debug("Loaded daily bars", extra={'bars': len(df), 'expected_sessions': expected_sessions})
+    return covered_rows >= expected_sessions * settings.DATA_COVERAGE_RATIO
+
+
+async def load_price_data(request: BacktestRequest) -> pd.DataFrame:
+    """取得回測所需的價格資料 (日 K 資料庫不足時自動抓取)"""
+    if request.interval != "1d":
+        return await asyncio.to_thread(load_intraday_bars, request)
+
+    # 步驟 1: 從資料庫獲取資料
+    df = await query_price_frame(request.symbol, request.start_date, request.end_date)
+
+    # 步驟 2: 如果資料不足，爬取新資料
+    if df.empty or not has_price_coverage(df, request.start_date, request.end_date):
+        logger.debug("Insufficient price data, fetching", extra={'symbol': request.symbol})
+        df = await fetch_and_store(request.symbol, request.start_date, request.end_date)
+
+        if df is None or df.empty:
+            raise HTTPException(status_code=404, detail="無法獲取股票資料")
+        return df
+
+    fetch_flight.record_hit()
+    return df
+
+
+def run_strategy(request: BacktestRequest, df: pd.DataFrame, indicators: Optional[IndicatorCache] = None) -> Dict:
+    """依策略類型執行回測 (indicators 為同一份資料上與其他策略共用的指標快取)"""
+    # 步驟 3: 執行回測 (在工作者中執行，不記錄日誌)
+    periods_per_year = 252 if request.interval == "1d" else 252 * bars_per_session(request.interval)
+    engine = BacktestEngine(
+        initial_capital=request.initial_capital,
+        periods_per_year=periods_per_year,
+        indicators=indicators
+    )
+
+    if request.strategy_type == "moving_average":
+        results = engine.run_ma_strategy(
+            df,
+            short_period=request.short_period,
+            long_period=request.long_period
+        )
+    elif request.strategy_type == "rsi":
+        results = engine.run_rsi_strategy(
+            df,
+            rsi_period=request.rsi_period,
+            rsi_overbought=request.rsi_overbought,
+            rsi_oversold=request.rsi_oversold
+        )
+    elif request.strategy_type == "macd":
+        results = engine.run_macd_strategy(
+            df,
+            macd_fast=request.macd_fast,
+            macd_slow=request.macd_slow,
+            macd_signal=request.macd_signal
+        )
+    elif request.strategy_type == "bollinger_bands":
+        results = engine.run_bollinger_bands_strategy(
+            df,
+            bb_period=request.bb_period,
+            bb_std_dev=request.bb_std_dev
+        )
+    elif request.strategy_type == "grid_trading":
+        results = engine.run_grid_trading_strategy(
+            df,
+            grid_lower_price=request.grid_lower_price,
+            grid_upper_price=request.grid_upper_price,
+            grid_num_grids=request.grid_num_grids,
+            grid_investment_per_grid=request.grid_investment_per_grid
+        )
+    else:
+        raise HTTPException(status_code=400, detail=f"Unsupported strategy type: {request.strategy_type}")
+
+    return results
+
+
+def strategy_indicators(request: BacktestRequest) -> FrozenSet[IndicatorKey]:
+    """策略需要的技術指標 (用於分組與預先計算)"""
+    if request.strategy_type == "moving_average":
+        return frozenset({('sma', request.short_period), ('sma', request.long_period)})
+    if request.strategy_type == "rsi":
+        return frozenset({('rsi', request.rsi_period)})
+    if request.strategy_type == "macd":
+        return frozenset({('macd', request.macd_fast, request.macd_slow, request.macd_signal)})
+    if request.strategy_type == "bollinger_bands":
+        return frozenset({('sma', request.bb_period), ('rolling_std', request.bb_period)})
+    return frozenset()
+
+
+def compute_indicators(df: pd.DataFrame, keys: List[IndicatorKey]) -> IndicatorCache:
+    """一次計算所有策略需要的指標"""
+    return IndicatorCache(df).compute(keys)
+
+
+# 策略比較表的欄位 (不含交易明細與資金曲線)
+COMPARISON_FIELDS = (
+    'initial_capital', 'final_value', 'total_return', 'buy_hold_return', 'sharpe_ratio',
+    'max_drawdown', 'total_trades', 'win_rate',
+)
+
+
+def run_strategy_group(requests: List[BacktestRequest], df: pd.DataFrame, indicators: IndicatorCache) -> List[Dict]:
+    """
+    在同一個工作者中依序執行一組策略 (共用指標快取)
+
+    Returns:
+        每個策略的績效摘要；失敗的策略為 {'error': 訊息}
+    """
+    summaries = []
+    for request in requests:
+        try:
+            results = run_strategy(request, df, indicators)
+            summaries.append({field: results[field] for field in COMPARISON_FIELDS})
+        except Exception as e:
+            summaries.append({'error': getattr(e, 'detail', None) or str(e)})
+    return summaries
+
+
+def backtest_error_detail(e: Exception) -> str:
+    """回測執行器例外轉為回報給用戶端的訊息"""
+    if isinstance(e, BacktestUserLimitExceeded):
+        return f"同時進行的回測已達上限 ({settings.BACKTEST_MAX_PER_USER})，請稍後再試"
+    if isinstance(e, BacktestQueueFull):
+        return "回測佇列已滿，請稍後再試"
+    if isinstance(e, asyncio.TimeoutError):
+        return f"回測逾時 (超過 {settings.BACKTEST_TIMEOUT_SECONDS:g} 秒)"
+    return getattr(e, 'detail', None) or str(e)
+
+
+async def execute_backtest(request: BacktestRequest, client_key: str) -> Dict:
+    """
+    載入資料並在回測執行器中計算 (不佔用事件迴圈)
+
+    日 K 回測先查結果快取，鍵包含回測區間的價格資料版本；盤中 K 線由逐筆資料即時彙整，
+    沒有版本可依循，不快取
+    """
+    cache = get_result_cache()
+    key = None
+    if request.interval == "1d":
+        start, end = parse_date(request.start_date), parse_date(request.end_date)
+        version = await get_price_range_version(request.symbol, start, end)
+        key = result_key(request_hash(request), version)
+        cached = await asyncio.to_thread(cache.get, key) if cache.disk_dir else cache.get(key)
+        if cached is not None:
+            return cached
+
+    df = await load_price_data(request)
+    if key is not None:
+        # 資料不足時 load_price_data 會抓取並寫入，版本隨之改變；結果以寫入後的版本保存，
+        # 下一次相同請求才會命中
+        fetched_version = await get_price_range_version(request.symbol, start, end)
+        if fetched_version != version:
+            key = result_key(request_hash(request), fetched_version)
+
+    results, seconds = await get_backtest_executor().run_timed(client_key, run_strategy, request, df)
+    BACKTEST_DURATION.observe(seconds, request.strategy_type)
+    BACKTEST_BARS.inc(request.strategy_type, amount=len(df))
+    if seconds > 0:
+        BACKTEST_BARS_PER_SECOND.observe(len(df) / seconds, request.strategy_type)
+    if key is not None:
+        if cache.disk_dir:
+            await asyncio.to_thread(cache.put, key, results)
+        else:
+            cache.put(key, results)
+    return results
+
+
+async def cancel_on_disconnect(http_request: Request, task: asyncio.Future):
+    """
+    等待工作完成；用戶端斷線時取消工作
+
+    請求內容已讀完，之後 receive() 收到的下一個訊息就是 http.disconnect
+    """
+    watcher = asyncio.ensure_future(http_request.receive())
+    try:
+        done, _ = await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if task not in done and watcher.result().get('type') == 'http.disconnect':
+            task.cancel()
+            logger.info("Client disconnected, backtest cancelled")
+            raise HTTPException(status_code=499, detail="用戶端已中斷連線")
+        return await task
+    finally:
+        watcher.cancel()
+
+
+def persist_backtest(user_id: int, request: BacktestRequest, results: Dict) -> int:
+    """寫入回測歷史記錄 (在執行緒中呼叫)"""
+    with db_connection() as conn:
+        return save_backtest(conn, user_id, request.model_dump(), results)
+
+
 @router.post("/run")
 async def run_backtest(
     request: BacktestRequest,
-    db = Depends(get_db)
+    http_request: Request,
+    client_key: str = Depends(get_client_key),
+    current_user = Depends(get_optional_user)
 ):
-    """執行回測"""
-    try:
-        print(f"\n{'='*60}")
-        print(f"Start Backtest")
-        print(f"{'='*60}")
-        print(f"Symbol: {request.symbol}")
-        print(f"Date range: {request.start_date} to {request.end_date}")
-        print(f"Initial capital: NT$ {request.initial_capital:,.0f}")
-        print(f"Strategy: {request.strategy_type}")
-
-        # 步驟 1: 從資料庫獲取資料
-        print(f"\nStep 1: Check database...")
-        cursor = db.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("""
-            SELECT date::text as date, open, high, low, close, volume
-            FROM stock_prices
-            WHERE symbol = %s AND date >= %s AND date <= %s
-            ORDER BY date ASC
-        """, (request.symbol, request.start_date, request.end_date))
-
-        rows = cursor.fetchall()
-        cursor.close()
-        print(f"   Found {len(rows)} records in database")
-
-        # 步驟 2: 如果資料不足，爬取新資料
-        if len(rows) < 30:
-            print(f"\nStep 2: Insufficient data, fetching...")
-            df = StockCrawler.fetch_stock_data(
-                request.symbol,
-                request.start_date,
-                request.end_date
-            )
+    """
+    執行回測
 
-            if df is None or df.empty:
-                raise HTTPException(status_code=404, detail="無法獲取股票資料")
+    回應依 Accept 標頭編碼：預設為 JSON，application/msgpack 時資金曲線與 OHLCV
+    陣列以原始 float64 / int64 位元組傳送。
+    已登入時結果寫入回測歷史記錄，回應包含 backtest_id (寫入失敗不影響回測結果)
+    """
+    if request.strategy_type not in SUPPORTED_STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"Unsupported strategy type: {request.strategy_type}")
 
-            # 存入資料庫
-            saved_count = StockCrawler.save_to_db(db, request.symbol, df)
-            print(f"   Saved {saved_count} records")
+    try:
+        logger.debug("Backtest started", extra={
+            'symbol': request.symbol, 'start_date': request.start_date, 'end_date': request.end_date,
+            'strategy_type': request.strategy_type, 'interval': request.interval,
+        })
 
-        else:
-            print(f"   Using existing database data")
-            # 將資料庫資料轉換為 DataFrame
-            df = pd.DataFrame(rows)
-            # 轉換數值欄位為 float，避免 Decimal 與 float 混算錯誤
-            numeric_cols = ['open', 'high', 'low', 'close', 'volume']
-            for col in numeric_cols:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-
-        # 步驟 3: 執行回測
-        print(f"\nStep 3: Running backtest strategy...")
-        engine = BacktestEngine(initial_capital=request.initial_capital)
-
-        if request.strategy_type == "moving_average":
-            print(f"   Strategy params: short={request.short_period}days, long={request.long_period}days")
-            results = engine.run_ma_strategy(
-                df,
-                short_period=request.short_period,
-                long_period=request.long_period
-            )
-        elif request.strategy_type == "rsi":
-            print(f"   Strategy params: period={request.rsi_period}, overbought={request.rsi_overbought}, oversold={request.rsi_oversold}")
-            results = engine.run_rsi_strategy(
-                df,
-                rsi_period=request.rsi_period,
-                rsi_overbought=request.rsi_overbought,
-                rsi_oversold=request.rsi_oversold
-            )
-        elif request.strategy_type == "macd":
-            print(f"   Strategy params: fast={request.macd_fast}, slow={request.macd_slow}, signal={request.macd_signal}")
-            results = engine.run_macd_strategy(
-                df,
-                macd_fast=request.macd_fast,
-                macd_slow=request.macd_slow,
-                macd_signal=request.macd_signal
-            )
-        elif request.strategy_type == "bollinger_bands":
-            print(f"   Strategy params: period={request.bb_period}, std_dev={request.bb_std_dev}")
-            results = engine.run_bollinger_bands_strategy(
-                df,
-                bb_period=request.bb_period,
-                bb_std_dev=request.bb_std_dev
-            )
-        elif request.strategy_type == "grid_trading":
-            print(f"   Strategy params: grids={request.grid_num_grids}, range={request.grid_lower_price}-{request.grid_upper_price}, investment per grid={request.grid_investment_per_grid}")
-            results = engine.run_grid_trading_strategy(
-                df,
-                grid_lower_price=request.grid_lower_price,
-                grid_upper_price=request.grid_upper_price,
-                grid_num_grids=request.grid_num_grids,
-                grid_investment_per_grid=request.grid_investment_per_grid
-            )
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported strategy type: {request.strategy_type}")
+        # 同一呼叫者的相同請求同時進行時只計算一次；鍵包含 client_key，
+        # 不同用戶的相同請求各自計入自己的並行上限 (結果由回測結果快取共用)
+        task = asyncio.ensure_future(
+            backtest_flight.do((client_key, request_hash(request)), lambda: execute_backtest(request, client_key))
+        )
+        results = await cancel_on_disconnect(http_request, task)
 
         # 步驟 4: 回傳結果
-        print(f"\nBacktest completed!")
-        print(f"{'='*60}")
-        print(f"Backtest Results Summary")
-        print(f"{'='*60}")
-        print(f"Initial capital: NT$ {results['initial_capital']:,.0f}")
-        print(f"Final value: NT$ {results['final_value']:,.0f}")
-        print(f"Total return: {results['total_return']:.2f}%")
-        print(f"Buy & hold: {results['buy_hold_return']:.2f}%")
-        print(f"Sharpe ratio: {results['sharpe_ratio']:.2f}")
-        print(f"Max drawdown: {results['max_drawdown']:.2f}%")
-        print(f"Total trades: {results['total_trades']}")
-        print(f"Win rate: {results['win_rate']:.2f}%")
-        print(f"{'='*60}\n")
+        logger.info("Backtest completed", extra={
+            'symbol': request.symbol, 'strategy_type': request.strategy_type,
+            'total_return': round(float(results['total_return']), 2),
+            'total_trades': int(results['total_trades']),
+        })
 
-        return {
+        backtest_id = None
+        if current_user is not None:
+            try:
+                backtest_id = await asyncio.to_thread(persist_backtest, current_user['id'], request, results)
+            except Exception as e:
+                logger.warning(f"Failed to save backtest history: {e}")
+
+        return encoded_response(http_request, {
             'success': True,
             'message': '回測完成',
+            'backtest_id': backtest_id,
             'results': results
-        }
+        })
 
     except HTTPException:
         raise
+    except BacktestUserLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=backtest_error_detail(e))
+    except BacktestQueueFull as e:
+        raise HTTPException(status_code=503, detail=backtest_error_detail(e))
+    except asyncio.TimeoutError as e:
+        raise HTTPException(status_code=504, detail=backtest_error_detail(e))
     except Exception as e:
-        print(f"\nBacktest failed: {str(e)}")
+        logger.error(f"Backtest failed: {e}", extra={'symbol': request.symbol})
         raise HTTPException(status_code=500, detail=f"回測執行失敗: {str(e)}")
 
 
-@router.get("/history")
-async def get_backtest_history():
-    """取得回測歷史記錄"""
-    # TODO: 實作回測歷史記錄功能
+class StrategyComparisonRequest(BaseModel):
+    """比較已儲存策略的請求模型"""
+    symbol: str
+    start_date: str
+    end_date: str
+    strategy_ids: Optional[List[int]] = None  # 未指定時比較所有已儲存的策略
+    sort_by: str = "total_return"
+
+
+# 可排序的績效欄位 (皆為越大越好；max_drawdown 為負值)
+RANK_METRICS = ("total_return", "sharpe_ratio", "max_drawdown", "win_rate", "final_value")
+
+STRATEGY_PARAMETER_COLUMNS = (
+    'initial_capital', 'short_period', 'long_period',
+    'rsi_period', 'rsi_overbought', 'rsi_oversold',
+    'macd_fast', 'macd_slow', 'macd_signal',
+    'bb_period', 'bb_std_dev',
+    'grid_lower_price', 'grid_upper_price', 'grid_num_grids', 'grid_investment_per_grid',
+)
+
+
+async def load_saved_strategies(user_id: int, strategy_ids: Optional[List[int]] = None) -> List[Dict]:
+    """以單一查詢讀取用戶的策略 (可限定 ID)"""
+    return await fetch_all(f"""
+        SELECT id, name, strategy_type, {', '.join(STRATEGY_PARAMETER_COLUMNS)}
+        FROM strategies
+        WHERE user_id = $1 AND ($2::int[] IS NULL OR id = ANY($2::int[]))
+        ORDER BY id
+    """, user_id, strategy_ids)
+
+
+def saved_strategy_request(strategy: Dict, symbol: str, start_date: str, end_date: str) -> BacktestRequest:
+    """已儲存的策略轉為回測請求 (未設定的參數使用預設值)"""
+    parameters = {
+        column: strategy[column]
+        for column in STRATEGY_PARAMETER_COLUMNS
+        if strategy[column] is not None
+    }
+    return BacktestRequest(
+        symbol=symbol,
+        start_date=start_date,
+        end_date=end_date,
+        strategy_type=strategy['strategy_type'],
+        **parameters
+    )
+
+
+def plan_comparison(
+    strategies: List[Dict],
+    symbol: str,
+    start_date: str,
+    end_date: str
+) -> Tuple[Dict[int, Dict], Dict[FrozenSet[IndicatorKey], List]]:
+    """
+    建立各策略的結果列，並依所需指標將策略分組
+
+    Returns:
+        (策略 ID → 結果列, 指標集合 → [(策略 ID, 回測請求)])；
+        不支援的策略類型直接在結果列記錄 error，不列入分組
+    """
+    rows: Dict[int, Dict] = {}
+    groups: Dict[FrozenSet[IndicatorKey], List] = {}
+    for strategy in strategies:
+        rows[strategy['id']] = {
+            'strategy_id': strategy['id'],
+            'name': strategy['name'],
+            'strategy_type': strategy['strategy_type'],
+        }
+        if strategy['strategy_type'] not in SUPPORTED_STRATEGIES:
+            rows[strategy['id']]['error'] = f"Unsupported strategy type: {strategy['strategy_type']}"
+            continue
+        request = saved_strategy_request(strategy, symbol, start_date, end_date)
+        groups.setdefault(strategy_indicators(request), []).append((strategy['id'], request))
+    return rows, groups
+
+
+async def run_comparison_groups(
+    symbol: str,
+    start_date: str,
+    end_date: str,
+    groups: Dict[FrozenSet[IndicatorKey], List],
+    client_key: str,
+    semaphore: asyncio.Semaphore,
+    on_result: Callable[[int, Dict], None]
+) -> int:
+    """
+    載入價格資料、一次計算所有指標後平行執行各組策略
+
+    每組完成時對組內每個策略呼叫 on_result(策略 ID, 結果摘要)；
+    佔用回測執行器的工作數受 semaphore 限制。同一用戶的其他回測 (例如 /run)
+    佔用額度時等待空出的額度，批次不會中途因用戶上限而失敗
+
+    Returns:
+        實際計算的指標數
+    """
+    if not groups:
+        return 0
+
+    df = await load_price_data(BacktestRequest(symbol=symbol, start_date=start_date, end_date=end_date))
+    executor = get_backtest_executor()
+    indicator_keys = sorted(set().union(*groups), key=repr)
+    async with semaphore:
+        indicators = await executor.run(client_key, compute_indicators, df, indicator_keys, wait_for_slot=True)
+
+    async def run_group(members):
+        async with semaphore:
+            summaries = await executor.run(
+                client_key, run_strategy_group, [request for _, request in members], df, indicators,
+                wait_for_slot=True
+            )
+        for (strategy_id, _), summary in zip(members, summaries):
+            on_result(strategy_id, summary)
+
+    await asyncio.gather(*[run_group(members) for members in groups.values()])
+    return indicators.computed
+
+
+def rank_rows(rows: List[Dict], sort_by: str) -> List[Dict]:
+    """依績效欄位由大到小排名 (沒有該欄位的列排在最後，rank 為 None)"""
+    ranked = sorted(rows, key=lambda row: (sort_by not in row, -row.get(sort_by, 0)))
+    for rank, row in enumerate(ranked, start=1):
+        row['rank'] = rank if sort_by in row else None
+    return ranked
+
+
+@router.post("/compare")
+async def compare_saved_strategies(
+    comparison: StrategyComparisonRequest,
+    current_user = Depends(get_current_user)
+):
+    """
+    以同一檔股票回測用戶所有已儲存的策略並依績效排名
+
+    價格資料只載入一次；策略依所需指標分組，所有指標只計算一次後
+    各組平行執行 (同時進行的組數不超過每位用戶的回測上限)
+    """
+    if comparison.sort_by not in RANK_METRICS:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort_by: {comparison.sort_by}")
+
+    try:
+        strategies = await load_saved_strategies(current_user['id'], comparison.strategy_ids)
+        if not strategies:
+            raise HTTPException(status_code=404, detail="查無已儲存的策略")
+
+        rows, groups = plan_comparison(strategies, comparison.symbol, comparison.start_date, comparison.end_date)
+        indicators_computed = await run_comparison_groups(
+            comparison.symbol, comparison.start_date, comparison.end_date, groups,
+            client_key=f"user:{current_user['username']}",
+            semaphore=asyncio.Semaphore(settings.BACKTEST_MAX_PER_USER),
+            on_result=lambda strategy_id, summary: rows[strategy_id].update(summary)
+        )
+        ranked = rank_rows(list(rows.values()), comparison.sort_by)
+
+        logger.info("Compared strategies", extra={
+            'symbol': comparison.symbol, 'strategies': len(strategies),
+            'indicator_groups': len(groups), 'indicators': indicators_computed,
+        })
+        return {
+            'success': True,
+            'symbol': comparison.symbol,
+            'start_date': comparison.start_date,
+            'end_date': comparison.end_date,
+            'sort_by': comparison.sort_by,
+            'indicator_groups': len(groups),
+            'indicators_computed': indicators_computed,
+            'results': ranked,
+        }
+
+    except HTTPException:
+        raise
+    except BacktestUserLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=backtest_error_detail(e))
+    except BacktestQueueFull as e:
+        raise HTTPException(status_code=503, detail=backtest_error_detail(e))
+    except asyncio.TimeoutError as e:
+        raise HTTPException(status_code=504, detail=backtest_error_detail(e))
+    except Exception as e:
+        logger.error(f"Strategy comparison failed: {e}")
+        raise HTTPException(status_code=500, detail=f"策略比較失敗: {str(e)}")
+
+
+class StreamComparisonRequest(BaseModel):
+    """串流比較的請求模型 (多檔股票 × 已儲存的策略)"""
+    symbols: List[str]
+    start_date: str
+    end_date: str
+    strategy_ids: Optional[List[int]] = None  # 未指定時比較所有已儲存的策略
+    sort_by: str = "total_return"
+
+
+# 進行中的串流工作：job_id → {'owner': 用戶 key, 'cancelled': asyncio.Event}
+# 只存在於執行串流的行程：以多個 worker 執行時，DELETE 需送到同一個 worker
+# (例如負載平衡器依連線黏著)，否則回傳 404；用戶端斷線取消則不受影響
+stream_jobs: Dict[str, Dict] = {}
+
+
+def progress_summary(rows: List[Dict], sort_by: str) -> Dict:
+    """已完成結果的即時統計：目前最佳的一筆與排序欄位的平均值"""
+    scored = [row for row in rows if sort_by in row]
+    if not scored:
+        return {'leader': None, 'average': None}
     return {
-        'message': '功能開發中',
-        'history': []
+        'leader': max(scored, key=lambda row: row[sort_by]),
+        'average': sum(row[sort_by] for row in scored) / len(scored),
     }
+
+
+async def comparison_events(
+    job_id: str,
+    comparison: StreamComparisonRequest,
+    strategies: List[Dict],
+    client_key: str
+) -> AsyncIterator[bytes]:
+    """
+    串流比較的事件產生器
+
+    事件依序為 started → (result + progress)* → done；工作被取消時以 cancelled 結束。
+    產生器被關閉 (用戶端斷線) 或收到取消時，尚未開始的回測會從執行器佇列中撤回。
+    工作在產生器開始執行時才登記到 stream_jobs 並在結束時移除，回應從未送出時不會殘留
+    """
+    started_at = time.perf_counter()
+    cancelled = asyncio.Event()
+    stream_jobs[job_id] = {'owner': client_key, 'cancelled': cancelled}
+    queue: asyncio.Queue = asyncio.Queue()
+    rows: Dict[Tuple[str, int], Dict] = {}
+    reported = set()
+    semaphore = asyncio.Semaphore(settings.BACKTEST_MAX_PER_USER)
+
+    def report(symbol: str, strategy_id: int, summary: Dict):
+        key = (symbol, strategy_id)
+        if key not in reported:
+            reported.add(key)
+            rows[key].update(summary)
+            queue.put_nowait(rows[key])
+
+    async def run_symbol(symbol: str, groups: Dict):
+        try:
+            await run_comparison_groups(
+                symbol, comparison.start_date, comparison.end_date, groups, client_key, semaphore,
+                on_result=lambda strategy_id, summary: report(symbol, strategy_id, summary)
+            )
+        except Exception as e:
+            # 價格載入失敗等：該股票尚未回報的策略都記為錯誤
+            detail = backtest_error_detail(e)
+            for members in groups.values():
+                for strategy_id, _ in members:
+                    report(symbol, strategy_id, {'error': detail})
+
+    tasks = []
+    cancel_wait = asyncio.ensure_future(cancelled.wait())
+    try:
+        for symbol in comparison.symbols:
+            symbol_rows, groups = plan_comparison(strategies, symbol, comparison.start_date, comparison.end_date)
+            for strategy_id, row in symbol_rows.items():
+                rows[(symbol, strategy_id)] = {'symbol': symbol, **row}
+                if 'error' in row:
+                    report(symbol, strategy_id, {})
+            tasks.append(asyncio.create_task(run_symbol(symbol, groups)))
+
+        total = len(rows)
+        yield sse_event('started', {
+            'job_id': job_id,
+            'symbols': comparison.symbols,
+            'strategies': len(strategies),
+            'total': total,
+        })
+
+        completed = 0
+        while completed < total:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {getter, cancel_wait},
+                timeout=settings.BACKTEST_STREAM_HEARTBEAT_SECONDS,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if getter not in done:
+                getter.cancel()
+                if cancel_wait in done:
+                    logger.info("Stream job cancelled", extra={
+                        'job_id': job_id, 'completed': completed, 'total': total
+                    })
+                    yield sse_event('cancelled', {'job_id': job_id, 'completed': completed, 'total': total})
+                    return
+                yield b": keepalive\n\n"
+                continue
+
+            completed += 1
+            yield sse_event('result', getter.result())
+            yield sse_event('progress', {
+                'completed': completed,
+                'total': total,
+                'elapsed_seconds': round(time.perf_counter() - started_at, 3),
+                **progress_summary([rows[key] for key in reported], comparison.sort_by),
+            })
+
+        logger.info("Stream job completed", extra={
+            'job_id': job_id, 'total': total, 'seconds': round(time.perf_counter() - started_at, 2)
+        })
+        yield sse_event('done', {
+            'job_id': job_id,
+            'sort_by': comparison.sort_by,
+            'results': rank_rows(list(rows.values()), comparison.sort_by),
+        })
+    finally:
+        # 斷線 / 取消 / 完成：撤回尚未執行的回測並移除工作
+        cancel_wait.cancel()
+        for task in tasks:
+            task.cancel()
+        stream_jobs.pop(job_id, None)
+
+
+@router.post("/compare/stream")
+async def stream_saved_strategies(
+    comparison: StreamComparisonRequest,
+    current_user = Depends(get_current_user)
+):
+    """
+    以多檔股票回測已儲存的策略，並以 Server-Sent Events 逐筆回傳結果
+
+    事件：
+    - started：job_id 與總筆數
+    - result：一筆 (股票, 策略) 的結果摘要 (完成即送出，不依排名順序)
+    - progress：完成數、經過秒數、目前最佳結果與排序欄位平均值
+    - done：全部完成後的排名
+    - cancelled：工作被取消
+
+    用戶端斷線或呼叫 DELETE /api/backtest/jobs/{job_id} 都會取消工作，
+    尚未開始的回測不再佔用執行器
+    """
+    if comparison.sort_by not in RANK_METRICS:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort_by: {comparison.sort_by}")
+    comparison.symbols = list(dict.fromkeys(comparison.symbols))
+    if not comparison.symbols:
+        raise HTTPException(status_code=400, detail="至少需要一檔股票")
+    if len(comparison.symbols) > settings.BACKTEST_STREAM_MAX_SYMBOLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"單次最多比較 {settings.BACKTEST_STREAM_MAX_SYMBOLS} 檔股票"
+        )
+
+    try:
+        strategies = await load_saved_strategies(current_user['id'], comparison.strategy_ids)
+    except Exception as e:
+        logger.error(f"Load strategies failed: {e}")
+        raise HTTPException(status_code=500, detail=f"讀取策略失敗: {str(e)}")
+    if not strategies:
+        raise HTTPException(status_code=404, detail="查無已儲存的策略")
+
+    client_key = f"user:{current_user['username']}"
+    job_id = uuid.uuid4().hex
+    logger.info("Stream job started", extra={
+        'job_id': job_id, 'symbols': len(comparison.symbols), 'strategies': len(strategies)
+    })
+
+    return StreamingResponse(
+        comparison_events(job_id, comparison, strategies, client_key),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_stream_job(job_id: str, current_user = Depends(get_current_user)):
+    """
+    取消進行中的串流工作 (只能取消自己的工作)
+
+    工作只登記在執行串流的 worker 中，多個 worker 時需送到同一個 worker
+    """
+    job = stream_jobs.get(job_id)
+    if job is None or job['owner'] != f"user:{current_user['username']}":
+        raise HTTPException(status_code=404, detail="查無進行中的工作")
+    job['cancelled'].set()
+    return {'success': True, 'message': '工作已取消', 'job_id': job_id}
+
+
+@router.get("/history")
+async def get_backtest_history(
+    limit: int = 20,
+    before: Optional[int] = None,
+    symbol: Optional[str] = None,
+    current_user = Depends(get_current_user)
+):
+    """
+    取得回測歷史記錄 (由新到舊，只含績效摘要)
+
+    以 before 分頁：傳入上一頁回傳的 next_before 取得下一頁
+    """
+    if not 1 <= limit <= 100:
+        raise HTTPException(status_code=400, detail="limit 需介於 1 到 100")
+
+    try:
+        history = await list_backtests(current_user['id'], limit, before, symbol)
+        return {
+            'success': True,
+            'history': history,
+            'next_before': history[-1]['id'] if len(history) == limit else None,
+        }
+
+    except Exception as e:
+        logger.error(f"Load backtest history failed: {e}")
+        raise HTTPException(status_code=500, detail=f"獲取回測歷史失敗: {str(e)}")
+
+
+@router.get("/history/{backtest_id}")
+async def get_backtest_record(
+    backtest_id: int,
+    http_request: Request,
+    include: str = "",
+    current_user = Depends(get_current_user)
+):
+    """
+    取得單筆回測記錄
+
+    include 以逗號分隔：curve (資金曲線)、transactions (交易明細)；未指定時只回傳摘要與參數。
+    回應依 Accept 標頭編碼 (MessagePack 時資金曲線為 float64 原始位元組)
+    """
+    parts = {part.strip() for part in include.split(',') if part.strip()}
+    unknown = parts - {'curve', 'transactions'}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported include: {', '.join(sorted(unknown))}")
+
+    try:
+        record = await get_backtest(
+            current_user['id'], backtest_id,
+            include_curve='curve' in parts,
+            include_transactions='transactions' in parts
+        )
+    except Exception as e:
+        logger.error(f"Load backtest {backtest_id} failed: {e}")
+        raise HTTPException(status_code=500, detail=f"獲取回測記錄失敗: {str(e)}")
+    if record is None:
+        raise HTTPException(status_code=404, detail="查無回測記錄")
+
+    return encoded_response(http_request, {'success': True, 'backtest': record})
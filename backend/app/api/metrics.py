@@ -0,0 +1,86 @@
+"""
+Prometheus 指標端點
+請求 / 回測 / 抓取 / 連接池等待的直方圖在記錄時累計 (見 core/metrics.py)；
+快取命中率、佇列深度與連接池使用量在抓取時由各元件既有的 stats() 產生；
+抓取不建立連接池也不連接資料庫，資料庫中斷時仍可回應
+"""
+from typing import Iterable
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from ..core.async_database import async_pool_stats
+from ..core.database import sync_pool_stats
+from ..core.metrics import CONTENT_TYPE, REGISTRY, MetricFamily
+from ..core.rate_limit import get_rate_limiter
+from ..core.structured_logging import logging_stats
+from ..services.backtest_executor import get_backtest_executor
+from ..services.quote_cache import get_quote_cache
+from ..services.response_cache import get_response_cache
+from ..services.result_cache import get_result_cache
+from ..services.single_flight import single_flight_stats
+from ..services.user_cache import get_user_cache
+
+router = APIRouter(tags=["metrics"])
+
+
+def cache_metrics() -> Iterable[MetricFamily]:
+    """各快取的命中 / 未命中次數與命中率"""
+    result_stats = get_result_cache().stats()
+    caches = {
+        'quote': get_quote_cache().stats(),
+        'response': get_response_cache().stats(),
+        'backtest_result': {
+            'hits': result_stats['memory_hits'] + result_stats['disk_hits'],
+            'misses': result_stats['misses'],
+            'hit_ratio': result_stats['hit_ratio'],
+        },
+        'user': get_user_cache().stats(),
+    }
+
+    hits = MetricFamily("cache_hits", "Cache hits", kind="counter")
+    misses = MetricFamily("cache_misses", "Cache misses", kind="counter")
+    ratio = MetricFamily("cache_hit_ratio", "Cache hit ratio since start")
+    for name, stats in caches.items():
+        hits.add(stats['hits'], cache=name)
+        misses.add(stats['misses'], cache=name)
+        ratio.add(stats['hit_ratio'], cache=name)
+
+    coalesced = MetricFamily("single_flight_coalesced", "Requests served by an identical in-flight call",
+                             kind="counter")
+    for name, stats in single_flight_stats().items():
+        coalesced.add(stats['coalesced'], group=name)
+    return [hits, misses, ratio, coalesced]
+
+
+def resource_metrics() -> Iterable[MetricFamily]:
+    """回測佇列、資料庫連接池、日誌佇列與限流的目前狀態"""
+    executor = get_backtest_executor().stats()
+    running = MetricFamily("backtest_running", "Backtests currently computing").add(executor['running'])
+    queued = MetricFamily("backtest_queue_depth", "Backtests waiting for a worker").add(executor['queue_depth'])
+
+    sync_pool = sync_pool_stats() or {'in_use': 0, 'idle': 0}
+    async_pool = async_pool_stats()
+    connections = MetricFamily("db_pool_connections", "Database connections by pool and state")
+    connections.add(sync_pool['in_use'], pool="sync", state="in_use")
+    connections.add(sync_pool['idle'], pool="sync", state="idle")
+    connections.add(async_pool['size'] - async_pool['idle'], pool="async", state="in_use")
+    connections.add(async_pool['idle'], pool="async", state="idle")
+    dropped = MetricFamily("log_records_dropped", "Log records dropped because the log queue was full",
+                           kind="counter").add(logging_stats()['dropped'])
+    limiter = get_rate_limiter().stats()
+    decisions = MetricFamily("rate_limit_decisions", "Requests allowed or rejected by the rate limiter",
+                             kind="counter")
+    decisions.add(limiter['allowed'], backend=limiter['backend'], result="allowed")
+    decisions.add(limiter['limited'], backend=limiter['backend'], result="limited")
+    return [running, queued, connections, dropped, decisions]
+
+
+REGISTRY.add_collector(cache_metrics)
+REGISTRY.add_collector(resource_metrics)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 文字格式的指標"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
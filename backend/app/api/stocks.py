@@ -1,47 +1,120 @@
 """
 股票相關 API 路由
 """
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Dict
-from psycopg2.extras import RealDictCursor
-from ..core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import AsyncIterator, List, Dict, Optional
+from datetime import date
+import asyncio
+import json
+import numpy as np
+from ..core.database import PRICE_AGGREGATES, get_db
+from ..core.async_database import fetch_all, fetch_one, stream_snapshot
+from ..core.config import settings
+from ..core.conditional import is_not_modified, make_etag, not_modified_response, validator_headers
+from ..core.encoding import MSGPACK_MEDIA_TYPES, encode_json, encode_msgpack, wants_msgpack
+from ..services.data_refresher import get_refresher, load_refresh_targets
+from ..services.data_versions import (
+    DATA_VERSION_QUERY,
+    STOCK_LIST_SCOPE,
+    data_version_from_row,
+    get_data_version,
+    price_scope,
+)
+from ..services.price_loader import load_price_arrays
+from ..services.quote_cache import get_quote_cache
+from ..services.response_cache import get_response_cache
 
 router = APIRouter(prefix="/api/stocks", tags=["stocks"])
 
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def parse_date(value: Optional[str]) -> Optional[date]:
+    """解析 YYYY-MM-DD 查詢參數"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"日期格式錯誤: {value}")
+
 
 @router.get("/", response_model=List[Dict])
-async def get_stocks(db = Depends(get_db)):
-    """取得所有股票清單"""
+async def get_stocks(request: Request):
+    """
+    取得所有股票清單
+
+    回應帶 ETag / Last-Modified (股票清單的資料版本)，驗證碼相同時回傳 304；
+    序列化後的本文依版本快取
+    """
     try:
-        cursor = db.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("""
-            SELECT symbol, name, exchange, industry, sector, is_active
-            FROM stocks
-            WHERE is_active = TRUE
-            ORDER BY symbol
-        """)
+        # 先取版本再查資料：版本與資料在同一交易更新，快取不會以新版本保存舊資料
+        version = await get_data_version(STOCK_LIST_SCOPE)
+        headers = validator_headers(make_etag(STOCK_LIST_SCOPE, version.version), version.updated_at)
+        if is_not_modified(request, headers['ETag'], version.updated_at):
+            return not_modified_response(headers)
 
-        stocks = cursor.fetchall()
-        cursor.close()
-        return stocks
+        cache = get_response_cache()
+        cached = cache.get(STOCK_LIST_SCOPE, version.version)
+        if cached is None:
+            rows = await fetch_all("""
+                SELECT symbol, name, exchange, industry, sector, is_active
+                FROM stocks
+                WHERE is_active = TRUE
+                ORDER BY symbol
+            """)
+            cached = (encode_json(rows), "application/json")
+            cache.put(STOCK_LIST_SCOPE, version.version, *cached)
+
+        body, media_type = cached
+        return Response(body, media_type=media_type, headers=headers)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"獲取股票清單失敗: {str(e)}")
 
 
+@router.get("/quotes")
+async def get_quotes(symbols: str):
+    """批次取得最新報價 (symbols 以逗號分隔)，僅抓取快取中沒有的股票"""
+    symbol_list = list(dict.fromkeys(s.strip() for s in symbols.split(',') if s.strip()))
+    if not symbol_list:
+        raise HTTPException(status_code=400, detail="請提供至少一個股票代號")
+    if len(symbol_list) > settings.MAX_QUOTE_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"一次最多查詢 {settings.MAX_QUOTE_SYMBOLS} 檔股票")
+
+    try:
+        quotes = await asyncio.to_thread(get_quote_cache().get_many, symbol_list)
+        return {
+            'count': sum(1 for q in quotes.values() if q is not None),
+            'quotes': quotes,
+            'missing': [symbol for symbol, q in quotes.items() if q is None]
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"獲取報價失敗: {str(e)}")
+
+
+@router.get("/refresh/status")
+async def get_refresh_status(db = Depends(get_db)):
+    """取得背景資料更新狀態（最後更新時間與各股票落後天數）"""
+    try:
+        last_dates = dict(load_refresh_targets(db))
+        return get_refresher().get_status(last_dates)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"獲取更新狀態失敗: {str(e)}")
+
+
 @router.get("/{symbol}")
-async def get_stock_detail(symbol: str, db = Depends(get_db)):
+async def get_stock_detail(symbol: str):
     """取得股票詳細資訊"""
     try:
-        cursor = db.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("""
+        row = await fetch_one("""
             SELECT symbol, name, exchange, industry, sector
             FROM stocks
-            WHERE symbol = %s AND is_active = TRUE
-        """, (symbol,))
-
-        row = cursor.fetchone()
-        cursor.close()
+            WHERE symbol = $1 AND is_active = TRUE
+        """, symbol)
 
         if not row:
             raise HTTPException(status_code=404, detail="股票不存在")
@@ -54,44 +127,185 @@ async def get_stock_detail(symbol: str, db = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"獲取股票詳情失敗: {str(e)}")
 
 
+STREAM_PRICE_QUERY = """
+    SELECT date::text AS date, open::float8 AS open, high::float8 AS high,
+           low::float8 AS low, close::float8 AS close, volume
+    FROM stock_prices
+    WHERE symbol = $1 AND date >= $2 AND date <= $3
+    ORDER BY date ASC
+"""
+
+
+# interval -> (週期單位, 來源的彙整 interval)；來源為能滿足該解析度的最粗彙整表
+AGGREGATE_INTERVALS = {
+    '1w': ('week', '1w'),
+    '1mo': ('month', '1mo'),
+    '3mo': ('quarter', '1mo'),
+    '1y': ('year', '1mo'),
+}
+PRICE_INTERVALS = ('1d',) + tuple(AGGREGATE_INTERVALS)
+
+
+def aggregate_price_query(interval: str) -> str:
+    """
+    彙整 K 線查詢 (date 為週期起日，含 start_date 所在的整個週期)
+
+    來源彙整表的週期與要求相同時直接讀取，較粗的週期 (季、年) 再由月 K 線合併
+    """
+    unit, source = AGGREGATE_INTERVALS[interval]
+    table, table_unit = PRICE_AGGREGATES[source]
+    if unit == table_unit:
+        return f"""
+            SELECT date::text AS date, open::float8 AS open, high::float8 AS high,
+                   low::float8 AS low, close::float8 AS close, volume
+            FROM {table}
+            WHERE symbol = $1 AND date >= date_trunc('{unit}', $2::date) AND date <= $3
+            ORDER BY date ASC
+        """
+    return f"""
+        SELECT date_trunc('{unit}', date)::date::text AS date,
+               (array_agg(open ORDER BY date))[1]::float8 AS open, MAX(high)::float8 AS high,
+               MIN(low)::float8 AS low, (array_agg(close ORDER BY date DESC))[1]::float8 AS close,
+               SUM(volume)::bigint AS volume
+        FROM {table}
+        WHERE symbol = $1 AND date >= date_trunc('{unit}', $2::date) AND date <= $3
+        GROUP BY 1
+        ORDER BY 1 ASC
+    """
+
+
+def should_stream(start: Optional[date], end: Optional[date]) -> bool:
+    """未指定起日或區間超過 PRICE_STREAM_MIN_DAYS 時以串流回應"""
+    if start is None:
+        return True
+    return ((end or date.today()) - start).days > settings.PRICE_STREAM_MIN_DAYS
+
+
+async def stream_prices(
+    batches: AsyncIterator,
+    symbol: str,
+    interval: str = "1d",
+    ndjson: bool = False
+) -> AsyncIterator[str]:
+    """
+    將伺服器端游標的分批結果 (stream_snapshot 已讀取資料版本之後) 輸出為價格資料
+
+    JSON 模式輸出與一般回應相同的物件 (count 放在最後)；NDJSON 模式每行一筆價格
+    """
+    count = 0
+    if not ndjson:
+        yield f'{{"symbol":{json.dumps(symbol)},"interval":{json.dumps(interval)},"prices":['
+    async for rows in batches:
+        items = [json.dumps(dict(row), separators=(',', ':')) for row in rows]
+        if ndjson:
+            yield '\n'.join(items) + '\n'
+        else:
+            yield (',' if count else '') + ','.join(items)
+        count += len(rows)
+    if not ndjson:
+        yield f'],"count":{count}}}'
+
+
 @router.get("/{symbol}/prices")
 async def get_stock_prices(
+    request: Request,
     symbol: str,
     start_date: str = None,
     end_date: str = None,
-    db = Depends(get_db)
+    format: str = "json",
+    interval: str = "1d"
 ):
-    """取得股票歷史價格"""
-    try:
-        cursor = db.cursor(cursor_factory=RealDictCursor)
+    """
+    取得股票歷史價格
 
-        query = """
-            SELECT date::text as date, open, high, low, close, volume
-            FROM stock_prices
-            WHERE symbol = %s
-        """
-        params = [symbol]
+    interval 為 1w / 1mo / 3mo / 1y 時讀取預先彙整的週 / 月 K 線 (date 為週期起日)。
+    format=ndjson 時一律串流 (每行一筆)；json 格式的日 K 線在長區間時改為串流輸出，
+    回應內容相同但不會一次載入所有資料。
+    非串流回應可以 Accept: application/msgpack 取得欄位式的 MessagePack
+    (columns: date 與 open / high / low / close / volume 陣列，取代 prices)
 
-        if start_date:
-            query += " AND date >= %s"
-            params.append(start_date)
+    所有回應都帶 ETag / Last-Modified (該股票價格的資料版本)，驗證碼相同時回傳 304
+    而不查詢價格；非串流回應的本文依版本快取。
+    串流回應的版本與價格在同一個資料庫快照中讀取，串流期間的寫入不會讓 ETag 與內容不一致
+    """
+    start = parse_date(start_date)
+    end = parse_date(end_date)
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    if interval not in PRICE_INTERVALS:
+        raise HTTPException(status_code=400, detail=f"Unsupported interval: {interval}")
 
-        if end_date:
-            query += " AND date <= %s"
-            params.append(end_date)
+    query = STREAM_PRICE_QUERY if interval == "1d" else aggregate_price_query(interval)
+    msgpack = wants_msgpack(request)
+    streamed = format == "ndjson" or (interval == "1d" and should_stream(start, end))
+    batches = None
+    try:
+        if streamed:
+            batches = stream_snapshot(
+                DATA_VERSION_QUERY, (price_scope(symbol),),
+                query, symbol, start or date.min, end or date.max,
+                fetch_size=settings.PRICE_STREAM_FETCH_SIZE
+            )
+            version = data_version_from_row(await batches.__anext__())
+        else:
+            version = await get_data_version(price_scope(symbol))
+    except Exception as e:
+        if batches is not None:
+            await batches.aclose()
+        raise HTTPException(status_code=500, detail=f"獲取價格資料失敗: {str(e)}")
 
-        query += " ORDER BY date ASC"
+    # 回應內容只取決於資料版本與查詢參數
+    key = (symbol, start, end, interval, format, msgpack)
+    headers = validator_headers(make_etag(price_scope(symbol), version.version, *key), version.updated_at)
+    headers["Vary"] = "Accept"
+    if is_not_modified(request, headers['ETag'], version.updated_at):
+        if batches is not None:
+            await batches.aclose()
+        return not_modified_response(headers)
 
-        cursor.execute(query, params)
+    if streamed:
+        ndjson = format == "ndjson"
+        return StreamingResponse(
+            stream_prices(batches, symbol, interval, ndjson=ndjson),
+            media_type="application/x-ndjson" if ndjson else "application/json",
+            headers=headers
+        )
 
-        prices = cursor.fetchall()
-        cursor.close()
+    cache = get_response_cache()
+    cached = cache.get(key, version.version)
+    if cached is not None:
+        body, media_type = cached
+        return Response(body, media_type=media_type, headers=headers)
 
-        return {
+    try:
+        if interval == "1d":
+            arrays = await load_price_arrays(symbol, start, end)
+            dates = np.datetime_as_string(arrays['date'], unit='D').tolist()
+        else:
+            rows = await fetch_all(query, symbol, start or date.min, end or date.max)
+            dates = [row['date'] for row in rows]
+            arrays = {
+                c: np.array([row[c] for row in rows], dtype=np.int64 if c == 'volume' else np.float64)
+                for c in PRICE_COLUMNS
+            }
+
+        content = {
             'symbol': symbol,
-            'count': len(prices),
-            'prices': prices
+            'interval': interval,
+            'count': len(dates),
         }
+        if msgpack:
+            content['columns'] = {'date': dates, **{c: arrays[c] for c in PRICE_COLUMNS}}
+            body, media_type = encode_msgpack(content), MSGPACK_MEDIA_TYPES[0]
+        else:
+            content['prices'] = [
+                dict(zip(('date',) + PRICE_COLUMNS, row))
+                for row in zip(dates, *(arrays[c].tolist() for c in PRICE_COLUMNS))
+            ]
+            body, media_type = encode_json(content), "application/json"
+
+        cache.put(key, version.version, body, media_type)
+        return Response(body, media_type=media_type, headers=headers)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"獲取價格資料失敗: {str(e)}")
@@ -0,0 +1,78 @@
+"""
+系統監控相關 API 路由
+"""
+from fastapi import APIRouter
+
+from ..core.async_database import async_pool_stats
+from ..core.database import get_connection_pool
+from ..core.rate_limit import get_rate_limiter
+from ..core.security import password_hash_stats
+from ..core.structured_logging import logging_stats
+from ..services.backtest_executor import get_backtest_executor
+from ..services.quote_cache import get_quote_cache
+from ..services.response_cache import get_response_cache
+from ..services.result_cache import get_result_cache
+from ..services.single_flight import single_flight_stats
+from ..services.user_cache import get_user_cache
+
+router = APIRouter(prefix="/api/system", tags=["system"])
+
+
+@router.get("/single-flight")
+async def get_single_flight_stats():
+    """取得請求合併統計 (hits / misses / coalesced / in_flight)"""
+    return single_flight_stats()
+
+
+@router.get("/quote-cache")
+async def get_quote_cache_stats():
+    """取得報價快取統計"""
+    return get_quote_cache().stats()
+
+
+@router.get("/response-cache")
+async def get_response_cache_stats():
+    """取得股票清單 / 價格回應快取統計"""
+    return get_response_cache().stats()
+
+
+@router.get("/backtest-cache")
+async def get_backtest_cache_stats():
+    """取得回測結果快取統計 (記憶體 / 磁碟命中率)"""
+    return get_result_cache().stats()
+
+
+@router.get("/backtest-executor")
+async def get_backtest_executor_stats():
+    """取得回測執行器統計 (佇列深度、等待時間、逾時與取消次數)"""
+    return get_backtest_executor().stats()
+
+
+@router.get("/db-pool")
+async def get_db_pool_stats():
+    """取得資料庫連接池統計 (取用等待時間、使用中連接數、耗盡次數)"""
+    return {
+        'sync': get_connection_pool().stats(),
+        'async': async_pool_stats(),
+    }
+
+
+@router.get("/auth")
+async def get_auth_stats():
+    """取得認證快取與密碼雜湊執行緒池統計"""
+    return {
+        'user_cache': get_user_cache().stats(),
+        'password_hash': password_hash_stats(),
+    }
+
+
+@router.get("/logging")
+async def get_logging_stats():
+    """取得日誌佇列統計 (等待寫出、因佇列已滿丟棄、DEBUG 取樣略過的筆數)"""
+    return logging_stats()
+
+
+@router.get("/rate-limit")
+async def get_rate_limit_stats():
+    """取得限流統計 (放行 / 拒絕次數、追蹤中的呼叫者數)"""
+    return get_rate_limiter().stats()
@@ -0,0 +1,163 @@
+"""
+非同步資料庫連接 - PostgreSQL (asyncpg)
+供 async 路由的讀取路徑使用，查詢不會阻塞事件迴圈；
+寫入與需要交易的流程仍使用 database.py 的 psycopg2 連接池
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+import asyncpg
+
+from .config import settings
+from .metrics import DB_POOL_WAIT
+
+logger = logging.getLogger(__name__)
+
+# 全域非同步連接池 (綁定建立時的事件迴圈)
+_async_pool: Optional[asyncpg.Pool] = None
+_pool_loop: Optional[asyncio.AbstractEventLoop] = None
+_pool_lock: Optional[asyncio.Lock] = None
+
+
+async def get_async_pool() -> asyncpg.Pool:
+    """
+    取得非同步連接池
+
+    asyncpg 連接池只能在建立它的事件迴圈中使用；事件迴圈更換時
+    (例如測試中每個請求使用新的迴圈) 會捨棄舊的連接池並重建
+    """
+    global _async_pool, _pool_loop, _pool_lock
+    loop = asyncio.get_running_loop()
+    if _async_pool is not None and _pool_loop is loop:
+        return _async_pool
+
+    if _pool_lock is None or _pool_loop is not loop:
+        if _async_pool is not None and _pool_loop is not None and _pool_loop.is_closed():
+            # 舊迴圈已關閉，其連接已無法使用，直接捨棄
+            _async_pool = None
+        elif _async_pool is not None:
+            _async_pool.terminate()
+            _async_pool = None
+        _pool_lock = asyncio.Lock()
+        _pool_loop = loop
+
+    async with _pool_lock:
+        if _async_pool is None:
+            try:
+                _async_pool = await asyncpg.create_pool(
+                    dsn=settings.DATABASE_URL,
+                    min_size=1,
+                    max_size=settings.ASYNC_DB_POOL_SIZE,
+                    command_timeout=settings.ASYNC_DB_COMMAND_TIMEOUT
+                )
+                logger.info("Async database connection pool created successfully")
+            except Exception as e:
+                logger.error(f"Failed to create async connection pool: {e}")
+                raise
+    return _async_pool
+
+
+@asynccontextmanager
+async def acquire() -> AsyncIterator[asyncpg.Connection]:
+    """從連接池取得連接 (記錄取用等待時間)"""
+    pool = await get_async_pool()
+    started = time.perf_counter()
+    async with pool.acquire() as conn:
+        DB_POOL_WAIT.observe(time.perf_counter() - started, "async")
+        yield conn
+
+
+async def fetch_all(query: str, *args) -> List[Dict]:
+    """執行查詢並以字典列表回傳所有列 (參數使用 $1, $2 ...)"""
+    async with acquire() as conn:
+        rows = await conn.fetch(query, *args)
+    return [dict(row) for row in rows]
+
+
+async def fetch_one(query: str, *args) -> Optional[Dict]:
+    """執行查詢並回傳第一列，查無資料時為 None"""
+    async with acquire() as conn:
+        row = await conn.fetchrow(query, *args)
+    return dict(row) if row is not None else None
+
+
+async def copy_query(query: str, *args) -> bytes:
+    """以 COPY (query) TO STDOUT (FORMAT binary) 讀取查詢結果的原始位元組"""
+    chunks: List[bytes] = []
+
+    async def sink(data: bytes):
+        chunks.append(data)
+
+    async with acquire() as conn:
+        await conn.copy_from_query(query, *args, output=sink, format='binary')
+    return b''.join(chunks)
+
+
+async def stream_rows(query: str, *args, fetch_size: int = 2000) -> AsyncIterator[List[asyncpg.Record]]:
+    """
+    以伺服器端游標分批讀取查詢結果，每批最多 fetch_size 列
+
+    迭代期間佔用一條連接 (游標需在交易內)；迭代結束或被關閉時歸還
+    """
+    async with acquire() as conn:
+        async with conn.transaction(readonly=True):
+            cursor = await conn.cursor(query, *args)
+            while True:
+                rows = await cursor.fetch(fetch_size)
+                if not rows:
+                    break
+                yield rows
+
+
+async def stream_snapshot(
+    lead_query: str,
+    lead_args: Sequence,
+    query: str,
+    *args,
+    fetch_size: int = 2000
+) -> AsyncIterator:
+    """
+    在同一個唯讀快照 (REPEATABLE READ) 中先讀取 lead_query 的第一列，再分批讀取 query
+
+    第一次迭代回傳 lead_query 的結果 (字典，查無資料時為 None)，之後每次為最多 fetch_size 列；
+    兩者看到相同的已提交資料 (例如資料版本與該版本的內容)。
+    取得第一列後即佔用連接，呼叫端不再迭代時需 aclose() 歸還
+    """
+    async with acquire() as conn:
+        async with conn.transaction(isolation='repeatable_read', readonly=True):
+            row = await conn.fetchrow(lead_query, *lead_args)
+            yield dict(row) if row is not None else None
+            cursor = await conn.cursor(query, *args)
+            while True:
+                rows = await cursor.fetch(fetch_size)
+                if not rows:
+                    break
+                yield rows
+
+
+def async_pool_stats() -> Dict:
+    """非同步連接池統計"""
+    if _async_pool is None:
+        return {'size': 0, 'idle': 0, 'max_size': settings.ASYNC_DB_POOL_SIZE}
+    return {
+        'size': _async_pool.get_size(),
+        'idle': _async_pool.get_idle_size(),
+        'max_size': _async_pool.get_max_size(),
+    }
+
+
+async def close_async_db():
+    """關閉非同步連接池"""
+    global _async_pool, _pool_loop, _pool_lock
+    if _async_pool is not None:
+        if _pool_loop is asyncio.get_running_loop():
+            await _async_pool.close()
+        elif not _pool_loop.is_closed():
+            _async_pool.terminate()
+        _async_pool = None
+        _pool_loop = None
+        _pool_lock = None
+        logger.info("Async database connection pool closed")
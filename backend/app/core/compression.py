@@ -0,0 +1,175 @@
+"""
+回應壓縮 (gzip / brotli)
+依 Accept-Encoding 選擇 brotli 或 gzip，只壓縮超過門檻的回應；串流回應逐塊壓縮。
+與 Starlette 的 GZipMiddleware 相同的 ASGI 結構，另外支援 brotli；已知長度的回應
+收齊後整段壓縮並保留 Content-Length，大型回應在執行緒中壓縮，不會阻塞事件迴圈
+"""
+import asyncio
+import zlib
+from typing import Optional
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# 依偏好排序
+SUPPORTED_ENCODINGS = ("br", "gzip")
+
+# 超過此大小的完整回應在執行緒中壓縮 (較小的直接壓縮，省去切換執行緒的成本)
+THREAD_MIN_SIZE = 64 * 1024
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    依 Accept-Encoding 選擇壓縮方式
+
+    Returns:
+        'br' / 'gzip'，用戶端不接受任何支援的壓縮時為 None
+    """
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if coding:
+            accepted[coding.lower()] = q
+
+    for coding in SUPPORTED_ENCODINGS:
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+class Compressor:
+    """單一回應的增量壓縮器"""
+
+    def __init__(self, encoding: str, gzip_level: int = 6, brotli_quality: int = 4):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            # process 只會輸出已完成的區塊；串流時需要 flush 才能讓用戶端即時收到
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.finish()
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """壓縮超過 minimum_size 位元組的回應 (已設定 Content-Encoding 的回應與事件串流不處理)"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http":
+            encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+            if encoding is not None:
+                compressor = Compressor(encoding, self.gzip_level, self.brotli_quality)
+                await _CompressionResponder(self.app, compressor, self.minimum_size)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, compressor: Compressor, minimum_size: int):
+        self.app = app
+        self.compressor = compressor
+        self.minimum_size = minimum_size
+        self.send: Optional[Send] = None
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+        self.content_length: Optional[int] = None
+        self.buffer = bytearray()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _set_headers(self, content_length: Optional[int]):
+        headers = MutableHeaders(raw=self.initial_message["headers"])
+        headers["Content-Encoding"] = self.compressor.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if content_length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+
+    async def _send_whole(self, body: bytes):
+        """完整回應：壓縮後一次送出 (大型回應在執行緒中壓縮)"""
+        if len(body) < self.minimum_size:
+            await self.send(self.initial_message)
+        else:
+            if len(body) >= THREAD_MIN_SIZE:
+                body = await asyncio.to_thread(self.compressor.finish, body)
+            else:
+                body = self.compressor.finish(body)
+            self._set_headers(len(body))
+            await self.send(self.initial_message)
+        await self.send({"type": "http.response.body", "body": body, "more_body": False})
+
+    async def send_compressed(self, message: Message):
+        if message["type"] == "http.response.start":
+            # 等到本文才能決定是否壓縮
+            self.initial_message = message
+            headers = Headers(raw=message["headers"])
+            # 事件串流不壓縮：每則事件都很小，且部分代理伺服器會緩衝壓縮過的串流
+            self.passthrough = (
+                "content-encoding" in headers
+                or headers.get("content-type", "").startswith("text/event-stream")
+            )
+            if "content-length" in headers:
+                self.content_length = int(headers["content-length"])
+                self.passthrough = self.passthrough or self.content_length < self.minimum_size
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.passthrough:
+            if not self.started:
+                self.started = True
+                await self.send(self.initial_message)
+            await self.send(message)
+        elif self.content_length is not None:
+            # 已知長度的回應 (可能經由 BaseHTTPMiddleware 分段送出)：收齊後整段壓縮
+            self.buffer += body
+            if not more_body:
+                self.started = True
+                await self._send_whole(bytes(self.buffer))
+        elif not self.started:
+            self.started = True
+            if not more_body:
+                await self._send_whole(body)
+                return
+            self._set_headers(None)
+            await self.send(self.initial_message)
+            await self.send({"type": "http.response.body", "body": self.compressor.compress(body), "more_body": True})
+        else:
+            body = self.compressor.compress(body) if more_body else self.compressor.finish(body)
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
@@ -48,18 +48,81 @@ class Settings(BaseSettings):
         return v
 
     # 股票資料設定
-    STOCK_DATA_CACHE_TTL: int = 86400  # 24小時
+    STOCK_DATA_CACHE_TTL: int = 86400  # 24小時 (收盤後報價快取上限，最多到下一次開盤)
+    QUOTE_TTL_MARKET_OPEN: int = 15  # 盤中報價快取秒數
+    QUOTE_REFRESH_AHEAD_RATIO: float = 0.2  # 剩餘 TTL 低於此比例時背景更新熱門股票
+    QUOTE_HOT_THRESHOLD: int = 3  # 快取命中次數達此值視為熱門
+    MAX_QUOTE_SYMBOLS: int = 100  # 批次報價 API 單次最多股票數
     MAX_BACKTEST_YEARS: int = 10
     DEFAULT_INITIAL_CAPITAL: float = 100000.0
 
+    # 行情資料來源 (yfinance / replay / synthetic)
+    MARKET_DATA_PROVIDER: str = "yfinance"
+    MARKET_DATA_DIR: str = str(BACKEND_DIR / "data" / "market")  # replay 模式的 CSV/Parquet 目錄
+    SYNTHETIC_DATA_SEED: int = 42
+
+    # 交易日曆
+    TRADING_CALENDAR_FILE: str = str(APP_DIR / "data" / "twse_holidays.csv")
+    MARKET_EXTRA_CLOSURES: str = ""  # 臨時休市日 (颱風等)，逗號分隔 YYYY-MM-DD
+    DATA_COVERAGE_RATIO: float = 0.95  # 資料庫筆數低於應有交易日數的此比例時重新抓取
+
+    # 盤中 K 線 (由逐筆成交檔彙整)
+    INTRADAY_TIMEFRAMES: str = "1m,5m,15m"
+    TICK_CHUNK_SIZE: int = 200000  # 每次讀取的逐筆筆數
+
+    # 背景資料更新 (收盤後更新所有 is_active 股票)
+    DATA_REFRESH_ENABLED: bool = True
+    DATA_REFRESH_TIME: str = "14:30"  # 台北時間 HH:MM
+    DATA_REFRESH_CONCURRENCY: int = 4
+    DATA_REFRESH_MAX_RETRIES: int = 3
+    DATA_REFRESH_BACKOFF_SECONDS: float = 2.0
+    DATA_REFRESH_INITIAL_DAYS: int = 1825  # 資料庫尚無資料時的初次抓取天數
+
     # 效能設定
-    MAX_WORKERS: int = 4
-    DB_POOL_SIZE: int = 10
-    DB_MAX_OVERFLOW: int = 20
+    MAX_WORKERS: int = 4  # 回測工作池大小
+    BACKTEST_EXECUTOR: str = "process"  # process / thread
+    BACKTEST_MAX_PER_USER: int = 2  # 每位用戶 (或 IP) 同時進行的回測上限
+    BACKTEST_MAX_QUEUE: int = 32  # 等待中的回測上限，超過回傳 503
+    BACKTEST_TIMEOUT_SECONDS: float = 120.0
+    BACKTEST_STREAM_MAX_SYMBOLS: int = 20  # 串流比較單次最多的股票數
+    BACKTEST_STREAM_HEARTBEAT_SECONDS: float = 15.0  # 串流無事件時送出註解行，避免代理伺服器逾時斷線
+    BACKTEST_CACHE_SIZE: int = 256  # 記憶體中保存的日 K 回測結果數
+    BACKTEST_CACHE_DIR: str = ""  # 回測結果的磁碟快取目錄 (重新啟動後仍可命中)；空字串為停用
+    BACKTEST_CACHE_DISK_MAX_ENTRIES: int = 5000
+    DB_AUTO_MIGRATE: bool = True  # 啟動時套用資料庫遷移 (關閉時需先執行 python -m app.core.migrations)
+    DB_POOL_SIZE: int = 10  # 常駐連接數
+    DB_MAX_OVERFLOW: int = 20  # 尖峰時額外允許的連接數 (歸還時關閉)
+    DB_POOL_TIMEOUT: float = 30.0  # 取得連接的等待上限 (秒)
+    DB_POOL_RECYCLE: float = 1800.0  # 連接最長存活秒數
+    DB_POOL_PRE_PING_IDLE: float = 30.0  # 閒置超過此秒數的連接在取用前先驗證
+    ASYNC_DB_POOL_SIZE: int = 10  # async 讀取路徑 (asyncpg) 的連接池大小
+    ASYNC_DB_COMMAND_TIMEOUT: float = 30.0
+    PRICE_STREAM_FETCH_SIZE: int = 2000  # 串流回應時每次從游標讀取的列數
+    PRICE_STREAM_MIN_DAYS: int = 1825  # 查詢區間超過此天數 (或未指定起日) 時改為串流回應
+    RESPONSE_COMPRESS_MIN_SIZE: int = 1024  # 回應超過此位元組數且用戶端接受時以 br / gzip 壓縮
+    RESPONSE_GZIP_LEVEL: int = 6
+    RESPONSE_BROTLI_QUALITY: int = 4
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # 股票清單 / 價格回應本文快取的總大小
+    RESPONSE_CACHE_MAX_ITEM_BYTES: int = 4 * 1024 * 1024  # 超過此大小的回應不快取
+
+    # 認證
+    AUTH_USER_CACHE_TTL: float = 30.0  # 已登入用戶快取秒數 (users 表變更時會立即失效)
+    AUTH_USER_CACHE_SIZE: int = 10000
+    PASSWORD_HASH_WORKERS: int = 4  # bcrypt 專用執行緒數
+    PASSWORD_HASH_MAX_PENDING: int = 64  # 等待中的密碼雜湊 / 驗證上限，超過回傳 503
+
+    # 日誌
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"  # text (key=value) / json (單行 JSON)
+    LOG_QUEUE_SIZE: int = 10000  # 等待寫出的記錄上限，超過時丟棄 (不阻塞請求)
+    LOG_DEBUG_SAMPLE_RATE: float = 0.01  # LOG_LEVEL=DEBUG 時保留 DEBUG 記錄的請求比例
 
     # API Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 60
     RATE_LIMIT_PER_HOUR: int = 1000
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # memory (每個 worker 各自計算) / postgres (多個 worker 共用)
+    RATE_LIMIT_MAX_KEYS: int = 100000  # memory 後端同時追蹤的呼叫者上限
 
     model_config = SettingsConfigDict(
         env_file=[
@@ -0,0 +1,226 @@
+"""
+執行緒安全的彈性連接池 (psycopg2)
+固定的核心連接 + 有上限的溢出連接，取用逾時、閒置連接驗證、
+最長存活時間回收，並統計取用等待時間、使用中連接數與耗盡次數
+"""
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from .metrics import DB_POOL_WAIT
+
+
+class PoolTimeout(PoolError):
+    """在逾時內無法取得連接 (連接池耗盡)"""
+
+
+class ElasticConnectionPool:
+    """
+    彈性連接池
+
+    最多同時有 pool_size + max_overflow 條連接；歸還時若閒置連接已達 pool_size，
+    多出的溢出連接直接關閉。閒置超過 pre_ping_idle 秒的連接在取用前先以
+    SELECT 1 驗證，存活超過 max_lifetime 秒的連接在取用或歸還時回收。
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        pool_size: int = 10,
+        max_overflow: int = 20,
+        acquire_timeout: float = 30.0,
+        max_lifetime: float = 1800.0,
+        pre_ping_idle: float = 30.0,
+        minconn: int = 1,
+        connect: Callable = psycopg2.connect
+    ):
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.acquire_timeout = acquire_timeout
+        self.max_lifetime = max_lifetime
+        self.pre_ping_idle = pre_ping_idle
+        self._connect = connect
+
+        self._cond = threading.Condition()
+        self._idle: Deque[Tuple[object, float]] = deque()  # (conn, 閒置開始時間)
+        self._created_at: Dict[int, float] = {}
+        self._total = 0
+        self._in_use = 0
+        self._closed = False
+
+        self._wait_times: Deque[float] = deque(maxlen=1000)
+        self.peak_in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.exhausted = 0
+        self.created = 0
+        self.recycled = 0
+        self.invalidated = 0
+        self.overflow_closed = 0
+
+        for _ in range(min(minconn, pool_size)):
+            conn = self._new_connection()
+            with self._cond:
+                self._total += 1
+                self._idle.append((conn, time.monotonic()))
+
+    @property
+    def maxconn(self) -> int:
+        return self.pool_size + self.max_overflow
+
+    def _new_connection(self):
+        conn = self._connect(self.dsn)
+        self._created_at[id(conn)] = time.monotonic()
+        self.created += 1
+        return conn
+
+    def _discard(self, conn):
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, conn) -> bool:
+        created = self._created_at.get(id(conn))
+        return created is not None and time.monotonic() - created > self.max_lifetime
+
+    def _is_alive(self, conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self, timeout: Optional[float] = None):
+        """
+        取得連接
+
+        Raises:
+            PoolTimeout: 在 timeout (預設 acquire_timeout) 秒內無可用連接
+        """
+        started = time.monotonic()
+        deadline = started + (self.acquire_timeout if timeout is None else timeout)
+        waited = False
+
+        while True:
+            conn = None
+            idle_since = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("connection pool is closed")
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()  # LIFO：優先使用最近用過的連接
+                        break
+                    if self._total < self.maxconn:
+                        self._total += 1  # 先保留名額，在鎖外建立連接
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.exhausted += 1
+                        raise PoolTimeout(
+                            f"connection pool exhausted ({self.maxconn} connections in use)"
+                        )
+                    if not waited:
+                        waited = True
+                        self.waits += 1
+                    self._cond.wait(remaining)
+
+            try:
+                if conn is not None:
+                    if conn.closed or self._expired(conn):
+                        self.recycled += 1
+                        self._discard(conn)
+                        conn = self._new_connection()
+                    elif time.monotonic() - idle_since >= self.pre_ping_idle and not self._is_alive(conn):
+                        self.invalidated += 1
+                        self._discard(conn)
+                        conn = self._new_connection()
+                else:
+                    conn = self._new_connection()
+            except Exception:
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                raise
+
+            with self._cond:
+                self._in_use += 1
+                self.checkouts += 1
+                self.peak_in_use = max(self.peak_in_use, self._in_use)
+                waited_for = time.monotonic() - started
+                self._wait_times.append(waited_for)
+            DB_POOL_WAIT.observe(waited_for, "sync")
+            return conn
+
+    def putconn(self, conn, close: bool = False):
+        """歸還連接 (未結束的交易會先回滾；損壞、過期或多餘的溢出連接直接關閉)"""
+        keep = not close and not conn.closed and not self._expired(conn)
+        if keep and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except Exception:
+                keep = False
+
+        with self._cond:
+            self._in_use -= 1
+            if keep and not self._closed and len(self._idle) < self.pool_size:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._total -= 1
+                if keep and not self._closed:
+                    self.overflow_closed += 1
+                elif not close and not conn.closed:
+                    self.recycled += 1
+                self._discard(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        """關閉所有閒置連接，之後的取用會失敗；使用中的連接在歸還時關閉"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._total -= 1
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            waits: List[float] = list(self._wait_times)
+            total = self._total
+            in_use = self._in_use
+            idle = len(self._idle)
+        wait_ms = np.array(waits) * 1000 if waits else np.zeros(1)
+        return {
+            'pool_size': self.pool_size,
+            'max_overflow': self.max_overflow,
+            'total': total,
+            'in_use': in_use,
+            'idle': idle,
+            'overflow': max(total - self.pool_size, 0),
+            'peak_in_use': self.peak_in_use,
+            'checkouts': self.checkouts,
+            'waits': self.waits,
+            'exhausted': self.exhausted,
+            'created': self.created,
+            'recycled': self.recycled,
+            'invalidated': self.invalidated,
+            'overflow_closed': self.overflow_closed,
+            'checkout_wait': {
+                'avg_ms': round(float(wait_ms.mean()), 3),
+                'p95_ms': round(float(np.percentile(wait_ms, 95)), 3),
+                'max_ms': round(float(wait_ms.max()), 3),
+            },
+        }
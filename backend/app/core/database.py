@@ -1,38 +1,56 @@
 """
 資料庫連接配置 - PostgreSQL
 """
-from typing import Generator
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Generator, Iterable, List, Optional, Set, Tuple
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from psycopg2.pool import SimpleConnectionPool
 import logging
 import os
+import threading
+import weakref
 
 from .config import settings
+from .connection_pool import ElasticConnectionPool
 
 logger = logging.getLogger(__name__)
 
 # 全域連接池
 _connection_pool = None
+_pool_init_lock = threading.Lock()
 
 
 def get_connection_pool():
     """取得資料庫連接池"""
     global _connection_pool
     if _connection_pool is None:
-        try:
-            _connection_pool = SimpleConnectionPool(
-                minconn=1,
-                maxconn=settings.DB_POOL_SIZE,
-                dsn=settings.DATABASE_URL
-            )
-            logger.info("Database connection pool created successfully")
-        except Exception as e:
-            logger.error(f"Failed to create connection pool: {e}")
-            raise
+        with _pool_init_lock:
+            if _connection_pool is None:
+                try:
+                    _connection_pool = ElasticConnectionPool(
+                        dsn=settings.DATABASE_URL,
+                        pool_size=settings.DB_POOL_SIZE,
+                        max_overflow=settings.DB_MAX_OVERFLOW,
+                        acquire_timeout=settings.DB_POOL_TIMEOUT,
+                        max_lifetime=settings.DB_POOL_RECYCLE,
+                        pre_ping_idle=settings.DB_POOL_PRE_PING_IDLE
+                    )
+                    logger.info("Database connection pool created successfully")
+                except Exception as e:
+                    logger.error(f"Failed to create connection pool: {e}")
+                    raise
     return _connection_pool
 
 
+def sync_pool_stats() -> Optional[Dict]:
+    """同步連接池統計 (連接池尚未建立時回傳 None，不會因此建立連接池)"""
+    pool = _connection_pool
+    if pool is None:
+        return None
+    return pool.stats()
+
+
 def get_db() -> Generator:
     """取得資料庫連接"""
     pool = get_connection_pool()
@@ -51,6 +69,10 @@ def get_db() -> Generator:
             pool.putconn(conn)
 
 
+# 非請求情境 (背景工作等) 使用: with db_connection() as conn
+db_connection = contextmanager(get_db)
+
+
 def get_db_cursor() -> Generator:
     """取得資料庫連接和游標（返回字典格式）"""
     pool = get_connection_pool()
@@ -73,48 +95,112 @@ def get_db_cursor() -> Generator:
             pool.putconn(conn)
 
 
-def init_db():
-    """初始化資料庫"""
-    try:
-        # 建立連接
-        conn = psycopg2.connect(settings.DATABASE_URL)
-        cursor = conn.cursor()
-
-        logger.info("Initializing database...")
-
-        # 創建 users 表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                hashed_password VARCHAR(255) NOT NULL,
-                full_name VARCHAR(100),
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # 創建 stocks 表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS stocks (
-                symbol VARCHAR(20) PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                exchange VARCHAR(20) DEFAULT 'TWSE',
-                market VARCHAR(20) DEFAULT 'TW',
-                industry VARCHAR(100),
-                sector VARCHAR(100),
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+def create_stock_prices_table(cursor, name: str = "stock_prices"):
+    """
+    建立依年份分區的 stock_prices 表
+
+    主鍵 (symbol, date) 同時提供個股區間查詢所需的 B-tree 索引；
+    date 另建 BRIN 索引 (資料大致依日期寫入，索引極小、寫入成本低)。
+    分區由 ensure_price_partitions 在寫入前建立
+    """
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {name} (
+            symbol VARCHAR(20) NOT NULL,
+            date DATE NOT NULL,
+            open NUMERIC(12, 2) NOT NULL,
+            high NUMERIC(12, 2) NOT NULL,
+            low NUMERIC(12, 2) NOT NULL,
+            close NUMERIC(12, 2) NOT NULL,
+            volume BIGINT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (symbol) REFERENCES stocks(symbol) ON DELETE CASCADE,
+            PRIMARY KEY (symbol, date)
+        ) PARTITION BY RANGE (date)
+    """)
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{name}_date_brin
+        ON {name} USING BRIN (date)
+    """)
+
+
+# 建立分區時的 pg_advisory_xact_lock 鍵 (與 migrations.MIGRATION_LOCK_ID 不同)
+PARTITION_LOCK_ID = 72_635_400_002
+
+# 各連接已確認存在 (已提交) 的分區 {(資料表, 年份)}；以連接為鍵，資料庫被重建時
+# 舊連接已失效，不會沿用過期的記錄 (連接關閉後自動移除)
+_known_partitions: "weakref.WeakKeyDictionary[object, Set[Tuple[str, int]]]" = weakref.WeakKeyDictionary()
+_known_partitions_lock = threading.Lock()
+
+
+def ensure_price_partitions(cursor, years: Iterable[int], table: str = "stock_prices") -> int:
+    """
+    建立涵蓋指定年份的分區 ({table}_yYYYY)，已存在的分區略過
+
+    已知存在的分區記在程序內 (依連接)，一般寫入不需要查詢 pg_inherits。需要建立時先取得
+    交易層級的 advisory lock (提交或回滾時釋放)，並行的寫入者依序檢查與建立，
+    不會同時對同一分區執行 CREATE TABLE ... PARTITION OF。
+    本交易新建的分區在之後的交易中確認後才記入 (交易回滾時分區並不存在)
+
+    Returns:
+        新建的分區數
+    """
+    wanted = sorted(set(int(y) for y in years))
+    with _known_partitions_lock:
+        known = _known_partitions.setdefault(cursor.connection, set())
+        missing = [year for year in wanted if (table, year) not in known]
+    if not missing:
+        return 0
+
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (PARTITION_LOCK_ID,))
+    # committed: 不是本交易建立的分區 (本交易建立的在回滾後不存在，不記入)
+    cursor.execute("""
+        SELECT c.relname,
+               COALESCE(c.xmin::text::bigint
+                        <> pg_current_xact_id_if_assigned()::text::bigint %% 4294967296, TRUE) AS committed
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (table,))
+    existing = dict(cursor.fetchall())
+
+    created = 0
+    for year in missing:
+        partition = f"{table}_y{year}"
+        if partition in existing:
+            if existing[partition]:
+                with _known_partitions_lock:
+                    known.add((table, year))
+            continue
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {partition}
+            PARTITION OF {table}
+            FOR VALUES FROM ('{date(year, 1, 1)}') TO ('{date(year + 1, 1, 1)}')
         """)
-
-        # 創建 stock_prices 表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS stock_prices (
-                id SERIAL PRIMARY KEY,
+        created += 1
+    return created
+
+
+# 預先彙整的週 / 月 K 線：interval -> (資料表, date_trunc 單位)
+PRICE_AGGREGATES = {
+    '1w': ('stock_prices_weekly', 'week'),
+    '1mo': ('stock_prices_monthly', 'month'),
+}
+
+
+def create_price_aggregate_tables(cursor) -> List[str]:
+    """
+    建立週 / 月 K 線彙整表 (date 為週期起日：週一或每月 1 日)
+
+    Returns:
+        本次新建的資料表 (需要從日 K 線回填)
+    """
+    created = []
+    for table, _ in PRICE_AGGREGATES.values():
+        cursor.execute("SELECT to_regclass(%s)", (table,))
+        if cursor.fetchone()[0] is None:
+            created.append(table)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
                 symbol VARCHAR(20) NOT NULL,
                 date DATE NOT NULL,
                 open NUMERIC(12, 2) NOT NULL,
@@ -122,99 +208,86 @@ def init_db():
                 low NUMERIC(12, 2) NOT NULL,
                 close NUMERIC(12, 2) NOT NULL,
                 volume BIGINT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                bars INTEGER NOT NULL,
                 FOREIGN KEY (symbol) REFERENCES stocks(symbol) ON DELETE CASCADE,
-                UNIQUE(symbol, date)
+                PRIMARY KEY (symbol, date)
             )
         """)
+    return created
+
+
+def refresh_price_aggregates(
+    cursor,
+    symbol: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    tables: Optional[Iterable[str]] = None
+) -> int:
+    """
+    從日 K 線重新計算涵蓋 [start, end] 的週 / 月 K 線 (不提交交易)
+
+    只重算受影響的週期，日 K 線被覆寫時彙整結果也會一併更新
+
+    Args:
+        symbol: 股票代號，None 表示全部
+        start / end: 寫入的日 K 線日期範圍，None 表示不限
+        tables: 只更新指定的彙整表，None 表示全部
+
+    Returns:
+        更新的彙整列數
+    """
+    updated = 0
+    for table, unit in PRICE_AGGREGATES.values():
+        if tables is not None and table not in tables:
+            continue
+        conditions, params = [], []
+        if symbol is not None:
+            conditions.append("symbol = %s")
+            params.append(symbol)
+        if start is not None:
+            conditions.append(f"date >= date_trunc('{unit}', %s::date)")
+            params.append(start)
+        if end is not None:
+            conditions.append(f"date < date_trunc('{unit}', %s::date) + interval '1 {unit}'")
+            params.append(end)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        cursor.execute(f"""
+            INSERT INTO {table} (symbol, date, open, high, low, close, volume, bars)
+            SELECT symbol, date_trunc('{unit}', date)::date,
+                   (array_agg(open ORDER BY date))[1], MAX(high), MIN(low),
+                   (array_agg(close ORDER BY date DESC))[1], SUM(volume), COUNT(*)
+            FROM stock_prices
+            {where}
+            GROUP BY 1, 2
+            ON CONFLICT (symbol, date)
+            DO UPDATE SET
+                open = EXCLUDED.open,
+                high = EXCLUDED.high,
+                low = EXCLUDED.low,
+                close = EXCLUDED.close,
+                volume = EXCLUDED.volume,
+                bars = EXCLUDED.bars
+        """, params)
+        updated += cursor.rowcount
+    return updated
 
-        # 創建索引
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_stock_prices_symbol
-            ON stock_prices(symbol)
-        """)
-
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_stock_prices_date
-            ON stock_prices(date DESC)
-        """)
 
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_stock_prices_symbol_date
-            ON stock_prices(symbol, date DESC)
-        """)
-
-        # 創建 strategies 表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS strategies (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                name VARCHAR(100) NOT NULL,
-                description TEXT,
-                strategy_type VARCHAR(50) NOT NULL DEFAULT 'moving_average',
-                initial_capital NUMERIC(15, 2) NOT NULL DEFAULT 100000,
-
-                -- Moving Average parameters
-                short_period INTEGER DEFAULT 5,
-                long_period INTEGER DEFAULT 20,
-
-                -- RSI parameters
-                rsi_period INTEGER DEFAULT 14,
-                rsi_overbought INTEGER DEFAULT 70,
-                rsi_oversold INTEGER DEFAULT 30,
-
-                -- MACD parameters
-                macd_fast INTEGER DEFAULT 12,
-                macd_slow INTEGER DEFAULT 26,
-                macd_signal INTEGER DEFAULT 9,
-
-                -- Bollinger Bands parameters
-                bb_period INTEGER DEFAULT 20,
-                bb_std_dev NUMERIC(5, 2) DEFAULT 2.0,
-
-                -- Grid Trading parameters
-                grid_lower_price NUMERIC(12, 2) DEFAULT 0,
-                grid_upper_price NUMERIC(12, 2) DEFAULT 0,
-                grid_num_grids INTEGER DEFAULT 10,
-                grid_investment_per_grid NUMERIC(15, 2) DEFAULT 10000,
-
-                -- Common risk management
-                stop_loss_pct NUMERIC(5, 2) DEFAULT 5.0,
-                take_profit_pct NUMERIC(5, 2) DEFAULT 10.0,
-                position_size_pct NUMERIC(5, 2) DEFAULT 100.0,
-
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """)
+def init_db():
+    """
+    初始化資料庫 (套用尚未執行的版本化遷移)
 
-        # 插入台灣熱門股票
-        stocks_data = [
-            ('2330.TW', '台積電', 'TWSE', '半導體', '科技'),
-            ('2317.TW', '鴻海', 'TWSE', '電子製造', '科技'),
-            ('2454.TW', '聯發科', 'TWSE', '半導體', '科技'),
-            ('2308.TW', '台達電', 'TWSE', '電子零組件', '科技'),
-            ('2882.TW', '國泰金', 'TWSE', '金融控股', '金融'),
-            ('2891.TW', '中信金', 'TWSE', '金融控股', '金融'),
-            ('2412.TW', '中華電', 'TWSE', '電信服務', '通訊'),
-            ('2881.TW', '富邦金', 'TWSE', '金融控股', '金融'),
-            ('1301.TW', '台塑', 'TWSE', '塑膠', '傳統產業'),
-            ('1303.TW', '南亞', 'TWSE', '塑膠', '傳統產業'),
-        ]
-
-        for stock in stocks_data:
-            cursor.execute("""
-                INSERT INTO stocks (symbol, name, exchange, industry, sector)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (symbol) DO NOTHING
-            """, stock)
+    資料庫已是最新版本時只需一次查詢，多個 worker 同時啟動時只有一個會執行遷移
+    """
+    from .migrations import run_migrations
 
-        conn.commit()
-        cursor.close()
-        conn.close()
-
-        logger.info(f"Database initialized successfully at {settings.DATABASE_URL}")
+    try:
+        with db_connection() as conn:
+            applied = run_migrations(conn)
+        if applied:
+            logger.info(f"Applied migrations {applied} at {settings.DATABASE_URL}")
+        else:
+            logger.info("Database schema is up to date")
 
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
@@ -0,0 +1,93 @@
+"""
+回應編碼 (依 Accept 標頭協商)
+- application/json (預設)：orjson 直接序列化 NumPy 陣列與純量，不經 jsonable_encoder
+- application/msgpack：MessagePack；NumPy 數值陣列以 ext 型別存放小端原始位元組
+  (ext 1 = float64、ext 2 = int64)，用戶端可直接轉為 Float64Array / np.frombuffer
+- text/event-stream：Server-Sent Events，每則事件的 data 為單行 JSON
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+import msgpack
+import numpy as np
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+EXT_FLOAT64 = 1
+EXT_INT64 = 2
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        # 非 C 連續或 orjson 不支援的 dtype
+        return obj.tolist()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def encode_json(content: Any) -> bytes:
+    """以 orjson 編碼 (NaN / Inf 輸出為 null)"""
+    return orjson.dumps(content, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == 'f':
+            return msgpack.ExtType(EXT_FLOAT64, obj.astype('<f8', copy=False).tobytes())
+        if obj.dtype.kind in 'iu':
+            return msgpack.ExtType(EXT_INT64, obj.astype('<i8', copy=False).tobytes())
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    raise TypeError(f"Type is not MessagePack serializable: {type(obj).__name__}")
+
+
+def encode_msgpack(content: Any) -> bytes:
+    """以 MessagePack 編碼 (數值陣列為 ext 型別)"""
+    return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    if code == EXT_FLOAT64:
+        return np.frombuffer(data, dtype='<f8')
+    if code == EXT_INT64:
+        return np.frombuffer(data, dtype='<i8')
+    return msgpack.ExtType(code, data)
+
+
+def decode_msgpack(data: bytes) -> Any:
+    """解碼 encode_msgpack 的輸出 (ext 陣列還原為 NumPy 陣列)"""
+    return msgpack.unpackb(data, ext_hook=_ext_hook)
+
+
+def wants_msgpack(request: Request) -> bool:
+    """Accept 標頭是否要求 MessagePack (q=0 視為不接受)"""
+    for part in request.headers.get("accept", "").split(','):
+        media_type, *params = [item.strip() for item in part.split(';')]
+        if media_type.lower() in MSGPACK_MEDIA_TYPES:
+            return all(param.replace(' ', '') not in ('q=0', 'q=0.0') for param in params)
+    return False
+
+
+def encoded_response(request: Request, content: Any, status_code: int = 200) -> Response:
+    """依 Accept 標頭以 MessagePack 或 JSON 編碼回應"""
+    if wants_msgpack(request):
+        body, media_type = encode_msgpack(content), MSGPACK_MEDIA_TYPES[0]
+    else:
+        body, media_type = encode_json(content), "application/json"
+    return Response(body, status_code=status_code, media_type=media_type, headers={"Vary": "Accept"})
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    """編碼一則 Server-Sent Events 訊息 (orjson 輸出不含換行，data 只佔一行)"""
+    return b"event: " + event.encode() + b"\ndata: " + encode_json(data) + b"\n\n"
@@ -0,0 +1,277 @@
+"""
+程序內指標 (Prometheus 文字格式)
+計數器與直方圖在記錄時只做一次 bisect 與加法 (各自一把鎖)，累積分佈在抓取時才計算；
+快取命中率等既有統計由抓取時呼叫的收集函式產生，不在請求路徑上重複記錄。
+
+指標只存在於目前的行程：以多個 uvicorn worker 執行時每個 worker 各自計數，
+由 Prometheus 依 instance 加總。
+"""
+import bisect
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Starlette 會為 text/* 自動加上 charset=utf-8
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# 秒為單位的預設區間 (5ms ~ 60s)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _labels(self, values: Tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """單調遞增的計數器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def value(self, *labelvalues) -> float:
+        with self._lock:
+            return self._values.get(labelvalues, 0.0)
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in values:
+            yield f"{self.name}_total", self._labels(labelvalues), value
+
+
+class Histogram(_Metric):
+    """累積區間直方圖 (記錄時存各區間的個數，輸出時累加)"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labelvalues -> [各區間個數 (最後一格為 +Inf), 總和]
+        self._values: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                entry = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, *labelvalues) -> int:
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            return sum(entry[0]) if entry else 0
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            values = [(labelvalues, list(counts), total) for labelvalues, (counts, total) in self._values.items()]
+        for labelvalues, counts, total in values:
+            labels = self._labels(labelvalues)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, 'le': _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    """指標與抓取時收集函式的登錄處"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable["MetricFamily"]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable["MetricFamily"]]):
+        """登錄抓取時才呼叫的收集函式 (回傳 MetricFamily)"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """以 Prometheus 文字格式輸出所有指標"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        families = [(m.name, m.kind, m.documentation, list(m.samples())) for m in metrics]
+        for collector in collectors:
+            # 單一收集函式失敗時只略過它的指標，不影響整個抓取
+            try:
+                collected = [(f.name, f.kind, f.documentation, f.samples) for f in collector()]
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}", extra={
+                    'collector': getattr(collector, '__name__', repr(collector))
+                })
+                continue
+            families.extend(collected)
+
+        lines = []
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {_escape(documentation)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricFamily:
+    """抓取時由既有統計產生的量測值 (gauge 或累計的 counter)"""
+
+    def __init__(self, name: str, documentation: str, kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.samples: List[Sample] = []
+
+    def add(self, value: float, **labels) -> "MetricFamily":
+        sample_name = f"{self.name}_total" if self.kind == "counter" else self.name
+        self.samples.append((sample_name, labels, float(value)))
+        return self
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# 請求
+HTTP_REQUEST_DURATION = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status")
+)
+
+# 回測引擎
+BACKTEST_DURATION = histogram(
+    "backtest_duration_seconds", "Backtest compute time in the worker by strategy type",
+    ("strategy_type",)
+)
+BACKTEST_QUEUE_WAIT = histogram(
+    "backtest_queue_wait_seconds", "Time a backtest waited for a free worker"
+)
+BACKTEST_BARS = counter(
+    "backtest_bars_processed", "Price bars processed by backtests", ("strategy_type",)
+)
+BACKTEST_BARS_PER_SECOND = histogram(
+    "backtest_bars_per_second", "Backtest throughput (bars per second of worker time)",
+    ("strategy_type",),
+    buckets=(1e3, 5e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 5e6)
+)
+
+# 資料來源
+CRAWLER_FETCH_DURATION = histogram(
+    "crawler_fetch_duration_seconds", "Market data fetch latency by provider", ("provider", "kind")
+)
+CRAWLER_FETCH_FAILURES = counter(
+    "crawler_fetch_failures", "Market data fetches that raised or returned no data",
+    ("provider", "kind", "reason")
+)
+
+# 資料庫連接池
+DB_POOL_WAIT = histogram(
+    "db_pool_wait_seconds", "Time spent acquiring a database connection", ("pool",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+
+
+class MetricsMiddleware:
+    """
+    記錄每個請求的延遲 (純 ASGI，串流回應計到最後一塊送出為止)
+
+    route 標籤使用路由樣板 (例如 /api/stocks/{symbol}/prices)，未匹配的路徑
+    歸為 unmatched，避免標籤數量隨網址無限增加
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            )
@@ -0,0 +1,662 @@
+"""
+版本化的資料庫遷移
+每個遷移只執行一次並記錄在 schema_migrations；以 advisory lock 確保多個 worker
+同時啟動時只有一個執行遷移，其餘等待後直接略過
+
+使用方式 (在 backend 目錄)：
+    python -m app.core.migrations            # 套用尚未執行的遷移
+    python -m app.core.migrations --status   # 顯示目前版本
+"""
+import argparse
+import logging
+import time
+from datetime import date
+from typing import Callable, List, NamedTuple, Optional
+
+from .database import (
+    create_price_aggregate_tables,
+    create_stock_prices_table,
+    db_connection,
+    ensure_price_partitions,
+    refresh_price_aggregates,
+)
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock 的鍵 (同一資料庫內所有 worker 共用)
+MIGRATION_LOCK_ID = 72_635_400_001
+
+
+STOCK_PRICES_COLUMNS = "symbol, date, open, high, low, close, volume, created_at"
+
+
+class Migration(NamedTuple):
+    """單一遷移 (apply 在交易內執行，不需自行提交)"""
+    version: int
+    name: str
+    apply: Callable
+
+
+def _price_table_kind(cursor) -> Optional[str]:
+    """stock_prices 的 relkind ('p' 分區表, 'r' 一般表, None 不存在)"""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('stock_prices')")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def migrate_stock_prices_to_partitions(cursor) -> int:
+    """
+    將舊版單一 heap 的 stock_prices 轉為分區表 (同一交易內完成)
+
+    Returns:
+        搬移的筆數
+    """
+    cursor.execute("SELECT DISTINCT EXTRACT(YEAR FROM date)::int FROM stock_prices")
+    years = [row[0] for row in cursor.fetchall()]
+
+    create_stock_prices_table(cursor, "stock_prices_partitioned")
+    ensure_price_partitions(cursor, years, "stock_prices_partitioned")
+    cursor.execute(f"""
+        INSERT INTO stock_prices_partitioned ({STOCK_PRICES_COLUMNS})
+        SELECT {STOCK_PRICES_COLUMNS} FROM stock_prices
+    """)
+    moved = cursor.rowcount
+
+    cursor.execute("DROP TABLE stock_prices")
+    cursor.execute("ALTER TABLE stock_prices_partitioned RENAME TO stock_prices")
+    cursor.execute("ALTER TABLE stock_prices RENAME CONSTRAINT stock_prices_partitioned_pkey TO stock_prices_pkey")
+    cursor.execute("ALTER TABLE stock_prices RENAME CONSTRAINT stock_prices_partitioned_symbol_fkey TO stock_prices_symbol_fkey")
+    cursor.execute("ALTER INDEX idx_stock_prices_partitioned_date_brin RENAME TO idx_stock_prices_date_brin")
+    for year in years:
+        cursor.execute(f"ALTER TABLE stock_prices_partitioned_y{year} RENAME TO stock_prices_y{year}")
+    return moved
+
+
+def _initial_schema(cursor):
+    """初始資料表與預設股票 (對既有資料庫可重複執行)"""
+    # 創建 users 表
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            hashed_password VARCHAR(255) NOT NULL,
+            full_name VARCHAR(100),
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # 創建 stocks 表
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stocks (
+            symbol VARCHAR(20) PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            exchange VARCHAR(20) DEFAULT 'TWSE',
+            market VARCHAR(20) DEFAULT 'TW',
+            industry VARCHAR(100),
+            sector VARCHAR(100),
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # 創建 stock_prices 表 (依年份分區；舊版單一表會先轉換)
+    if _price_table_kind(cursor) == 'r':
+        moved = migrate_stock_prices_to_partitions(cursor)
+        logger.info(f"Migrated {moved} rows of stock_prices to yearly partitions")
+    else:
+        create_stock_prices_table(cursor)
+    this_year = date.today().year
+    ensure_price_partitions(cursor, [this_year, this_year + 1])
+
+    # 創建週 / 月 K 線彙整表 (新建時從既有的日 K 線回填)
+    created = create_price_aggregate_tables(cursor)
+    if created:
+        refresh_price_aggregates(cursor, tables=created)
+
+    # 創建 stock_prices_quarantine 表 (未通過資料品質檢查的列)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_prices_quarantine (
+            id SERIAL PRIMARY KEY,
+            symbol VARCHAR(20) NOT NULL,
+            date DATE,
+            open DOUBLE PRECISION,
+            high DOUBLE PRECISION,
+            low DOUBLE PRECISION,
+            close DOUBLE PRECISION,
+            volume DOUBLE PRECISION,
+            reasons TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_stock_prices_quarantine_symbol_date
+        ON stock_prices_quarantine(symbol, date)
+    """)
+
+    # 創建 intraday_bars 表 (盤中 K 線，依 ts 每月分區，分區於匯入時建立)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS intraday_bars (
+            symbol VARCHAR(20) NOT NULL,
+            timeframe VARCHAR(8) NOT NULL,
+            ts TIMESTAMPTZ NOT NULL,
+            open NUMERIC(12, 2) NOT NULL,
+            high NUMERIC(12, 2) NOT NULL,
+            low NUMERIC(12, 2) NOT NULL,
+            close NUMERIC(12, 2) NOT NULL,
+            volume BIGINT NOT NULL,
+            PRIMARY KEY (symbol, timeframe, ts)
+        ) PARTITION BY RANGE (ts)
+    """)
+
+    # 創建 strategies 表
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS strategies (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            description TEXT,
+            strategy_type VARCHAR(50) NOT NULL DEFAULT 'moving_average',
+            initial_capital NUMERIC(15, 2) NOT NULL DEFAULT 100000,
+
+            -- Moving Average parameters
+            short_period INTEGER DEFAULT 5,
+            long_period INTEGER DEFAULT 20,
+
+            -- RSI parameters
+            rsi_period INTEGER DEFAULT 14,
+            rsi_overbought INTEGER DEFAULT 70,
+            rsi_oversold INTEGER DEFAULT 30,
+
+            -- MACD parameters
+            macd_fast INTEGER DEFAULT 12,
+            macd_slow INTEGER DEFAULT 26,
+            macd_signal INTEGER DEFAULT 9,
+
+            -- Bollinger Bands parameters
+            bb_period INTEGER DEFAULT 20,
+            bb_std_dev NUMERIC(5, 2) DEFAULT 2.0,
+
+            -- Grid Trading parameters
+            grid_lower_price NUMERIC(12, 2) DEFAULT 0,
+            grid_upper_price NUMERIC(12, 2) DEFAULT 0,
+            grid_num_grids INTEGER DEFAULT 10,
+            grid_investment_per_grid NUMERIC(15, 2) DEFAULT 10000,
+
+            -- Common risk management
+            stop_loss_pct NUMERIC(5, 2) DEFAULT 5.0,
+            take_profit_pct NUMERIC(5, 2) DEFAULT 10.0,
+            position_size_pct NUMERIC(5, 2) DEFAULT 100.0,
+
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+
+    # 插入台灣熱門股票
+    stocks_data = [
+        ('2330.TW', '台積電', 'TWSE', '半導體', '科技'),
+        ('2317.TW', '鴻海', 'TWSE', '電子製造', '科技'),
+        ('2454.TW', '聯發科', 'TWSE', '半導體', '科技'),
+        ('2308.TW', '台達電', 'TWSE', '電子零組件', '科技'),
+        ('2882.TW', '國泰金', 'TWSE', '金融控股', '金融'),
+        ('2891.TW', '中信金', 'TWSE', '金融控股', '金融'),
+        ('2412.TW', '中華電', 'TWSE', '電信服務', '通訊'),
+        ('2881.TW', '富邦金', 'TWSE', '金融控股', '金融'),
+        ('1301.TW', '台塑', 'TWSE', '塑膠', '傳統產業'),
+        ('1303.TW', '南亞', 'TWSE', '塑膠', '傳統產業'),
+    ]
+
+    for stock in stocks_data:
+        cursor.execute("""
+            INSERT INTO stocks (symbol, name, exchange, industry, sector)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (symbol) DO NOTHING
+        """, stock)
+
+
+def _strategy_parameter_columns(cursor):
+    """
+    策略參數由 JSONB parameters 欄位改為獨立欄位
+
+    只影響以舊版 init.sql 建立、仍有 parameters 欄位的 strategies 表
+    """
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'strategies' AND column_name = 'parameters'
+    """)
+    if cursor.fetchone() is None:
+        return
+
+    cursor.execute("""
+        ALTER TABLE strategies
+        ADD COLUMN IF NOT EXISTS initial_capital NUMERIC(15, 2) DEFAULT 100000,
+        ADD COLUMN IF NOT EXISTS short_period INTEGER,
+        ADD COLUMN IF NOT EXISTS long_period INTEGER,
+        ADD COLUMN IF NOT EXISTS rsi_period INTEGER,
+        ADD COLUMN IF NOT EXISTS rsi_overbought INTEGER,
+        ADD COLUMN IF NOT EXISTS rsi_oversold INTEGER,
+        ADD COLUMN IF NOT EXISTS macd_fast INTEGER,
+        ADD COLUMN IF NOT EXISTS macd_slow INTEGER,
+        ADD COLUMN IF NOT EXISTS macd_signal INTEGER,
+        ADD COLUMN IF NOT EXISTS bb_period INTEGER,
+        ADD COLUMN IF NOT EXISTS bb_std_dev NUMERIC(10, 2),
+        ADD COLUMN IF NOT EXISTS grid_lower_price NUMERIC(12, 2),
+        ADD COLUMN IF NOT EXISTS grid_upper_price NUMERIC(12, 2),
+        ADD COLUMN IF NOT EXISTS grid_num_grids INTEGER,
+        ADD COLUMN IF NOT EXISTS grid_investment_per_grid NUMERIC(15, 2),
+        ADD COLUMN IF NOT EXISTS stop_loss_pct NUMERIC(10, 2),
+        ADD COLUMN IF NOT EXISTS take_profit_pct NUMERIC(10, 2),
+        ADD COLUMN IF NOT EXISTS position_size_pct NUMERIC(10, 2)
+    """)
+    cursor.execute("ALTER TABLE strategies ALTER COLUMN parameters DROP NOT NULL")
+    cursor.execute("""
+        UPDATE strategies
+        SET
+            initial_capital = COALESCE((parameters->>'initial_capital')::numeric, 100000),
+            short_period = (parameters->>'short_period')::integer,
+            long_period = (parameters->>'long_period')::integer,
+            rsi_period = (parameters->>'rsi_period')::integer,
+            rsi_overbought = (parameters->>'rsi_overbought')::integer,
+            rsi_oversold = (parameters->>'rsi_oversold')::integer,
+            macd_fast = (parameters->>'macd_fast')::integer,
+            macd_slow = (parameters->>'macd_slow')::integer,
+            macd_signal = (parameters->>'macd_signal')::integer,
+            bb_period = (parameters->>'bb_period')::integer,
+            bb_std_dev = (parameters->>'bb_std_dev')::numeric,
+            grid_lower_price = (parameters->>'grid_lower_price')::numeric,
+            grid_upper_price = (parameters->>'grid_upper_price')::numeric,
+            grid_num_grids = (parameters->>'grid_num_grids')::integer,
+            grid_investment_per_grid = (parameters->>'grid_investment_per_grid')::numeric,
+            stop_loss_pct = (parameters->>'stop_loss_pct')::numeric,
+            take_profit_pct = (parameters->>'take_profit_pct')::numeric,
+            position_size_pct = (parameters->>'position_size_pct')::numeric
+        WHERE parameters IS NOT NULL AND parameters != 'null'::jsonb
+    """)
+
+
+def _user_change_notify(cursor):
+    """users 表更新 / 刪除時發出 NOTIFY user_changed (payload 為 username)，供認證快取失效"""
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION notify_user_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('user_changed', OLD.username);
+            IF TG_OP = 'UPDATE' AND NEW.username IS DISTINCT FROM OLD.username THEN
+                PERFORM pg_notify('user_changed', NEW.username);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS users_notify_changed ON users")
+    cursor.execute("""
+        CREATE TRIGGER users_notify_changed
+        AFTER UPDATE OR DELETE ON users
+        FOR EACH ROW EXECUTE FUNCTION notify_user_changed()
+    """)
+
+
+def _data_versions(cursor):
+    """
+    資料版本表：股票清單與各股票價格的遞增版本 (ETag / 回應快取用)
+
+    價格版本由寫入程式在同一交易更新；股票清單由觸發器在新增、刪除或
+    內容實際變更時更新。既有資料以版本 1 起算
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            scope VARCHAR(64) PRIMARY KEY,
+            version BIGINT NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO data_versions (scope, version)
+        SELECT 'prices:' || s.symbol, 1
+        FROM stocks s
+        WHERE EXISTS (SELECT 1 FROM stock_prices p WHERE p.symbol = s.symbol)
+        UNION ALL
+        SELECT 'stocks', 1
+        ON CONFLICT (scope) DO NOTHING
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION bump_stock_list_version() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO data_versions (scope, version, updated_at)
+            VALUES ('stocks', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope)
+            DO UPDATE SET version = data_versions.version + 1, updated_at = CURRENT_TIMESTAMP;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS stocks_bump_list_version ON stocks")
+    cursor.execute("""
+        CREATE TRIGGER stocks_bump_list_version
+        AFTER INSERT OR DELETE ON stocks
+        FOR EACH ROW EXECUTE FUNCTION bump_stock_list_version()
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS stocks_bump_list_version_update ON stocks")
+    cursor.execute("""
+        CREATE TRIGGER stocks_bump_list_version_update
+        AFTER UPDATE ON stocks
+        FOR EACH ROW
+        WHEN (OLD.* IS DISTINCT FROM NEW.*)
+        EXECUTE FUNCTION bump_stock_list_version()
+    """)
+
+
+BACKTEST_HISTORY_TABLES = ("backtests", "backtest_results", "backtest_transactions")
+
+
+def _column_type(cursor, table: str, column: str) -> Optional[str]:
+    """欄位的型別 (format_type，例如 'integer'、'uuid')；表或欄位不存在時為 None"""
+    cursor.execute("""
+        SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+        WHERE attrelid = to_regclass(%s) AND attname = %s AND NOT attisdropped
+    """, (table, column))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def rename_legacy_backtest_tables(cursor) -> List[str]:
+    """
+    舊版 init.sql 建立的 backtests / backtest_results / backtest_transactions
+    (UUID 主鍵，欄位與目前不同) 改名為 <表名>_legacy 保留資料，索引同樣加上 _legacy，
+    讓新版資料表與索引可以建立
+
+    Returns:
+        改名的資料表
+    """
+    id_type = _column_type(cursor, "backtests", "id")
+    if id_type is None or id_type == "bigint":
+        return []
+
+    renamed = []
+    for table in BACKTEST_HISTORY_TABLES:
+        if _column_type(cursor, table, "backtest_id" if table != "backtests" else "id") is None:
+            continue
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+                       (table,))
+        for (index,) in cursor.fetchall():
+            cursor.execute(f'ALTER INDEX "{index}" RENAME TO "{index}_legacy"')
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+        renamed.append(table)
+    logger.warning("Renamed legacy backtest tables", extra={'tables': renamed, 'id_type': id_type})
+    return renamed
+
+
+def _backtest_history(cursor):
+    """
+    回測歷史記錄：backtests (請求參數)、backtest_results (績效摘要與資金曲線)、
+    backtest_transactions (交易明細)
+
+    資金曲線已由應用程式壓縮，STORAGE EXTERNAL 讓 PostgreSQL 不再嘗試壓縮、
+    直接存放在 TOAST，列表查詢不會讀到。
+    user_id / strategy_id 依 users / strategies 主鍵的型別 (SERIAL 或舊版 init.sql 的 UUID) 建立
+    """
+    user_id_type = _column_type(cursor, "users", "id")
+    strategy_id_type = _column_type(cursor, "strategies", "id")
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS backtests (
+            id BIGSERIAL PRIMARY KEY,
+            user_id {user_id_type} NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            strategy_id {strategy_id_type} REFERENCES strategies(id) ON DELETE SET NULL,
+            stock_symbol VARCHAR(20) NOT NULL,
+            strategy_type VARCHAR(50) NOT NULL,
+            interval VARCHAR(10) NOT NULL DEFAULT '1d',
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL,
+            initial_capital NUMERIC(15, 2) NOT NULL,
+            parameters JSONB NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_backtests_user_id ON backtests (user_id, id DESC)")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_backtests_user_symbol
+        ON backtests (user_id, stock_symbol, id DESC)
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS backtest_results (
+            backtest_id BIGINT PRIMARY KEY REFERENCES backtests(id) ON DELETE CASCADE,
+            final_value NUMERIC(15, 2) NOT NULL,
+            total_return NUMERIC(12, 4) NOT NULL,
+            buy_hold_return NUMERIC(12, 4),
+            sharpe_ratio NUMERIC(12, 4),
+            max_drawdown NUMERIC(12, 4),
+            win_rate NUMERIC(7, 2),
+            total_trades INTEGER NOT NULL DEFAULT 0,
+            winning_trades INTEGER NOT NULL DEFAULT 0,
+            losing_trades INTEGER NOT NULL DEFAULT 0,
+            curve_length INTEGER NOT NULL,
+            equity_curve BYTEA NOT NULL
+        )
+    """)
+    cursor.execute("ALTER TABLE backtest_results ALTER COLUMN equity_curve SET STORAGE EXTERNAL")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS backtest_transactions (
+            backtest_id BIGINT NOT NULL REFERENCES backtests(id) ON DELETE CASCADE,
+            seq INTEGER NOT NULL,
+            traded_at TIMESTAMP NOT NULL,
+            action VARCHAR(4) NOT NULL,
+            price NUMERIC(12, 2) NOT NULL,
+            shares NUMERIC(14, 4) NOT NULL,
+            amount NUMERIC(15, 2) NOT NULL,
+            signal TEXT,
+            PRIMARY KEY (backtest_id, seq)
+        )
+    """)
+
+
+def _legacy_backtest_tables(cursor):
+    """
+    以舊版 init.sql 建立的資料庫：backtest_history 遷移遇到已存在的舊回測表 (UUID 主鍵)
+    時不會建立新版資料表，改名保留舊表後重新建立
+    """
+    if rename_legacy_backtest_tables(cursor):
+        _backtest_history(cursor)
+
+
+def _price_changes(cursor):
+    """價格寫入記錄：每次寫入的版本與涵蓋的日期範圍 (回測結果快取依區間判斷是否失效)"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS price_changes (
+            symbol VARCHAR(20) NOT NULL,
+            version BIGINT NOT NULL,
+            first_date DATE NOT NULL,
+            last_date DATE NOT NULL,
+            changed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (symbol, version)
+        )
+    """)
+
+
+def _rate_limit_buckets(cursor):
+    """
+    多個 worker 共用的限流 token bucket (RATE_LIMIT_BACKEND=postgres)
+
+    UNLOGGED：不寫 WAL，當機後清空 (所有呼叫者重新從滿的 bucket 開始) 可以接受。
+    rate_limit_take() 在一個語句內補充、判斷並扣除，同一個 key 的並行請求由列鎖排序
+    """
+    cursor.execute("""
+        CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+            key TEXT PRIMARY KEY,
+            minute_tokens DOUBLE PRECISION NOT NULL,
+            hour_tokens DOUBLE PRECISION NOT NULL,
+            updated_at DOUBLE PRECISION NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rate_limit_buckets_updated ON rate_limit_buckets (updated_at)")
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION rate_limit_take(
+            p_key TEXT, p_now DOUBLE PRECISION, p_cost DOUBLE PRECISION,
+            p_minute_capacity DOUBLE PRECISION, p_hour_capacity DOUBLE PRECISION
+        )
+        RETURNS TABLE (allowed BOOLEAN, minute_left DOUBLE PRECISION, hour_left DOUBLE PRECISION) AS $$
+        DECLARE
+            m DOUBLE PRECISION;
+            h DOUBLE PRECISION;
+            ok BOOLEAN;
+        BEGIN
+            INSERT INTO rate_limit_buckets AS b (key, minute_tokens, hour_tokens, updated_at)
+            VALUES (p_key, p_minute_capacity, p_hour_capacity, p_now)
+            ON CONFLICT (key) DO NOTHING;
+
+            SELECT LEAST(p_minute_capacity,
+                         b.minute_tokens + GREATEST(p_now - b.updated_at, 0) * p_minute_capacity / 60.0),
+                   LEAST(p_hour_capacity,
+                         b.hour_tokens + GREATEST(p_now - b.updated_at, 0) * p_hour_capacity / 3600.0)
+              INTO m, h
+              FROM rate_limit_buckets b
+             WHERE b.key = p_key
+               FOR UPDATE;
+
+            ok := m >= p_cost AND h >= p_cost;
+            IF ok THEN
+                m := m - p_cost;
+                h := h - p_cost;
+            END IF;
+
+            UPDATE rate_limit_buckets b
+               SET minute_tokens = m, hour_tokens = h, updated_at = GREATEST(b.updated_at, p_now)
+             WHERE b.key = p_key;
+
+            RETURN QUERY SELECT ok, m, h;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+
+def _quarantine_unique_rows(cursor):
+    """
+    隔離表每個 (symbol, date, reasons) 只保留一列 (背景更新會重複抓取相同的錯誤資料)：
+    刪除既有的重複列 (保留最新一列)，加上 last_seen_at 與唯一索引 (date 為 NULL 的列也視為相同)
+    """
+    cursor.execute("""
+        ALTER TABLE stock_prices_quarantine
+        ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    """)
+    cursor.execute("""
+        DELETE FROM stock_prices_quarantine q
+        USING stock_prices_quarantine newer
+        WHERE newer.symbol = q.symbol
+          AND newer.date IS NOT DISTINCT FROM q.date
+          AND newer.reasons = q.reasons
+          AND newer.id > q.id
+    """)
+    cursor.execute("DROP INDEX IF EXISTS idx_stock_prices_quarantine_symbol_date")
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_stock_prices_quarantine_key
+        ON stock_prices_quarantine (symbol, date, reasons) NULLS NOT DISTINCT
+    """)
+
+
+# 依版本排序；新增遷移只能附加在最後，已發佈的遷移不可修改
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'initial_schema', _initial_schema),
+    Migration(2, 'strategy_parameter_columns', _strategy_parameter_columns),
+    Migration(3, 'user_change_notify', _user_change_notify),
+    Migration(4, 'data_versions', _data_versions),
+    Migration(5, 'backtest_history', _backtest_history),
+    Migration(6, 'price_changes', _price_changes),
+    Migration(7, 'rate_limit_buckets', _rate_limit_buckets),
+    Migration(8, 'legacy_backtest_tables', _legacy_backtest_tables),
+    Migration(9, 'quarantine_unique_rows', _quarantine_unique_rows),
+]
+
+
+def applied_version(cursor) -> int:
+    """資料庫目前的遷移版本 (尚未建立 schema_migrations 時為 0)"""
+    cursor.execute("SELECT to_regclass('schema_migrations')")
+    if cursor.fetchone()[0] is None:
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cursor.fetchone()[0]
+
+
+def run_migrations(conn) -> List[int]:
+    """
+    套用尚未執行的遷移，每個遷移各自一個交易
+
+    已是最新版本時不取得鎖直接回傳；其他 worker 正在遷移時等待其完成後重新檢查版本
+
+    Returns:
+        本次套用的版本
+    """
+    latest = MIGRATIONS[-1].version
+    cursor = conn.cursor()
+    try:
+        current = applied_version(cursor)
+        conn.rollback()
+        if current >= latest:
+            return []
+
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        if not cursor.fetchone()[0]:
+            logger.info("Another process is migrating the database, waiting...")
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR(100) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    duration_ms DOUBLE PRECISION
+                )
+            """)
+            current = applied_version(cursor)
+            conn.commit()
+
+            applied = []
+            for migration in MIGRATIONS:
+                if migration.version <= current:
+                    continue
+                started = time.perf_counter()
+                migration.apply(cursor)
+                duration_ms = (time.perf_counter() - started) * 1000
+                cursor.execute("""
+                    INSERT INTO schema_migrations (version, name, duration_ms)
+                    VALUES (%s, %s, %s)
+                """, (migration.version, migration.name, duration_ms))
+                conn.commit()
+                logger.info(f"Applied migration {migration.version} ({migration.name}) in {duration_ms:.1f}ms")
+                applied.append(migration.version)
+            return applied
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            conn.commit()
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="套用資料庫遷移")
+    parser.add_argument('--status', action='store_true', help="只顯示目前版本")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    with db_connection() as conn:
+        if args.status:
+            cursor = conn.cursor()
+            print(f"current version: {applied_version(cursor)}, latest: {MIGRATIONS[-1].version}")
+            cursor.close()
+        else:
+            applied = run_migrations(conn)
+            print(f"applied: {applied}" if applied else "already up to date")
+
+
+if __name__ == '__main__':
+    main()
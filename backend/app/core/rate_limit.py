@@ -0,0 +1,293 @@
+"""
+API 限流 (token bucket)
+每個呼叫者 (登入用戶為 user:<username>，其餘為 ip:<client ip>) 各有兩個 bucket：
+每分鐘 RATE_LIMIT_PER_MINUTE 與每小時 RATE_LIMIT_PER_HOUR，以連續速率補充，
+請求需同時從兩個 bucket 扣除該路由的成本 (ROUTE_COSTS，回測比讀取價格貴)。
+
+後端：
+    memory    每個 worker 各自計算 (N 個 worker 時實際上限為 N 倍)；
+              每個呼叫者只存三個數字，閒置到 bucket 補滿的呼叫者依 LRU 順序刪除
+    postgres  以 rate_limit_take() 在資料庫內原子地補充與扣除，多個 worker 共用
+
+資料庫後端出錯時放行請求 (限流不應讓 API 整個失效)。
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import orjson
+
+from .async_database import fetch_one
+from .config import settings
+from .security import client_key
+
+logger = logging.getLogger(__name__)
+
+# (method, path) -> 成本；未列出的路由成本為 1
+ROUTE_COSTS: Dict[Tuple[str, str], int] = {
+    ("POST", "/api/backtest/run"): 5,
+    ("POST", "/api/backtest/compare"): 10,
+    ("POST", "/api/backtest/compare/stream"): 10,
+    # bcrypt 雜湊
+    ("POST", "/api/auth/login"): 3,
+    ("POST", "/api/auth/register"): 3,
+}
+
+# 不限流的路徑 (健康檢查、指標抓取與文件)
+EXEMPT_PATHS = frozenset({"/health", "/metrics", "/docs", "/redoc", "/openapi.json", "/docs/oauth2-redirect"})
+
+
+class RateLimitDecision(NamedTuple):
+    allowed: bool
+    retry_after: float  # 秒；allowed 時為 0
+    remaining: int  # 每分鐘 bucket 剩餘的 token
+
+
+def _decide(
+    minute_tokens: float, hour_tokens: float, cost: float,
+    per_minute: float, per_hour: float, allowed: bool
+) -> RateLimitDecision:
+    """由扣除後 (或未扣除) 的 token 數計算回應"""
+    if allowed:
+        return RateLimitDecision(True, 0.0, int(minute_tokens))
+    retry_after = max(
+        (cost - minute_tokens) / (per_minute / 60.0) if minute_tokens < cost else 0.0,
+        (cost - hour_tokens) / (per_hour / 3600.0) if hour_tokens < cost else 0.0,
+    )
+    return RateLimitDecision(False, retry_after, int(minute_tokens))
+
+
+class MemoryRateLimiter:
+    """
+    程序內的 token bucket 限流 (執行緒安全)
+
+    _buckets 依最後使用時間排序 (OrderedDict)，每次請求只檢查最前面的 key：
+    已閒置到兩個 bucket 都補滿的 key 刪除後與保留的結果相同，刪除的攤銷成本為 O(1)
+    """
+
+    backend = "memory"
+
+    def __init__(
+        self,
+        per_minute: int,
+        per_hour: int,
+        max_keys: int = 100000,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.per_minute = float(per_minute)
+        self.per_hour = float(per_hour)
+        self.max_keys = max_keys
+        self._clock = clock
+        self._minute_rate = self.per_minute / 60.0
+        self._hour_rate = self.per_hour / 3600.0
+
+        # key -> [minute_tokens, hour_tokens, updated_at]
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.allowed = 0
+        self.limited = 0
+        self.evicted = 0
+
+    def _refill(self, entry: List[float], now: float) -> Tuple[float, float]:
+        elapsed = max(now - entry[2], 0.0)
+        return (
+            min(self.per_minute, entry[0] + elapsed * self._minute_rate),
+            min(self.per_hour, entry[1] + elapsed * self._hour_rate),
+        )
+
+    def _evict_idle(self, now: float):
+        while self._buckets:
+            key, entry = next(iter(self._buckets.items()))
+            minute_tokens, hour_tokens = self._refill(entry, now)
+            full = minute_tokens >= self.per_minute and hour_tokens >= self.per_hour
+            if not full and len(self._buckets) <= self.max_keys:
+                break
+            del self._buckets[key]
+            self.evicted += 1
+
+    def take_sync(self, key: str, cost: float = 1) -> RateLimitDecision:
+        """從 key 的 bucket 扣除 cost 個 token"""
+        now = self._clock()
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is None:
+                minute_tokens, hour_tokens = self.per_minute, self.per_hour
+                entry = self._buckets[key] = [0.0, 0.0, now]
+            else:
+                minute_tokens, hour_tokens = self._refill(entry, now)
+                self._buckets.move_to_end(key)
+
+            allowed = minute_tokens >= cost and hour_tokens >= cost
+            if allowed:
+                minute_tokens -= cost
+                hour_tokens -= cost
+                self.allowed += 1
+            else:
+                self.limited += 1
+            entry[0], entry[1], entry[2] = minute_tokens, hour_tokens, now
+
+            self._evict_idle(now)
+
+        return _decide(minute_tokens, hour_tokens, cost, self.per_minute, self.per_hour, allowed)
+
+    async def take(self, key: str, cost: float = 1) -> RateLimitDecision:
+        return self.take_sync(key, cost)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'per_minute': int(self.per_minute),
+                'per_hour': int(self.per_hour),
+                'active_keys': len(self._buckets),
+                'max_keys': self.max_keys,
+                'allowed': self.allowed,
+                'limited': self.limited,
+                'evicted': self.evicted,
+                'errors': 0,
+            }
+
+
+class PostgresRateLimiter:
+    """
+    以 PostgreSQL 共用 bucket 的限流 (多個 worker / 多台主機)
+
+    時間使用各 worker 的 time.time()，主機之間需同步時鐘 (NTP)；
+    閒置超過一小時 (兩個 bucket 必然已補滿) 的列每 cleanup_every 次請求清除一次
+    """
+
+    backend = "postgres"
+
+    def __init__(self, per_minute: int, per_hour: int, cleanup_every: int = 1000):
+        self.per_minute = float(per_minute)
+        self.per_hour = float(per_hour)
+        self.cleanup_every = cleanup_every
+        self._lock = threading.Lock()
+        self._calls = 0
+
+        self.allowed = 0
+        self.limited = 0
+        self.errors = 0
+
+    async def take(self, key: str, cost: float = 1) -> RateLimitDecision:
+        """從 key 的 bucket 扣除 cost 個 token (資料庫出錯時放行)"""
+        now = time.time()
+        try:
+            row = await fetch_one(
+                "SELECT allowed, minute_left, hour_left FROM rate_limit_take($1, $2, $3, $4, $5)",
+                key, now, float(cost), self.per_minute, self.per_hour
+            )
+            with self._lock:
+                self._calls += 1
+                cleanup = self._calls % self.cleanup_every == 0
+            if cleanup:
+                await fetch_one("DELETE FROM rate_limit_buckets WHERE updated_at < $1", now - 3600.0)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                errors = self.errors
+            # 資料庫中斷時每個請求都會失敗，只記錄第一次與之後每 1000 次
+            if errors % 1000 == 1:
+                logger.warning(f"Rate limit backend unavailable, allowing request: {e}", extra={'errors': errors})
+            return RateLimitDecision(True, 0.0, int(self.per_minute))
+
+        with self._lock:
+            if row['allowed']:
+                self.allowed += 1
+            else:
+                self.limited += 1
+        return _decide(row['minute_left'], row['hour_left'], cost, self.per_minute, self.per_hour, row['allowed'])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'per_minute': int(self.per_minute),
+                'per_hour': int(self.per_hour),
+                'allowed': self.allowed,
+                'limited': self.limited,
+                'errors': self.errors,
+            }
+
+
+_rate_limiter = None
+
+
+def get_rate_limiter():
+    """取得限流器 (依 RATE_LIMIT_BACKEND)"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        if settings.RATE_LIMIT_BACKEND == "postgres":
+            _rate_limiter = PostgresRateLimiter(settings.RATE_LIMIT_PER_MINUTE, settings.RATE_LIMIT_PER_HOUR)
+        else:
+            _rate_limiter = MemoryRateLimiter(
+                settings.RATE_LIMIT_PER_MINUTE,
+                settings.RATE_LIMIT_PER_HOUR,
+                max_keys=settings.RATE_LIMIT_MAX_KEYS
+            )
+    return _rate_limiter
+
+
+def route_cost(method: str, path: str, capacity: float) -> float:
+    """路由的成本 (不超過每分鐘上限，否則該路由永遠無法呼叫)"""
+    return min(ROUTE_COSTS.get((method, path.rstrip("/") or "/"), 1), capacity)
+
+
+def _bearer_token(headers) -> Optional[str]:
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return token.strip()
+            return None
+    return None
+
+
+class RateLimitMiddleware:
+    """
+    請求進入路由前扣除 token，超過時回應 429 與 Retry-After (純 ASGI)
+
+    放在 CORS 中介層內側：preflight 不計入，429 回應也帶有 CORS 標頭
+    """
+
+    def __init__(self, app, limiter=None, enabled: Optional[bool] = None):
+        self.app = app
+        self._limiter = limiter
+        self.enabled = settings.RATE_LIMIT_ENABLED if enabled is None else enabled
+
+    @property
+    def limiter(self):
+        if self._limiter is None:
+            self._limiter = get_rate_limiter()
+        return self._limiter
+
+    async def __call__(self, scope, receive, send):
+        if (not self.enabled or scope["type"] != "http" or scope["method"] == "OPTIONS"
+                or scope["path"] in EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter
+        client = scope.get("client")
+        key = client_key(_bearer_token(scope["headers"]), client[0] if client else None)
+        decision = await limiter.take(key, route_cost(scope["method"], scope["path"], limiter.per_minute))
+
+        if decision.allowed:
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = max(int(decision.retry_after + 0.999), 1)
+        body = orjson.dumps({"detail": "請求過於頻繁，請稍後再試"})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -2,13 +2,17 @@
 安全相關工具函數
 包含密碼哈希、JWT token生成等
 """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional
 import bcrypt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 from jose import JWTError, ExpiredSignatureError, jwt
 
+from .config import settings
+
 # Passlib expects bcrypt.__about__.__version__ (removed in bcrypt>=4.1), so shim it.
 if not hasattr(bcrypt, "__about__"):
     class _BcryptAbout:
@@ -36,6 +40,70 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+# bcrypt 專用執行緒池：每次雜湊約 250ms，在事件迴圈中執行會阻塞所有請求；
+# bcrypt 計算時會釋放 GIL，因此多個執行緒可以平行處理
+_password_executor: Optional[ThreadPoolExecutor] = None
+_password_pending = 0
+_password_rejected = 0
+
+
+def get_password_executor() -> ThreadPoolExecutor:
+    """取得密碼雜湊執行緒池"""
+    global _password_executor
+    if _password_executor is None:
+        _password_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            thread_name_prefix="password-hash"
+        )
+    return _password_executor
+
+
+async def _run_password_task(func, *args):
+    """在密碼雜湊執行緒池中執行，等待中的工作超過上限時回傳 503"""
+    global _password_pending, _password_rejected
+    if _password_pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        _password_rejected += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="登入請求過多，請稍後再試",
+            headers={"Retry-After": "1"},
+        )
+    _password_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_password_executor(), func, *args)
+    finally:
+        _password_pending -= 1
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """驗證密碼 (於執行緒池執行，不阻塞事件迴圈)"""
+    return await _run_password_task(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """生成密碼哈希 (於執行緒池執行，不阻塞事件迴圈)"""
+    return await _run_password_task(get_password_hash, password)
+
+
+def password_hash_stats() -> Dict:
+    """密碼雜湊執行緒池統計"""
+    return {
+        'workers': settings.PASSWORD_HASH_WORKERS,
+        'pending': _password_pending,
+        'max_pending': settings.PASSWORD_HASH_MAX_PENDING,
+        'rejected': _password_rejected,
+    }
+
+
+def shutdown_password_executor():
+    """關閉密碼雜湊執行緒池"""
+    global _password_executor
+    if _password_executor is not None:
+        _password_executor.shutdown(wait=False)
+        _password_executor = None
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     創建JWT access token
@@ -85,3 +153,26 @@ def decode_access_token(token: str) -> Optional[dict]:
             detail="Token 無效，請重新登入",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+def client_key(token: Optional[str], host: Optional[str]) -> str:
+    """
+    識別呼叫者 (用於配額與限流)：有效 Token 為 user:<username>，否則為 ip:<client ip>
+
+    只驗證簽章與期限，不查詢資料庫，也不因 Token 無效而拒絕請求
+
+    Args:
+        token: Bearer token (可為 None)
+        host: 用戶端 IP
+
+    Returns:
+        呼叫者的識別字串
+    """
+    if token:
+        try:
+            username = decode_access_token(token).get("sub")
+            if username:
+                return f"user:{username}"
+        except HTTPException:
+            pass
+    return f"ip:{host or 'unknown'}"
@@ -0,0 +1,246 @@
+"""
+結構化日誌
+請求路徑上只把記錄放進有上限的佇列 (滿了直接丟棄並計數，不會阻塞)，
+由背景執行緒格式化並寫出；每筆記錄帶有請求的 request_id。
+
+DEBUG 記錄依 request_id 取樣：同一請求的 DEBUG 記錄全部保留或全部略過，
+取樣到的請求可以看到完整的步驟。欄位以 extra={...} 傳入，
+text 格式輸出為 key=value，json 格式輸出為單行 JSON。
+"""
+import atexit
+import logging
+import queue
+import sys
+import uuid
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+import orjson
+
+from .config import settings
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# LogRecord 本身的屬性；其餘屬性視為 extra 傳入的欄位
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+def _logfmt_value(value) -> str:
+    text = str(value)
+    if not text or any(c in text for c in ' ="'):
+        return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return text
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    加上 request_id 並對 DEBUG 記錄取樣 (在呼叫端的執行緒中執行)
+
+    sample_rate 為 1 時保留所有 DEBUG 記錄；沒有 request_id 的 DEBUG 記錄 (背景工作) 一律保留
+    """
+
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self._threshold = int(sample_rate * 0xFFFFFFFF)
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = request_id_var.get()
+        record.request_id = request_id
+        if (record.levelno <= logging.DEBUG and request_id is not None and self.sample_rate < 1.0
+                and zlib.crc32(request_id.encode()) > self._threshold):
+            self.sampled_out += 1
+            return False
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """佇列已滿時丟棄記錄 (不阻塞呼叫端)"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只先展開訊息與例外文字 (之後的格式化在背景執行緒)，保留 extra 欄位
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """單行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        entry.update(_fields(record))
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    """時間 - logger - 等級 - 訊息 key=value ..."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        request_id = getattr(record, 'request_id', None)
+        pairs = ([('request_id', request_id)] if request_id else []) + list(_fields(record).items())
+        if pairs:
+            first_line, _, rest = line.partition('\n')
+            line = first_line + ' ' + ' '.join(f"{key}={_logfmt_value(value)}" for key, value in pairs)
+            if rest:
+                line += '\n' + rest
+        return line
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+_context_filter: Optional[RequestContextFilter] = None
+
+
+def setup_logging(
+    level: Optional[str] = None,
+    fmt: Optional[str] = None,
+    stream=None,
+    queue_size: Optional[int] = None,
+    debug_sample_rate: Optional[float] = None
+):
+    """
+    設定根 logger：佇列 handler + 背景寫出的 listener (重複呼叫時取代先前的設定)
+
+    Args:
+        level: 記錄等級 (預設 LOG_LEVEL)
+        fmt: text / json (預設 LOG_FORMAT)
+        stream: 輸出目標 (預設 stdout)
+        queue_size: 佇列上限 (預設 LOG_QUEUE_SIZE)
+        debug_sample_rate: DEBUG 記錄的取樣比例 (預設 LOG_DEBUG_SAMPLE_RATE)
+    """
+    global _listener, _queue_handler, _context_filter
+    shutdown_logging()
+
+    fmt = fmt or settings.LOG_FORMAT
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    log_queue: queue.Queue = queue.Queue(queue_size or settings.LOG_QUEUE_SIZE)
+    _context_filter = RequestContextFilter(
+        settings.LOG_DEBUG_SAMPLE_RATE if debug_sample_rate is None else debug_sample_rate
+    )
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(_context_filter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel((level or settings.LOG_LEVEL).upper())
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """停止背景寫出 (寫完佇列中剩餘的記錄)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_worker_logging():
+    """
+    回測行程池工作者的日誌設定
+
+    fork 出的工作者會繼承主行程的佇列 handler，但沒有背景執行緒寫出；
+    改為直接寫到 stderr (工作者內只有少量 WARNING 以上的記錄)
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+    output.addFilter(RequestContextFilter())
+    root.addHandler(output)
+    root.setLevel(max(logging.getLevelName(settings.LOG_LEVEL.upper()), logging.WARNING))
+
+
+def logging_stats() -> dict:
+    """日誌佇列統計"""
+    return {
+        'queued': _queue_handler.queue.qsize() if _queue_handler else 0,
+        'dropped': _queue_handler.dropped if _queue_handler else 0,
+        'sampled_out': _context_filter.sampled_out if _context_filter else 0,
+        'debug_sample_rate': _context_filter.sample_rate if _context_filter else 1.0,
+    }
+
+
+atexit.register(shutdown_logging)
+
+
+class RequestIdMiddleware:
+    """
+    為每個請求設定 request_id (沿用 X-Request-ID 標頭或產生新的)，並在回應中帶回
+
+    在 asyncio 工作與 to_thread 中的記錄也帶有同一個 request_id (contextvars 會被複製)
+    """
+
+    def __init__(self, app, header: str = "x-request-id"):
+        self.app = app
+        self.header = header.encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == self.header:
+                # 只接受合理長度的可見字元，避免日誌注入
+                candidate = value.decode('latin-1')
+                if 0 < len(candidate) <= 64 and candidate.isprintable() and ' ' not in candidate:
+                    request_id = candidate
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(self.header, request_id.encode())]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
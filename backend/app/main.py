@@ -17,15 +17,21 @@ from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 import logging
 
-from .core.database import init_db
+from .core.database import init_db, close_db
+from .core.async_database import close_async_db
 from .core.config import settings
-from .api import stocks, backtest, strategies, auth
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from .core.compression import CompressionMiddleware
+from .core.metrics import MetricsMiddleware
+from .core.rate_limit import RateLimitMiddleware
+from .core.structured_logging import RequestIdMiddleware, setup_logging
+from .api import stocks, backtest, strategies, auth, system, metrics
+from .services.data_refresher import get_refresher
+from .services.backtest_executor import shutdown_backtest_executor
+from .services.user_cache import start_user_listener, stop_user_listener
+from .core.security import shutdown_password_executor
+
+# 日誌經由佇列在背景執行緒寫出，請求路徑不會被輸出阻塞
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # 創建 FastAPI 應用
@@ -60,6 +66,9 @@ class CustomCORSMiddleware(BaseHTTPMiddleware):
             response.headers["Vary"] = "Origin"
         return response
 
+# 限流 (在 CORS 內側：preflight 不計入，429 回應也帶有 CORS 標頭)
+app.add_middleware(RateLimitMiddleware)
+
 # CORS 設定
 if settings.DEBUG:
     logger.info("Running in DEBUG mode - using custom CORS middleware to allow all origins")
@@ -74,19 +83,50 @@ else:
         allow_headers=["*"],
     )
 
+# 回應壓縮 (涵蓋所有路由與串流回應)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.RESPONSE_COMPRESS_MIN_SIZE,
+    gzip_level=settings.RESPONSE_GZIP_LEVEL,
+    brotli_quality=settings.RESPONSE_BROTLI_QUALITY
+)
+
+# 請求延遲指標 (包含壓縮時間)
+app.add_middleware(MetricsMiddleware)
+
+# 請求 ID (最外層，之後所有中介層與路由的日誌都帶有 request_id)
+app.add_middleware(RequestIdMiddleware)
+
 # Register routes
 app.include_router(auth.router)
 app.include_router(stocks.router)
 app.include_router(backtest.router)
 app.include_router(strategies.router)
+app.include_router(system.router)
+app.include_router(metrics.router)
 
 # 啟動時初始化資料庫
 @app.on_event("startup")
 async def startup_event():
     """應用啟動時執行"""
     logger.info("Application starting...")
-    init_db()
-    logger.info("Database initialized successfully")
+    if settings.DB_AUTO_MIGRATE:
+        init_db()
+        logger.info("Database initialized successfully")
+    start_user_listener()
+    if settings.DATA_REFRESH_ENABLED:
+        get_refresher().start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """應用關閉時執行"""
+    await get_refresher().stop()
+    await close_async_db()
+    shutdown_backtest_executor()
+    stop_user_listener()
+    shutdown_password_executor()
+    close_db()
 
 
 @app.get("/")
@@ -126,6 +166,7 @@ async def api_info():
         "api_version": "v1",
         "endpoints": {
             "health": "/health",
+            "metrics": "/metrics",
             "docs": "/docs",
             "auth": "/api/v1/auth",
             "strategies": "/api/v1/strategies",
@@ -2,22 +2,40 @@
 回測引擎
 執行策略回測並計算績效指標
 修正Look-ahead Bias: 信號產生在i-1天，交易執行在i天的開盤價
+資金曲線與 OHLCV 序列以 NumPy 陣列回傳 (由 core.encoding 直接序列化)
 """
+import logging
+
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
+from .indicators import IndicatorCache
+
+logger = logging.getLogger(__name__)
+
 
 class BacktestEngine:
     """回測引擎"""
 
-    def __init__(self, initial_capital: float = 100000):
+    def __init__(
+        self,
+        initial_capital: float = 100000,
+        periods_per_year: int = 252,
+        indicators: Optional[IndicatorCache] = None
+    ):
         self.initial_capital = initial_capital
+        self.periods_per_year = periods_per_year  # 年化用的每年 K 線根數 (日 K 為 252)
+        self.indicators = indicators  # 與其他策略共用的指標快取 (需為同一份價格資料)
         self.cash = initial_capital
         self.position = 0  # 持有股數
         self.trades = []  # 交易記錄
 
+    def _indicators(self, df: pd.DataFrame) -> IndicatorCache:
+        """共用的指標快取，未提供時為這份資料建立新的快取"""
+        return self.indicators if self.indicators is not None else IndicatorCache(df)
+
     def run_ma_strategy(
         self,
         df: pd.DataFrame,
@@ -36,9 +54,10 @@ class BacktestEngine:
             回測結果字典
         """
         # 計算移動平均線
+        indicators = self._indicators(df)
         df = df.copy()
-        df['MA_short'] = df['close'].rolling(window=short_period).mean()
-        df['MA_long'] = df['close'].rolling(window=long_period).mean()
+        df['MA_short'] = indicators.sma(short_period)
+        df['MA_long'] = indicators.sma(long_period)
 
         # 初始化
         self.cash = self.initial_capital
@@ -137,15 +156,15 @@ class BacktestEngine:
             'losing_trades': metrics['losing_trades'],
             'win_rate': metrics['win_rate'],
             'trades': self.trades,
-            'portfolio_values': portfolio_values,
+            'portfolio_values': np.asarray(portfolio_values, dtype=np.float64),
             'dates': df['date'].tolist(),
-            'prices': df['close'].tolist(),
+            'prices': df['close'].to_numpy(dtype=np.float64),
             'ohlc': {
-                'open': df['open'].tolist(),
-                'high': df['high'].tolist(),
-                'low': df['low'].tolist(),
-                'close': df['close'].tolist(),
-                'volume': df['volume'].tolist() if 'volume' in df.columns else []
+                'open': df['open'].to_numpy(dtype=np.float64),
+                'high': df['high'].to_numpy(dtype=np.float64),
+                'low': df['low'].to_numpy(dtype=np.float64),
+                'close': df['close'].to_numpy(dtype=np.float64),
+                'volume': df['volume'].to_numpy() if 'volume' in df.columns else np.array([], dtype=np.int64)
             }
         }
 
@@ -160,12 +179,12 @@ class BacktestEngine:
         # 總報酬率
         total_return = ((final_value - self.initial_capital) / self.initial_capital) * 100
 
-        # 計算每日報酬率
+        # 計算每根 K 線的報酬率
         returns = pd.Series(portfolio_values).pct_change().dropna()
 
         # 夏普比率 (假設無風險利率為0)
         if len(returns) > 0 and returns.std() != 0:
-            sharpe_ratio = (returns.mean() / returns.std()) * (252 ** 0.5)  # 年化
+            sharpe_ratio = (returns.mean() / returns.std()) * (self.periods_per_year ** 0.5)  # 年化
         else:
             sharpe_ratio = 0
 
@@ -213,14 +232,11 @@ class BacktestEngine:
         當RSI < oversold 買入，RSI > overbought 賣出
         修正Look-ahead Bias: 使用前一天的RSI值來產生今天的交易信號
         """
+        indicators = self._indicators(df)
         df = df.copy()
 
         # 計算RSI
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=rsi_period).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=rsi_period).mean()
-        rs = gain / loss
-        df['RSI'] = 100 - (100 / (1 + rs))
+        df['RSI'] = indicators.rsi(rsi_period)
 
         # 初始化
         self.cash = self.initial_capital
@@ -298,15 +314,15 @@ class BacktestEngine:
             'losing_trades': metrics['losing_trades'],
             'win_rate': metrics['win_rate'],
             'trades': self.trades,
-            'portfolio_values': portfolio_values,
+            'portfolio_values': np.asarray(portfolio_values, dtype=np.float64),
             'dates': df['date'].tolist(),
-            'prices': df['close'].tolist(),
+            'prices': df['close'].to_numpy(dtype=np.float64),
             'ohlc': {
-                'open': df['open'].tolist(),
-                'high': df['high'].tolist(),
-                'low': df['low'].tolist(),
-                'close': df['close'].tolist(),
-                'volume': df['volume'].tolist() if 'volume' in df.columns else []
+                'open': df['open'].to_numpy(dtype=np.float64),
+                'high': df['high'].to_numpy(dtype=np.float64),
+                'low': df['low'].to_numpy(dtype=np.float64),
+                'close': df['close'].to_numpy(dtype=np.float64),
+                'volume': df['volume'].to_numpy() if 'volume' in df.columns else np.array([], dtype=np.int64)
             }
         }
 
@@ -322,13 +338,11 @@ class BacktestEngine:
         MACD線上穿信號線買入，下穿賣出
         修正Look-ahead Bias: 使用前一天的MACD交叉來產生今天的交易信號
         """
+        indicators = self._indicators(df)
         df = df.copy()
 
         # 計算MACD
-        ema_fast = df['close'].ewm(span=macd_fast, adjust=False).mean()
-        ema_slow = df['close'].ewm(span=macd_slow, adjust=False).mean()
-        df['MACD'] = ema_fast - ema_slow
-        df['MACD_signal'] = df['MACD'].ewm(span=macd_signal, adjust=False).mean()
+        df['MACD'], df['MACD_signal'] = indicators.macd(macd_fast, macd_slow, macd_signal)
         df['MACD_hist'] = df['MACD'] - df['MACD_signal']
 
         # 初始化
@@ -416,15 +430,15 @@ class BacktestEngine:
             'losing_trades': metrics['losing_trades'],
             'win_rate': metrics['win_rate'],
             'trades': self.trades,
-            'portfolio_values': portfolio_values,
+            'portfolio_values': np.asarray(portfolio_values, dtype=np.float64),
             'dates': df['date'].tolist(),
-            'prices': df['close'].tolist(),
+            'prices': df['close'].to_numpy(dtype=np.float64),
             'ohlc': {
-                'open': df['open'].tolist(),
-                'high': df['high'].tolist(),
-                'low': df['low'].tolist(),
-                'close': df['close'].tolist(),
-                'volume': df['volume'].tolist() if 'volume' in df.columns else []
+                'open': df['open'].to_numpy(dtype=np.float64),
+                'high': df['high'].to_numpy(dtype=np.float64),
+                'low': df['low'].to_numpy(dtype=np.float64),
+                'close': df['close'].to_numpy(dtype=np.float64),
+                'volume': df['volume'].to_numpy() if 'volume' in df.columns else np.array([], dtype=np.int64)
             }
         }
 
@@ -439,11 +453,12 @@ class BacktestEngine:
         價格觸及下軌買入，觸及上軌賣出
         修正Look-ahead Bias: 使用前一天的價格和布林通道來產生今天的交易信號
         """
+        indicators = self._indicators(df)
         df = df.copy()
 
         # 計算布林通道
-        df['BB_middle'] = df['close'].rolling(window=bb_period).mean()
-        df['BB_std'] = df['close'].rolling(window=bb_period).std()
+        df['BB_middle'] = indicators.sma(bb_period)
+        df['BB_std'] = indicators.rolling_std(bb_period)
         df['BB_upper'] = df['BB_middle'] + (df['BB_std'] * bb_std_dev)
         df['BB_lower'] = df['BB_middle'] - (df['BB_std'] * bb_std_dev)
 
@@ -523,15 +538,15 @@ class BacktestEngine:
             'losing_trades': metrics['losing_trades'],
             'win_rate': metrics['win_rate'],
             'trades': self.trades,
-            'portfolio_values': portfolio_values,
+            'portfolio_values': np.asarray(portfolio_values, dtype=np.float64),
             'dates': df['date'].tolist(),
-            'prices': df['close'].tolist(),
+            'prices': df['close'].to_numpy(dtype=np.float64),
             'ohlc': {
-                'open': df['open'].tolist(),
-                'high': df['high'].tolist(),
-                'low': df['low'].tolist(),
-                'close': df['close'].tolist(),
-                'volume': df['volume'].tolist() if 'volume' in df.columns else []
+                'open': df['open'].to_numpy(dtype=np.float64),
+                'high': df['high'].to_numpy(dtype=np.float64),
+                'low': df['low'].to_numpy(dtype=np.float64),
+                'close': df['close'].to_numpy(dtype=np.float64),
+                'volume': df['volume'].to_numpy() if 'volume' in df.columns else np.array([], dtype=np.int64)
             }
         }
 
@@ -570,9 +585,11 @@ class BacktestEngine:
         grid_step = (grid_upper_price - grid_lower_price) / grid_num_grids
         grid_prices = [grid_lower_price + i * grid_step for i in range(grid_num_grids + 1)]
 
-        print(f"   Grid range: NT${grid_lower_price:.2f} - NT${grid_upper_price:.2f}")
-        print(f"   Grid step: NT${grid_step:.2f}")
-        print(f"   Grid prices: {[f'{p:.2f}' for p in grid_prices[:5]]}...")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Grid levels", extra={
+                'grid_lower': round(grid_lower_price, 2), 'grid_upper': round(grid_upper_price, 2),
+                'grid_step': round(grid_step, 2), 'grid_levels': len(grid_prices),
+            })
 
         # 初始化
         self.cash = self.initial_capital
@@ -668,14 +685,14 @@ class BacktestEngine:
             'losing_trades': metrics['losing_trades'],
             'win_rate': metrics['win_rate'],
             'trades': self.trades,
-            'portfolio_values': portfolio_values,
+            'portfolio_values': np.asarray(portfolio_values, dtype=np.float64),
             'dates': df['date'].tolist(),
-            'prices': df['close'].tolist(),
+            'prices': df['close'].to_numpy(dtype=np.float64),
             'ohlc': {
-                'open': df['open'].tolist(),
-                'high': df['high'].tolist(),
-                'low': df['low'].tolist(),
-                'close': df['close'].tolist(),
-                'volume': df['volume'].tolist() if 'volume' in df.columns else []
+                'open': df['open'].to_numpy(dtype=np.float64),
+                'high': df['high'].to_numpy(dtype=np.float64),
+                'low': df['low'].to_numpy(dtype=np.float64),
+                'close': df['close'].to_numpy(dtype=np.float64),
+                'volume': df['volume'].to_numpy() if 'volume' in df.columns else np.array([], dtype=np.int64)
             }
         }
@@ -0,0 +1,267 @@
+"""
+回測執行器
+將 CPU 密集的回測計算送到有上限的行程池 (或執行緒池)，事件迴圈不會被阻塞；
+提供每位用戶的並行上限、佇列上限、逾時與取消，並統計佇列深度與等待時間
+"""
+import asyncio
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..core.metrics import BACKTEST_QUEUE_WAIT
+from ..core.structured_logging import setup_worker_logging
+
+
+class BacktestUserLimitExceeded(Exception):
+    """同一用戶同時進行的回測超過上限"""
+
+
+class BacktestQueueFull(Exception):
+    """等待中的回測超過佇列上限"""
+
+
+def _timed_call(fn: Callable, args: Tuple) -> Tuple[Any, float, float]:
+    """在工作者中執行並回傳 (結果, 開始時間, 結束時間)，用於計算排隊等待時間"""
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time()
+
+
+class BacktestExecutor:
+    """有上限的回測執行器"""
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_per_user: int = 2,
+        max_queue: int = 32,
+        timeout: float = 120.0,
+        kind: str = "process"
+    ):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.max_workers = max_workers
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.kind = kind
+
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._user_active: Dict[str, int] = defaultdict(int)
+        self._in_flight = 0
+        # 等待用戶額度的 (事件迴圈, future)，該用戶有工作結束時喚醒
+        self._slot_waiters: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = defaultdict(list)
+
+        self._wait_times: Deque[float] = deque(maxlen=1000)
+        self._run_times: Deque[float] = deque(maxlen=1000)
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.rejected_user_limit = 0
+        self.rejected_queue_full = 0
+        self.slot_waits = 0
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                # 工作者只執行純計算 (不使用資料庫連接)，沿用平台預設的啟動方式
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=setup_worker_logging)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="backtest")
+        return self._pool
+
+    def _admit(self, user_key: str, waiter: Optional[Tuple] = None) -> bool:
+        """
+        佔用用戶額度與佇列位置
+
+        用戶額度已滿時：未指定 waiter 則拋出 BacktestUserLimitExceeded，
+        否則登記 waiter (該用戶有工作結束時喚醒) 並回傳 False
+        """
+        with self._lock:
+            if self._user_active.get(user_key, 0) >= self.max_per_user:
+                if waiter is not None:
+                    self._slot_waiters[user_key].append(waiter)
+                    return False
+                self.rejected_user_limit += 1
+                raise BacktestUserLimitExceeded(user_key)
+            if self._in_flight - self.max_workers >= self.max_queue:
+                self.rejected_queue_full += 1
+                raise BacktestQueueFull()
+            self._user_active[user_key] += 1
+            self._in_flight += 1
+            return True
+
+    async def _admit_waiting(self, user_key: str):
+        """佔用用戶額度，額度已滿時等待 (佇列已滿仍直接拒絕)"""
+        loop = asyncio.get_running_loop()
+        waited = False
+        while True:
+            future = loop.create_future()
+            if self._admit(user_key, (loop, future)):
+                return
+            if not waited:
+                waited = True
+                self.slot_waits += 1
+            await future
+
+    @staticmethod
+    def _wake(future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
+
+    def _release(self, user_key: str):
+        # 由工作池的執行緒呼叫：等待者以 call_soon_threadsafe 在各自的事件迴圈中喚醒
+        with self._lock:
+            self._user_active[user_key] -= 1
+            if self._user_active[user_key] <= 0:
+                del self._user_active[user_key]
+            self._in_flight -= 1
+            waiters = self._slot_waiters.pop(user_key, [])
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(self._wake, future)
+            except RuntimeError:
+                # 事件迴圈已關閉
+                pass
+
+    async def run(
+        self,
+        user_key: str,
+        fn: Callable,
+        *args,
+        timeout: Optional[float] = None,
+        wait_for_slot: bool = False
+    ) -> Any:
+        """在工作池中執行 fn(*args) (見 run_timed)"""
+        result, _ = await self.run_timed(user_key, fn, *args, timeout=timeout, wait_for_slot=wait_for_slot)
+        return result
+
+    async def run_timed(
+        self,
+        user_key: str,
+        fn: Callable,
+        *args,
+        timeout: Optional[float] = None,
+        wait_for_slot: bool = False
+    ) -> Tuple[Any, float]:
+        """
+        在工作池中執行 fn(*args)，並回傳工作者實際計算的秒數 (不含排隊)
+
+        用戶額度與佇列位置保留到工作真正結束 (被取消的執行中工作仍會佔用直到完成)，
+        確保同時進行的計算量有上限
+
+        Args:
+            wait_for_slot: 用戶額度已滿時等待其他工作結束，而不是拒絕 (批次比較使用；
+                等待時間不計入 timeout)
+
+        Returns:
+            (結果, 計算秒數)
+
+        Raises:
+            BacktestUserLimitExceeded: 該用戶進行中的回測已達上限 (wait_for_slot 為 False 時)
+            BacktestQueueFull: 佇列已滿
+            asyncio.TimeoutError: 超過逾時
+        """
+        if wait_for_slot:
+            await self._admit_waiting(user_key)
+        else:
+            self._admit(user_key)
+        submitted = time.time()
+        try:
+            future = self._get_pool().submit(_timed_call, fn, args)
+        except Exception:
+            self._release(user_key)
+            raise
+        future.add_done_callback(lambda f: self._release(user_key))
+
+        try:
+            result, started, finished = await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout or self.timeout
+            )
+        except asyncio.TimeoutError:
+            future.cancel()
+            self.timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            future.cancel()
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+
+        self._wait_times.append(started - submitted)
+        self._run_times.append(finished - started)
+        BACKTEST_QUEUE_WAIT.observe(max(started - submitted, 0.0))
+        self.completed += 1
+        return result, finished - started
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    @staticmethod
+    def _summary(values: Deque[float]) -> Dict:
+        if not values:
+            return {'avg_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+        ms = np.array(values) * 1000
+        return {
+            'avg_ms': round(float(ms.mean()), 2),
+            'p95_ms': round(float(np.percentile(ms, 95)), 2),
+            'max_ms': round(float(ms.max()), 2),
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            in_flight = self._in_flight
+            active_users = len(self._user_active)
+        return {
+            'kind': self.kind,
+            'max_workers': self.max_workers,
+            'running': min(in_flight, self.max_workers),
+            'queue_depth': max(in_flight - self.max_workers, 0),
+            'active_users': active_users,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'cancelled': self.cancelled,
+            'rejected_user_limit': self.rejected_user_limit,
+            'rejected_queue_full': self.rejected_queue_full,
+            'slot_waits': self.slot_waits,
+            'wait_time': self._summary(self._wait_times),
+            'run_time': self._summary(self._run_times),
+        }
+
+
+# 全域回測執行器
+_executor: Optional[BacktestExecutor] = None
+
+
+def get_backtest_executor() -> BacktestExecutor:
+    """取得回測執行器"""
+    global _executor
+    if _executor is None:
+        _executor = BacktestExecutor(
+            max_workers=settings.MAX_WORKERS,
+            max_per_user=settings.BACKTEST_MAX_PER_USER,
+            max_queue=settings.BACKTEST_MAX_QUEUE,
+            timeout=settings.BACKTEST_TIMEOUT_SECONDS,
+            kind=settings.BACKTEST_EXECUTOR
+        )
+    return _executor
+
+
+def shutdown_backtest_executor():
+    """關閉回測執行器"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
@@ -0,0 +1,181 @@
+"""
+回測歷史記錄
+每次完成的回測寫入 backtests (請求參數)、backtest_results (績效摘要與壓縮的資金曲線)
+與 backtest_transactions (交易明細，以 COPY 批次寫入)。列表只讀摘要欄位，
+資金曲線 (BYTEA，TOAST 另行存放) 只在明確要求時才讀取。
+"""
+import io
+import json
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..core.async_database import fetch_all, fetch_one
+from ..core.encoding import decode_msgpack, encode_msgpack
+
+SUMMARY_COLUMNS = """
+    b.id, b.strategy_id, b.stock_symbol AS symbol, b.strategy_type, b.interval,
+    b.start_date::text AS start_date, b.end_date::text AS end_date,
+    b.initial_capital::float8 AS initial_capital, b.created_at::text AS created_at,
+    r.final_value::float8 AS final_value, r.total_return::float8 AS total_return,
+    r.buy_hold_return::float8 AS buy_hold_return, r.sharpe_ratio::float8 AS sharpe_ratio,
+    r.max_drawdown::float8 AS max_drawdown, r.win_rate::float8 AS win_rate,
+    r.total_trades, r.curve_length
+"""
+
+
+def encode_curve(dates: List[str], portfolio_values: np.ndarray) -> bytes:
+    """資金曲線壓縮為 zlib(MessagePack)，數值為 float64 原始位元組"""
+    content = {'dates': list(dates), 'portfolio_values': np.asarray(portfolio_values, dtype=np.float64)}
+    return zlib.compress(encode_msgpack(content), 6)
+
+
+def decode_curve(blob: bytes) -> Dict:
+    """還原 encode_curve 的輸出 (portfolio_values 為 NumPy 陣列)"""
+    return decode_msgpack(zlib.decompress(blob))
+
+
+def copy_transactions(cursor, backtest_id: int, trades: List[Dict]) -> int:
+    """
+    以 COPY 寫入交易明細 (不提交交易)
+
+    Returns:
+        寫入筆數
+    """
+    if not trades:
+        return 0
+
+    buffer = io.StringIO()
+    for seq, trade in enumerate(trades, start=1):
+        signal = (trade.get('signal') or '').replace('\\', '\\\\').replace('\t', ' ').replace('\n', ' ')
+        buffer.write(
+            f"{backtest_id}\t{seq}\t{trade['date']}\t{trade['action']}\t"
+            f"{float(trade['price'])!r}\t{float(trade['shares'])!r}\t{float(trade['amount'])!r}\t{signal}\n"
+        )
+    buffer.seek(0)
+    cursor.copy_expert(
+        "COPY backtest_transactions (backtest_id, seq, traded_at, action, price, shares, amount, signal) "
+        "FROM STDIN",
+        buffer
+    )
+    return len(trades)
+
+
+def save_backtest(
+    conn,
+    user_id: int,
+    parameters: Dict,
+    results: Dict,
+    strategy_id: Optional[int] = None
+) -> int:
+    """
+    儲存一次完成的回測 (同一交易內寫入三個表並提交)
+
+    Args:
+        conn: 資料庫連接
+        user_id: 用戶 ID
+        parameters: 回測請求參數 (BacktestRequest.model_dump())
+        results: run_strategy 的結果
+        strategy_id: 來源的已儲存策略 (可為 None)
+
+    Returns:
+        backtests.id
+    """
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO backtests
+            (user_id, strategy_id, stock_symbol, strategy_type, interval,
+             start_date, end_date, initial_capital, parameters)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
+        """, (
+            user_id, strategy_id, parameters['symbol'], parameters['strategy_type'],
+            parameters.get('interval', '1d'), parameters['start_date'], parameters['end_date'],
+            parameters['initial_capital'], json.dumps(parameters)
+        ))
+        backtest_id = cursor.fetchone()[0]
+
+        curve = results['portfolio_values']
+        cursor.execute("""
+            INSERT INTO backtest_results
+            (backtest_id, final_value, total_return, buy_hold_return, sharpe_ratio, max_drawdown,
+             win_rate, total_trades, winning_trades, losing_trades, curve_length, equity_curve)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (
+            backtest_id, float(results['final_value']), float(results['total_return']),
+            float(results['buy_hold_return']), float(results['sharpe_ratio']),
+            float(results['max_drawdown']), float(results['win_rate']),
+            int(results['total_trades']), int(results['winning_trades']), int(results['losing_trades']),
+            len(curve), encode_curve(results['dates'], curve)
+        ))
+        copy_transactions(cursor, backtest_id, results['trades'])
+        cursor.close()
+
+        conn.commit()
+        return backtest_id
+
+    except Exception:
+        conn.rollback()
+        raise
+
+
+async def list_backtests(
+    user_id: int,
+    limit: int = 20,
+    before_id: Optional[int] = None,
+    symbol: Optional[str] = None
+) -> List[Dict]:
+    """
+    用戶的回測摘要，由新到舊 (以 id 分頁：before_id 為上一頁最後一筆的 id)
+
+    沿 (user_id, id DESC) 索引讀取，不讀取資金曲線
+    """
+    return await fetch_all(f"""
+        SELECT {SUMMARY_COLUMNS}
+        FROM backtests b
+        JOIN backtest_results r ON r.backtest_id = b.id
+        WHERE b.user_id = $1
+          AND ($2::bigint IS NULL OR b.id < $2)
+          AND ($3::text IS NULL OR b.stock_symbol = $3)
+        ORDER BY b.id DESC
+        LIMIT $4
+    """, user_id, before_id, symbol, limit)
+
+
+async def get_backtest(
+    user_id: int,
+    backtest_id: int,
+    include_curve: bool = False,
+    include_transactions: bool = False
+) -> Optional[Dict]:
+    """
+    單筆回測 (只能讀取自己的記錄)
+
+    Returns:
+        摘要與 parameters；include_curve 時加上 curve (dates / portfolio_values)，
+        include_transactions 時加上 transactions。不存在時為 None
+    """
+    curve_column = ", r.equity_curve" if include_curve else ""
+    row = await fetch_one(f"""
+        SELECT {SUMMARY_COLUMNS}, b.parameters::text AS parameters{curve_column}
+        FROM backtests b
+        JOIN backtest_results r ON r.backtest_id = b.id
+        WHERE b.id = $1 AND b.user_id = $2
+    """, backtest_id, user_id)
+    if row is None:
+        return None
+
+    row['parameters'] = json.loads(row['parameters'])
+    if include_curve:
+        row['curve'] = decode_curve(row.pop('equity_curve'))
+    if include_transactions:
+        row['transactions'] = await fetch_all("""
+            SELECT seq, traded_at::text AS traded_at, action, price::float8 AS price,
+                   shares::float8 AS shares, amount::float8 AS amount, signal
+            FROM backtest_transactions
+            WHERE backtest_id = $1
+            ORDER BY seq
+        """, backtest_id)
+    return row
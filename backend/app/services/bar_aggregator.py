@@ -0,0 +1,331 @@
+"""
+逐筆成交 → 盤中 K 線彙整
+分段讀取逐筆檔，一次掃描同時產生多個週期的 OHLCV K 線 (記憶體用量固定：
+一個分段 + 每個週期一根尚未完成的 K 線)，再以 COPY 批次寫入依時間分區的 intraday_bars
+"""
+import argparse
+import io
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..core.config import settings
+from .trading_calendar import TAIPEI_TZ
+
+# 支援的週期 (秒)
+TIMEFRAMES = {'1m': 60, '5m': 300, '15m': 900}
+
+BAR_COLUMNS = ['ts', 'open', 'high', 'low', 'close', 'volume']
+
+# 一個交易日 (09:00-13:30) 的分鐘數，用於年化
+SESSION_MINUTES = 270
+
+
+def parse_timeframes(value: str) -> List[str]:
+    """解析逗號分隔的週期字串"""
+    timeframes = [tf.strip() for tf in value.split(',') if tf.strip()]
+    unknown = [tf for tf in timeframes if tf not in TIMEFRAMES]
+    if unknown:
+        raise ValueError(f"Unsupported timeframe: {', '.join(unknown)}")
+    return timeframes
+
+
+def bars_per_session(timeframe: str) -> int:
+    """每個交易日的 K 線根數"""
+    return SESSION_MINUTES * 60 // TIMEFRAMES[timeframe]
+
+
+# 台灣自 1979 年起無日光節約時間，固定 UTC+8 (避免逐筆 tz_localize 的成本)
+TAIPEI_UTC_OFFSET_NS = 8 * 3600 * 10**9
+
+
+def _to_epoch_ns(values: pd.Series) -> np.ndarray:
+    """時間欄位轉為 UTC epoch 奈秒 (無時區者視為台北時間)"""
+    ts = pd.to_datetime(values)
+    if ts.dt.tz is None:
+        return ts.to_numpy(dtype='datetime64[ns]').astype(np.int64) - TAIPEI_UTC_OFFSET_NS
+    return ts.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+
+def _reduce(ts: np.ndarray, price: np.ndarray, volume: np.ndarray, width_ns: int) -> Tuple[np.ndarray, ...]:
+    """依週期分組 (ts 已排序)，回傳每組的 (起始時間, open, high, low, close, volume)"""
+    buckets = ts - ts % width_ns
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    return (
+        buckets[starts],
+        price[starts],
+        np.maximum.reduceat(price, starts),
+        np.minimum.reduceat(price, starts),
+        price[ends],
+        np.add.reduceat(volume, starts),
+    )
+
+
+class BarAggregator:
+    """
+    串流式多週期 K 線彙整
+
+    依序餵入逐筆分段 (update)，回傳各週期已完成的 K 線；每個週期最後一根
+    K 線可能跨到下一個分段，暫存到下次 update 或 flush 才輸出。
+    逐筆須大致依時間排序，早於已處理時間的逐筆視為延遲資料並捨棄。
+    """
+
+    def __init__(self, timeframes: Sequence[str] = ('1m', '5m', '15m')):
+        self.timeframes = list(timeframes)
+        self._pending: Dict[str, Optional[Tuple]] = {tf: None for tf in self.timeframes}
+        self._watermark: Optional[int] = None
+        self.ticks = 0
+        self.late_ticks = 0
+
+    def update(self, ticks: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """
+        處理一個逐筆分段
+
+        Args:
+            ticks: 含 ts / price / volume 欄位的 DataFrame
+
+        Returns:
+            {週期: 已完成的 K 線 DataFrame}
+        """
+        ts = _to_epoch_ns(ticks['ts'])
+        price = ticks['price'].to_numpy(dtype=float)
+        volume = ticks['volume'].to_numpy(dtype=np.int64)
+
+        valid = ~np.isnan(price)
+        if self._watermark is not None:
+            late = ts < self._watermark
+            self.late_ticks += int(late.sum())
+            valid &= ~late
+        ts, price, volume = ts[valid], price[valid], volume[valid]
+
+        if len(ts) and np.any(ts[1:] < ts[:-1]):
+            order = np.argsort(ts, kind='stable')
+            ts, price, volume = ts[order], price[order], volume[order]
+
+        if len(ts) == 0:
+            return {tf: self._frame([]) for tf in self.timeframes}
+
+        self.ticks += len(ts)
+        self._watermark = int(ts[-1])
+        completed = {}
+        for tf in self.timeframes:
+            groups = list(zip(*_reduce(ts, price, volume, TIMEFRAMES[tf] * 10**9)))
+
+            pending = self._pending[tf]
+            bars = []
+            if pending is not None:
+                first = groups[0]
+                if first[0] == pending[0]:
+                    groups[0] = (
+                        pending[0], pending[1], max(pending[2], first[2]),
+                        min(pending[3], first[3]), first[4], pending[5] + first[5]
+                    )
+                else:
+                    bars.append(pending)
+
+            bars.extend(groups[:-1])
+            self._pending[tf] = groups[-1]
+            completed[tf] = self._frame(bars)
+
+        return completed
+
+    def flush(self) -> Dict[str, pd.DataFrame]:
+        """輸出所有尚未完成的 K 線 (資料結束時呼叫)"""
+        completed = {}
+        for tf in self.timeframes:
+            pending = self._pending[tf]
+            completed[tf] = self._frame([pending] if pending is not None else [])
+            self._pending[tf] = None
+        return completed
+
+    @staticmethod
+    def _frame(bars: List[Tuple]) -> pd.DataFrame:
+        df = pd.DataFrame(bars, columns=BAR_COLUMNS)
+        df['ts'] = pd.to_datetime(df['ts'].astype(np.int64), utc=True).dt.tz_convert(TAIPEI_TZ)
+        return df
+
+
+def read_ticks(path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    """
+    分段讀取逐筆檔 (CSV，欄位 ts,price,volume)
+
+    Yields:
+        逐筆分段 DataFrame
+    """
+    yield from pd.read_csv(
+        path,
+        usecols=['ts', 'price', 'volume'],
+        dtype={'price': float, 'volume': np.int64},
+        chunksize=chunksize
+    )
+
+
+def aggregate_file(
+    path: str,
+    timeframes: Sequence[str],
+    chunksize: int
+) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    彙整整個逐筆檔
+
+    Yields:
+        (週期, 已完成的 K 線) — 同一週期的 K 線依時間順序產出
+    """
+    aggregator = BarAggregator(timeframes)
+    for chunk in read_ticks(path, chunksize):
+        for tf, bars in aggregator.update(chunk).items():
+            if not bars.empty:
+                yield tf, bars
+    for tf, bars in aggregator.flush().items():
+        if not bars.empty:
+            yield tf, bars
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def ensure_partitions(conn, days: Sequence[date], known: Optional[set] = None):
+    """建立涵蓋指定日期 (台北時間) 的月分區 (intraday_bars_yYYYYmMM)"""
+    known = known if known is not None else set()
+    cursor = conn.cursor()
+    for month in sorted({_month_start(d) for d in days} - known):
+        next_month = _month_start(month + timedelta(days=32))
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS intraday_bars_y{month:%Y}m{month:%m}
+            PARTITION OF intraday_bars
+            FOR VALUES FROM ('{month.isoformat()} 00:00+08') TO ('{next_month.isoformat()} 00:00+08')
+        """)
+        known.add(month)
+    cursor.close()
+
+
+def copy_bars(conn, symbol: str, timeframe: str, bars: pd.DataFrame) -> int:
+    """
+    以 COPY 寫入 K 線 (先寫入暫存表再 upsert，重複匯入同一時段會覆蓋)
+
+    不提交交易，由呼叫端提交
+
+    Returns:
+        寫入筆數
+    """
+    if bars.empty:
+        return 0
+
+    buffer = io.StringIO()
+    out = bars[BAR_COLUMNS].copy()
+    out.insert(0, 'timeframe', timeframe)
+    out.insert(0, 'symbol', symbol)
+    out['ts'] = out['ts'].map(lambda t: t.isoformat())
+    out.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS intraday_bars_staging
+        (LIKE intraday_bars INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+    """)
+    cursor.copy_expert(
+        f"COPY intraday_bars_staging (symbol, timeframe, {', '.join(BAR_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+    cursor.execute("""
+        INSERT INTO intraday_bars (symbol, timeframe, ts, open, high, low, close, volume)
+        SELECT symbol, timeframe, ts, open, high, low, close, volume FROM intraday_bars_staging
+        ON CONFLICT (symbol, timeframe, ts)
+        DO UPDATE SET
+            open = EXCLUDED.open,
+            high = EXCLUDED.high,
+            low = EXCLUDED.low,
+            close = EXCLUDED.close,
+            volume = EXCLUDED.volume
+    """)
+    cursor.execute("TRUNCATE intraday_bars_staging")
+    cursor.close()
+    return len(bars)
+
+
+def ingest_tick_file(
+    conn,
+    path: str,
+    symbol: str,
+    timeframes: Optional[Sequence[str]] = None,
+    chunksize: Optional[int] = None
+) -> Dict:
+    """
+    將逐筆檔彙整為 K 線並寫入資料庫 (每批提交一次)
+
+    Args:
+        conn: 資料庫連接
+        path: 逐筆 CSV 路徑
+        symbol: 股票代號
+        timeframes: 週期列表 (預設 INTRADAY_TIMEFRAMES)
+        chunksize: 每次讀取的逐筆筆數 (預設 TICK_CHUNK_SIZE)
+
+    Returns:
+        各週期寫入筆數
+    """
+    timeframes = timeframes or parse_timeframes(settings.INTRADAY_TIMEFRAMES)
+    chunksize = chunksize or settings.TICK_CHUNK_SIZE
+    partitions: set = set()
+    counts = {tf: 0 for tf in timeframes}
+
+    try:
+        for tf, bars in aggregate_file(path, timeframes, chunksize):
+            ensure_partitions(conn, bars['ts'].dt.date.unique().tolist(), partitions)
+            counts[tf] += copy_bars(conn, symbol, tf, bars)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return counts
+
+
+def query_bars(conn, symbol: str, timeframe: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """
+    讀取盤中 K 線 ([start_date, end_date] 台北時間，含結束日)
+
+    Returns:
+        date (YYYY-MM-DD HH:MM) / open / high / low / close / volume 格式的 DataFrame
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT to_char(ts AT TIME ZONE 'Asia/Taipei', 'YYYY-MM-DD HH24:MI') as date,
+               open::float8, high::float8, low::float8, close::float8, volume
+        FROM intraday_bars
+        WHERE symbol = %s AND timeframe = %s
+          AND ts >= %s::timestamp AT TIME ZONE 'Asia/Taipei'
+          AND ts < (%s::date + 1)::timestamp AT TIME ZONE 'Asia/Taipei'
+        ORDER BY ts ASC
+    """, (symbol, timeframe, start_date, end_date))
+    rows = cursor.fetchall()
+    cursor.close()
+    return pd.DataFrame(rows, columns=['date', 'open', 'high', 'low', 'close', 'volume'])
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令列：python -m app.services.bar_aggregator ticks.csv --symbol 2330.TW"""
+    parser = argparse.ArgumentParser(description="彙整逐筆成交檔為盤中 K 線並寫入資料庫")
+    parser.add_argument('paths', nargs='+', help="逐筆 CSV (欄位 ts,price,volume)")
+    parser.add_argument('--symbol', required=True)
+    parser.add_argument('--timeframes', default=settings.INTRADAY_TIMEFRAMES)
+    parser.add_argument('--chunksize', type=int, default=settings.TICK_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    from ..core.database import db_connection
+
+    timeframes = parse_timeframes(args.timeframes)
+    for path in args.paths:
+        started = datetime.now()
+        with db_connection() as conn:
+            counts = ingest_tick_file(conn, path, args.symbol, timeframes, args.chunksize)
+        elapsed = (datetime.now() - started).total_seconds()
+        print(f"{path}: {counts} ({elapsed:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+背景資料更新服務
+每日收盤後增量更新所有 is_active 股票的歷史價格，
+讓第一位使用者的回測不必等待即時抓取
+"""
+import asyncio
+import logging
+from datetime import datetime, date, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from ..core.database import db_connection
+from .market_data import fetch_history
+from .stock_crawler import StockCrawler
+from .trading_calendar import TAIPEI_TZ, get_trading_calendar
+
+logger = logging.getLogger(__name__)
+
+
+def load_refresh_targets(conn) -> List[Tuple[str, Optional[date]]]:
+    """取得所有啟用中的股票及其資料庫內最新的價格日期"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT s.symbol, MAX(p.date) AS last_date
+        FROM stocks s
+        LEFT JOIN stock_prices p ON p.symbol = s.symbol
+        WHERE s.is_active = TRUE
+        GROUP BY s.symbol
+        ORDER BY s.symbol
+    """)
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+class DataRefresher:
+    """收盤後的排程更新器 (在 FastAPI 的事件迴圈中執行)"""
+
+    def __init__(
+        self,
+        refresh_time: str = "14:30",
+        concurrency: int = 4,
+        max_retries: int = 3,
+        backoff_seconds: float = 2.0,
+        initial_days: int = 1825
+    ):
+        hour, minute = (int(part) for part in refresh_time.split(':'))
+        self.refresh_time = time(hour, minute)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.initial_days = initial_days
+
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.next_run: Optional[datetime] = None
+        self.last_run_started: Optional[datetime] = None
+        self.last_run_finished: Optional[datetime] = None
+        self.symbol_status: Dict[str, Dict] = {}
+
+    def start(self):
+        """啟動排程 (需在事件迴圈中呼叫)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_forever())
+            logger.info(f"Data refresher scheduled daily at {self.refresh_time} Asia/Taipei")
+
+    async def stop(self):
+        """停止排程"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _next_run_time(self, now: datetime) -> datetime:
+        """下一次排程時間 (休市日順延到下一個交易日)"""
+        calendar = get_trading_calendar()
+        candidate = datetime.combine(now.date(), self.refresh_time, tzinfo=TAIPEI_TZ)
+        if candidate <= now:
+            candidate += timedelta(days=1)
+        while not calendar.is_session(candidate.date()):
+            candidate += timedelta(days=1)
+        return candidate
+
+    async def _run_forever(self):
+        while True:
+            now = datetime.now(TAIPEI_TZ)
+            self.next_run = self._next_run_time(now)
+            await asyncio.sleep((self.next_run - now).total_seconds())
+            try:
+                await self.refresh_all()
+            except Exception as e:
+                logger.error(f"Scheduled data refresh failed: {e}", exc_info=True)
+
+    async def refresh_all(self) -> Dict:
+        """
+        更新所有啟用中的股票
+
+        Returns:
+            本次更新的摘要
+        """
+        async with self._lock:
+            self.last_run_started = datetime.now(TAIPEI_TZ)
+            targets = await asyncio.to_thread(self._load_targets)
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            results = await asyncio.gather(*(
+                self._refresh_symbol(semaphore, symbol, last_date)
+                for symbol, last_date in targets
+            ))
+
+            self.last_run_finished = datetime.now(TAIPEI_TZ)
+            summary = {
+                'symbols': len(targets),
+                'saved': sum(results),
+                'failed': sum(1 for s, _ in targets if self.symbol_status[s]['status'] == 'failed'),
+                'duration_seconds': (self.last_run_finished - self.last_run_started).total_seconds()
+            }
+            logger.info(f"Data refresh finished: {summary}")
+            return summary
+
+    def _load_targets(self) -> List[Tuple[str, Optional[date]]]:
+        with db_connection() as conn:
+            return load_refresh_targets(conn)
+
+    async def _refresh_symbol(
+        self,
+        semaphore: asyncio.Semaphore,
+        symbol: str,
+        last_date: Optional[date]
+    ) -> int:
+        """增量更新單一股票，失敗時以指數退避重試"""
+        today = datetime.now(TAIPEI_TZ).date()
+        if last_date is None:
+            start = today - timedelta(days=self.initial_days)
+        else:
+            start = last_date + timedelta(days=1)
+
+        status = self.symbol_status.setdefault(symbol, {})
+        if start > today:
+            status.update(status='up_to_date', last_refresh=datetime.now(TAIPEI_TZ),
+                          last_date=last_date, saved=0, error=None)
+            return 0
+
+        async with semaphore:
+            for attempt in range(self.max_retries):
+                try:
+                    saved, new_last_date = await asyncio.to_thread(
+                        self._fetch_and_save, symbol, start.isoformat(),
+                        (today + timedelta(days=1)).isoformat()
+                    )
+                    status.update(status='ok', last_refresh=datetime.now(TAIPEI_TZ),
+                                  last_date=new_last_date or last_date, saved=saved, error=None)
+                    return saved
+                except Exception as e:
+                    if attempt == self.max_retries - 1:
+                        logger.warning(f"Refresh failed for {symbol} after {self.max_retries} attempts: {e}")
+                        status.update(status='failed', last_refresh=datetime.now(TAIPEI_TZ),
+                                      last_date=last_date, saved=0, error=str(e))
+                        return 0
+                    await asyncio.sleep(self.backoff_seconds * (2 ** attempt))
+        return 0
+
+    def _fetch_and_save(self, symbol: str, start_date: str, end_date: str) -> Tuple[int, Optional[date]]:
+        """抓取並批次寫入 (在工作執行緒中執行)，抓取或寫入失敗時拋出例外以便重試"""
+        df = fetch_history(symbol, start_date, end_date)
+        if df is None or df.empty:
+            return 0, None
+
+        with db_connection() as conn:
+            summary = StockCrawler.ingest(conn, symbol, df)
+        if summary['data'].empty:
+            return 0, None
+        # save_to_db 在寫入失敗時回滾並回傳 0，不可視為成功 (last_date 不前進)
+        if summary['saved'] < len(summary['data']):
+            raise RuntimeError(f"Saved {summary['saved']} of {len(summary['data'])} valid rows")
+        return summary['saved'], date.fromisoformat(summary['data']['date'].max())
+
+    def get_status(self, last_dates: Dict[str, Optional[date]]) -> Dict:
+        """
+        組合更新狀態
+
+        Args:
+            last_dates: 每檔啟用股票在資料庫中的最新日期
+
+        Returns:
+            排程資訊與每檔股票的最後更新時間、落後天數與落後交易日數
+        """
+        calendar = get_trading_calendar()
+        today = datetime.now(TAIPEI_TZ).date()
+        last_session = calendar.last_completed_session()
+        symbols = []
+        for symbol, last_date in last_dates.items():
+            status = self.symbol_status.get(symbol, {})
+            symbols.append({
+                'symbol': symbol,
+                'last_date': last_date.isoformat() if last_date else None,
+                'lag_days': (today - last_date).days if last_date else None,
+                'lag_sessions': (
+                    calendar.count_sessions(last_date + timedelta(days=1), last_session)
+                    if last_date else None
+                ),
+                'last_refresh': status.get('last_refresh'),
+                'status': status.get('status', 'pending'),
+                'saved': status.get('saved', 0),
+                'error': status.get('error'),
+            })
+
+        return {
+            'enabled': self._task is not None,
+            'running': self.running,
+            'next_run': self.next_run,
+            'last_run_started': self.last_run_started,
+            'last_run_finished': self.last_run_finished,
+            'symbols': symbols,
+        }
+
+
+# 全域更新器
+_refresher: Optional[DataRefresher] = None
+
+
+def get_refresher() -> DataRefresher:
+    """取得資料更新器"""
+    global _refresher
+    if _refresher is None:
+        _refresher = DataRefresher(
+            refresh_time=settings.DATA_REFRESH_TIME,
+            concurrency=settings.DATA_REFRESH_CONCURRENCY,
+            max_retries=settings.DATA_REFRESH_MAX_RETRIES,
+            backoff_seconds=settings.DATA_REFRESH_BACKOFF_SECONDS,
+            initial_days=settings.DATA_REFRESH_INITIAL_DAYS
+        )
+    return _refresher
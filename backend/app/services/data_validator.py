@@ -0,0 +1,183 @@
+"""
+價格資料品質檢查
+在抓取與寫入資料庫之間執行，所有檢查皆為整個 DataFrame 的向量化遮罩，
+未通過的列移至 stock_prices_quarantine 隔離表
+"""
+import warnings
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from psycopg2.extras import execute_values
+
+from .trading_calendar import get_trading_calendar
+
+PRICE_FIELDS = ['open', 'high', 'low', 'close']
+
+# 與前後 K 線收盤價中位數相差超過此倍數視為異常跳動
+SPIKE_RATIO = 10.0
+SPIKE_WINDOW = 5
+
+
+def _parse_days(values: pd.Series) -> np.ndarray:
+    """
+    日期欄位轉為 datetime64[D] (無法解析的值為 NaT)
+
+    YYYY-MM-DD 字串、date 與 Timestamp 由 numpy 直接轉換；含無法解析的值時才改用 pandas 逐一處理
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy().astype('datetime64[D]')
+    try:
+        return np.array(values.to_numpy(), dtype='datetime64[D]')
+    except (ValueError, TypeError):
+        return pd.to_datetime(values, errors='coerce').to_numpy().astype('datetime64[D]')
+
+
+def _centred_median(close: np.ndarray) -> np.ndarray:
+    """
+    以每列為中心、前後各 2 列 (共 SPIKE_WINDOW = 5 列，比較網路固定為 5 列) 的收盤價中位數
+
+    與 rolling(5, center=True, min_periods=1).median() 相同：以 5 個相鄰位移陣列的
+    min / max 比較網路計算，視窗含 NaN (缺值與頭尾) 的少數列再以 nanmedian 補算
+    """
+    half = SPIKE_WINDOW // 2
+    padded = np.concatenate([np.full(half, np.nan), close, np.full(half, np.nan)])
+    windows = sliding_window_view(padded, SPIKE_WINDOW)
+    a, b, c, d, e = windows.T
+
+    low = np.maximum(np.minimum(a, b), np.minimum(c, d))
+    high = np.minimum(np.maximum(a, b), np.maximum(c, d))
+    median = np.maximum(np.minimum(low, high), np.minimum(np.maximum(low, high), e))
+
+    incomplete = np.isnan(median)
+    if incomplete.any():
+        with warnings.catch_warnings():
+            # 整個視窗都是 NaN 時結果為 NaN (不判定為跳動)
+            warnings.simplefilter('ignore', RuntimeWarning)
+            median[incomplete] = np.nanmedian(windows[incomplete], axis=1)
+    return median
+
+
+def _duplicated_keep_last(day_values: np.ndarray) -> np.ndarray:
+    """同一日期的各列中，除了最後一列以外皆為 True (穩定排序後比較相鄰值)"""
+    keys = day_values.view('int64')
+    order = np.argsort(keys, kind='stable')
+    ordered = keys[order]
+    duplicate = np.zeros(len(keys), dtype=bool)
+    duplicate[order[:-1][ordered[:-1] == ordered[1:]]] = True
+    return duplicate
+
+
+def _check_masks(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """計算每項檢查的失敗遮罩"""
+    prices = df[PRICE_FIELDS].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    volume = pd.to_numeric(df['volume'], errors='coerce').to_numpy(dtype=float)
+    open_, high, low, close = prices.T
+    day_values = _parse_days(df['date'])
+    valid_day = ~np.isnat(day_values)
+
+    missing = np.isnan(prices).any(axis=1) | np.isnan(volume) | ~valid_day
+
+    with np.errstate(invalid='ignore'):
+        non_positive = (prices <= 0).any(axis=1) | (volume < 0)
+        high_below_low = high < low
+        outside_range = (open_ > high) | (open_ < low) | (close > high) | (close < low)
+
+        # 交易日成交量為 0 (停牌日仍可能有 K 線，但多半是資料錯誤)
+        on_session = np.zeros(len(df), dtype=bool)
+        on_session[valid_day] = get_trading_calendar().session_mask(day_values[valid_day])
+        zero_volume = (volume == 0) & on_session
+
+        # 以前後 K 線收盤價中位數為基準，單一錯誤 K 線不會影響相鄰列的判斷
+        ratio = close / _centred_median(close)
+        spike = (ratio > SPIKE_RATIO) | (ratio < 1 / SPIKE_RATIO)
+
+    # 同一日期出現多次時保留最後一筆 (無法解析的日期已計入 missing_values)
+    duplicate = _duplicated_keep_last(day_values) & valid_day
+
+    return {
+        'missing_values': missing,
+        'non_positive': non_positive,
+        'high_below_low': high_below_low,
+        'price_outside_range': outside_range,
+        'zero_volume': zero_volume,
+        'price_spike': spike,
+        'duplicate_date': duplicate,
+    }
+
+
+def validate_prices(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, Dict]:
+    """
+    檢查價格資料品質
+
+    Args:
+        df: date/open/high/low/close/volume 格式的 DataFrame
+
+    Returns:
+        (通過的資料, 未通過的資料 (含 reasons 欄位), 摘要)
+    """
+    if df.empty:
+        return df, df.assign(reasons=pd.Series(dtype=str)), {
+            'total': 0, 'valid': 0, 'rejected': 0, 'checks': {}
+        }
+
+    masks = _check_masks(df)
+    failed = np.logical_or.reduce(list(masks.values()))
+
+    valid = df.loc[~failed].reset_index(drop=True)
+    rejected = df.loc[failed].reset_index(drop=True)
+
+    reasons = np.full(len(rejected), '', dtype=object)
+    for name, mask in masks.items():
+        hit = mask[failed]
+        reasons[hit] = reasons[hit] + name + ';'
+    rejected = rejected.assign(reasons=[r.rstrip(';') for r in reasons])
+
+    summary = {
+        'total': len(df),
+        'valid': len(valid),
+        'rejected': len(rejected),
+        'checks': {name: int(mask.sum()) for name, mask in masks.items()},
+    }
+    return valid, rejected, summary
+
+
+def quarantine_rows(conn, symbol: str, rejected: pd.DataFrame) -> int:
+    """
+    將未通過檢查的列寫入隔離表 (不提交交易，由呼叫端提交)
+
+    同一 (symbol, date, reasons) 只保留一列：重新抓取到相同的錯誤資料時更新數值與
+    last_seen_at，不重複新增
+
+    Returns:
+        寫入或更新的筆數
+    """
+    if rejected.empty:
+        return 0
+
+    frame = rejected.astype(object).where(rejected.notna(), None)
+    # 同一批內重複的鍵只保留最後一列 (ON CONFLICT DO UPDATE 不可重複更新同一列)
+    records = list({
+        (row['date'], row['reasons']): (
+            symbol, row['date'], row['open'], row['high'], row['low'], row['close'], row['volume'], row['reasons']
+        )
+        for row in frame.to_dict('records')
+    }.values())
+
+    cursor = conn.cursor()
+    execute_values(cursor, """
+        INSERT INTO stock_prices_quarantine
+        (symbol, date, open, high, low, close, volume, reasons)
+        VALUES %s
+        ON CONFLICT (symbol, date, reasons)
+        DO UPDATE SET
+            open = EXCLUDED.open,
+            high = EXCLUDED.high,
+            low = EXCLUDED.low,
+            close = EXCLUDED.close,
+            volume = EXCLUDED.volume,
+            last_seen_at = CURRENT_TIMESTAMP
+    """, records, page_size=1000)
+    cursor.close()
+    return len(records)
@@ -0,0 +1,91 @@
+"""
+資料版本
+每個範圍 (股票清單、單一股票的價格) 有一個遞增的版本號與最後更新時間，
+由寫入資料的同一交易更新：價格由 StockCrawler.save_to_db 更新，股票清單由
+stocks 表的觸發器更新。讀取端以版本產生 ETag / Last-Modified，並作為回應快取的鍵。
+
+價格寫入另外在 price_changes 記錄該次涵蓋的日期範圍，回測結果快取只在
+寫入範圍與回測區間重疊時失效 (每日追加最新一天不影響歷史區間的結果)。
+"""
+from datetime import date, datetime
+from typing import Dict, NamedTuple, Optional
+
+from ..core.async_database import fetch_one
+
+STOCK_LIST_SCOPE = "stocks"
+
+DATA_VERSION_QUERY = "SELECT version, updated_at FROM data_versions WHERE scope = $1"
+
+
+class DataVersion(NamedTuple):
+    version: int
+    updated_at: Optional[datetime]
+
+
+def price_scope(symbol: str) -> str:
+    """單一股票價格資料的版本範圍"""
+    return f"prices:{symbol}"
+
+
+def bump_data_version(cursor, scope: str) -> int:
+    """
+    遞增版本 (不提交交易，與資料寫入一起提交)
+
+    Returns:
+        新的版本號
+    """
+    cursor.execute("""
+        INSERT INTO data_versions (scope, version, updated_at)
+        VALUES (%s, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (scope)
+        DO UPDATE SET version = data_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+        RETURNING version
+    """, (scope,))
+    return cursor.fetchone()[0]
+
+
+def record_price_change(cursor, symbol: str, first_date: date, last_date: date) -> int:
+    """
+    價格寫入後遞增該股票的版本並記錄寫入的日期範圍 (不提交交易)
+
+    Returns:
+        新的版本號
+    """
+    version = bump_data_version(cursor, price_scope(symbol))
+    cursor.execute("""
+        INSERT INTO price_changes (symbol, version, first_date, last_date)
+        VALUES (%s, %s, %s, %s)
+    """, (symbol, version, first_date, last_date))
+    return version
+
+
+async def get_data_version(scope: str) -> DataVersion:
+    """
+    取得目前版本
+
+    Returns:
+        DataVersion；尚未寫入過資料的範圍為 (0, None)
+    """
+    return data_version_from_row(await fetch_one(DATA_VERSION_QUERY, scope))
+
+
+def data_version_from_row(row: Optional[Dict]) -> DataVersion:
+    """DATA_VERSION_QUERY 的結果轉為 DataVersion (查無資料時為 (0, None))"""
+    if row is None:
+        return DataVersion(0, None)
+    return DataVersion(row['version'], row['updated_at'])
+
+
+async def get_price_range_version(symbol: str, start_date: date, end_date: date) -> int:
+    """
+    與 [start_date, end_date] 重疊的最近一次價格寫入的版本
+
+    Returns:
+        版本號；區間內從未有過寫入時為 0
+    """
+    row = await fetch_one("""
+        SELECT COALESCE(MAX(version), 0) AS version
+        FROM price_changes
+        WHERE symbol = $1 AND first_date <= $3 AND last_date >= $2
+    """, symbol, start_date, end_date)
+    return row['version']
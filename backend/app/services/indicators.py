@@ -0,0 +1,68 @@
+"""
+技術指標快取
+同一份價格資料上相同參數的指標只計算一次，供多個策略共用
+(例如批次比較用戶所有策略時，MA(20) 與布林通道中軌共用同一條移動平均)
+"""
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+import pandas as pd
+
+# 指標鍵：(名稱, 參數...)，例如 ('sma', 20)、('macd', 12, 26, 9)
+IndicatorKey = Tuple
+
+
+class IndicatorCache:
+    """單一價格序列的指標快取 (可 pickle，可送到回測工作行程)"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.close = df['close']
+        self._values: Dict[IndicatorKey, Any] = {}
+        self.computed = 0
+
+    def _get(self, key: IndicatorKey, compute: Callable[[], Any]) -> Any:
+        if key not in self._values:
+            self._values[key] = compute()
+            self.computed += 1
+        return self._values[key]
+
+    def sma(self, period: int) -> pd.Series:
+        """簡單移動平均"""
+        return self._get(('sma', period), lambda: self.close.rolling(window=period).mean())
+
+    def rolling_std(self, period: int) -> pd.Series:
+        """移動標準差"""
+        return self._get(('rolling_std', period), lambda: self.close.rolling(window=period).std())
+
+    def ema(self, span: int) -> pd.Series:
+        """指數移動平均"""
+        return self._get(('ema', span), lambda: self.close.ewm(span=span, adjust=False).mean())
+
+    def rsi(self, period: int) -> pd.Series:
+        """RSI (以簡單移動平均計算平均漲跌幅)"""
+        def compute():
+            delta = self.close.diff()
+            gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
+            loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+            rs = gain / loss
+            return 100 - (100 / (1 + rs))
+
+        return self._get(('rsi', period), compute)
+
+    def macd(self, fast: int, slow: int, signal: int) -> Tuple[pd.Series, pd.Series]:
+        """
+        MACD
+
+        Returns:
+            (MACD 線, 信號線)
+        """
+        def compute():
+            line = self.ema(fast) - self.ema(slow)
+            return line, line.ewm(span=signal, adjust=False).mean()
+
+        return self._get(('macd', fast, slow, signal), compute)
+
+    def compute(self, keys: Iterable[IndicatorKey]) -> 'IndicatorCache':
+        """預先計算指定的指標"""
+        for name, *params in keys:
+            getattr(self, name)(*params)
+        return self
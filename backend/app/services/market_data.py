@@ -0,0 +1,304 @@
+"""
+行情資料來源 (Market Data Providers)
+StockCrawler 透過此介面取得歷史 K 線與最新報價，可切換為：
+- yfinance: 線上抓取 (預設)
+- replay: 從本地 CSV / Parquet 檔案重播
+- synthetic: 依股票代號產生可重現的模擬資料
+"""
+import logging
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from ..core.config import settings
+from ..core.metrics import CRAWLER_FETCH_DURATION, CRAWLER_FETCH_FAILURES
+from .trading_calendar import get_trading_calendar
+
+logger = logging.getLogger(__name__)
+
+PRICE_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+
+
+def normalize_history(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    將原始 K 線資料整理成統一格式
+
+    Args:
+        df: 原始資料，日期可為索引或 Date/date 欄位
+
+    Returns:
+        僅包含 date(YYYY-MM-DD)、open、high、low、close、volume 的 DataFrame
+    """
+    if 'date' not in df.columns and 'Date' not in df.columns:
+        df = df.reset_index()
+
+    df = df.rename(columns={
+        'Date': 'date',
+        'Open': 'open',
+        'High': 'high',
+        'Low': 'low',
+        'Close': 'close',
+        'Volume': 'volume'
+    })
+
+    df = df[PRICE_COLUMNS].copy()
+    df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+    return df.reset_index(drop=True)
+
+
+def _quote_from_history(symbol: str, df: pd.DataFrame) -> Optional[Dict]:
+    """以歷史 K 線的最後兩根組出報價資訊"""
+    if df is None or df.empty:
+        return None
+
+    last = df.iloc[-1]
+    previous_close = df.iloc[-2]['close'] if len(df) > 1 else last['open']
+    return {
+        'symbol': symbol,
+        'current_price': float(last['close']),
+        'previous_close': float(previous_close),
+        'open': float(last['open']),
+        'day_high': float(last['high']),
+        'day_low': float(last['low']),
+        'volume': int(last['volume']),
+    }
+
+
+class MarketDataProvider:
+    """行情資料來源基底類別"""
+
+    name = "base"
+
+    def fetch_history(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        取得歷史 K 線
+
+        Args:
+            symbol: 股票代號
+            start_date: 開始日期 (YYYY-MM-DD，含)
+            end_date: 結束日期 (YYYY-MM-DD，不含，與 yfinance 相同)
+
+        Returns:
+            normalize_history 格式的 DataFrame，查無資料時為空
+        """
+        raise NotImplementedError
+
+    def fetch_quote(self, symbol: str) -> Optional[Dict]:
+        """取得最新報價"""
+        raise NotImplementedError
+
+    def fetch_quotes(self, symbols: List[str]) -> Dict[str, Optional[Dict]]:
+        """
+        批次取得最新報價
+
+        Returns:
+            {symbol: 報價}，取得失敗的股票為 None
+        """
+        quotes = {}
+        for symbol in symbols:
+            try:
+                quotes[symbol] = self.fetch_quote(symbol)
+            except Exception as e:
+                logger.error(f"Failed to get latest price: {e}", extra={'symbol': symbol})
+                quotes[symbol] = None
+        return quotes
+
+
+class YFinanceProvider(MarketDataProvider):
+    """yfinance 線上資料來源"""
+
+    name = "yfinance"
+
+    def fetch_history(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+        df = yf.Ticker(symbol).history(start=start_date, end=end_date)
+        if df.empty:
+            return pd.DataFrame(columns=PRICE_COLUMNS)
+        return normalize_history(df)
+
+    def fetch_quote(self, symbol: str) -> Optional[Dict]:
+        info = yf.Ticker(symbol).info
+        return {
+            'symbol': symbol,
+            'current_price': info.get('currentPrice', 0),
+            'previous_close': info.get('previousClose', 0),
+            'open': info.get('open', 0),
+            'day_high': info.get('dayHigh', 0),
+            'day_low': info.get('dayLow', 0),
+            'volume': info.get('volume', 0),
+        }
+
+    def fetch_quotes(self, symbols: List[str]) -> Dict[str, Optional[Dict]]:
+        # yfinance 每檔各需一次 HTTP 請求，以執行緒並行送出
+        if len(symbols) <= 1:
+            return super().fetch_quotes(symbols)
+        with ThreadPoolExecutor(max_workers=min(settings.MAX_WORKERS, len(symbols))) as executor:
+            results = executor.map(lambda s: super(YFinanceProvider, self).fetch_quotes([s]), symbols)
+            return {symbol: quote for result in results for symbol, quote in result.items()}
+
+
+class FileReplayProvider(MarketDataProvider):
+    """
+    本地檔案重播資料來源
+
+    每檔股票對應 data_dir 下的 <symbol>.parquet 或 <symbol>.csv，
+    欄位需包含 date/open/high/low/close/volume (大小寫皆可)。
+    檔案只在第一次使用時讀取，之後從記憶體切片。
+    """
+
+    name = "replay"
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self._frames: Dict[str, pd.DataFrame] = {}
+
+    def _path_for(self, symbol: str) -> Optional[str]:
+        for ext in ('.parquet', '.csv'):
+            path = os.path.join(self.data_dir, f"{symbol}{ext}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _load(self, symbol: str) -> pd.DataFrame:
+        if symbol not in self._frames:
+            path = self._path_for(symbol)
+            if path is None:
+                df = pd.DataFrame(columns=PRICE_COLUMNS)
+            elif path.endswith('.parquet'):
+                df = normalize_history(pd.read_parquet(path))
+            else:
+                df = normalize_history(pd.read_csv(path))
+            self._frames[symbol] = df.sort_values('date').reset_index(drop=True)
+        return self._frames[symbol]
+
+    def fetch_history(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+        df = self._load(symbol)
+        mask = (df['date'] >= start_date) & (df['date'] < end_date)
+        return df.loc[mask].reset_index(drop=True)
+
+    def fetch_quote(self, symbol: str) -> Optional[Dict]:
+        df = self._load(symbol)
+        df = df[df['date'] <= date.today().isoformat()]
+        return _quote_from_history(symbol, df.tail(2))
+
+
+class SyntheticProvider(MarketDataProvider):
+    """
+    模擬資料來源
+
+    以幾何布朗運動產生交易日 K 線。路徑由 (seed, symbol) 決定並固定自
+    ORIGIN 起算，每個交易日的亂數依序一次取出一列 (不受查詢區間長度影響)，
+    因此任意日期區間重複查詢都會得到一致的價格。
+    """
+
+    name = "synthetic"
+    ORIGIN = pd.Timestamp('2000-01-03')
+
+    def __init__(self, seed: int = 42, annual_volatility: float = 0.3):
+        self.seed = seed
+        self.daily_volatility = annual_volatility / np.sqrt(252)
+
+    def _generate(self, symbol: str, end: pd.Timestamp) -> pd.DataFrame:
+        dates = pd.bdate_range(self.ORIGIN, end)
+        dates = dates[get_trading_calendar().session_mask(dates.values)]
+        n = len(dates)
+        rng = np.random.default_rng(self.seed ^ zlib.crc32(symbol.encode('utf-8')))
+
+        start_price = rng.uniform(20, 600)
+        # 每列為一個交易日的 (報酬, 開盤, 最高, 最低, 成交量) 亂數，第 i 列只取決於前 i 列
+        noise = rng.standard_normal((n, 5))
+        returns = 0.0002 + self.daily_volatility * noise[:, 0]
+        close = start_price * np.exp(np.cumsum(returns))
+        prev_close = np.concatenate(([start_price], close[:-1]))
+        open_ = prev_close * np.exp(self.daily_volatility / 4 * noise[:, 1])
+        high = np.maximum(open_, close) * (1 + np.abs(self.daily_volatility / 2 * noise[:, 2]))
+        low = np.minimum(open_, close) * (1 - np.abs(self.daily_volatility / 2 * noise[:, 3]))
+        volume = np.exp(15 + 0.5 * noise[:, 4]).astype(np.int64)
+
+        return pd.DataFrame({
+            'date': dates.strftime('%Y-%m-%d'),
+            'open': np.round(open_, 2),
+            'high': np.round(high, 2),
+            'low': np.round(low, 2),
+            'close': np.round(close, 2),
+            'volume': volume,
+        })
+
+    def fetch_history(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+        end = pd.Timestamp(end_date) - pd.Timedelta(days=1)
+        if end < self.ORIGIN:
+            return pd.DataFrame(columns=PRICE_COLUMNS)
+        df = self._generate(symbol, end)
+        return df[df['date'] >= start_date].reset_index(drop=True)
+
+    def fetch_quote(self, symbol: str) -> Optional[Dict]:
+        df = self._generate(symbol, pd.Timestamp(datetime.now().date()))
+        return _quote_from_history(symbol, df.tail(2))
+
+
+# 全域資料來源
+_provider: Optional[MarketDataProvider] = None
+
+
+def create_provider(name: str) -> MarketDataProvider:
+    """依名稱建立資料來源"""
+    if name == "yfinance":
+        return YFinanceProvider()
+    if name == "replay":
+        return FileReplayProvider(settings.MARKET_DATA_DIR)
+    if name == "synthetic":
+        return SyntheticProvider(seed=settings.SYNTHETIC_DATA_SEED)
+    raise ValueError(f"Unknown market data provider: {name}")
+
+
+def get_provider() -> MarketDataProvider:
+    """取得目前使用的資料來源 (依 MARKET_DATA_PROVIDER 設定建立)"""
+    global _provider
+    if _provider is None:
+        _provider = create_provider(settings.MARKET_DATA_PROVIDER)
+    return _provider
+
+
+def set_provider(provider: Optional[MarketDataProvider]) -> None:
+    """替換資料來源 (測試、壓測用)，傳入 None 則回到設定值"""
+    global _provider
+    _provider = provider
+
+
+def fetch_history(symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """以目前的資料來源取得歷史 K 線 (記錄抓取延遲與失敗次數)"""
+    provider = get_provider()
+    started = time.perf_counter()
+    try:
+        df = provider.fetch_history(symbol, start_date, end_date)
+    except Exception:
+        CRAWLER_FETCH_FAILURES.inc(provider.name, "history", "error")
+        raise
+    finally:
+        CRAWLER_FETCH_DURATION.observe(time.perf_counter() - started, provider.name, "history")
+    if df is None or df.empty:
+        CRAWLER_FETCH_FAILURES.inc(provider.name, "history", "empty")
+    return df
+
+
+def fetch_quotes(symbols: List[str]) -> Dict[str, Optional[Dict]]:
+    """以目前的資料來源批次取得報價 (記錄抓取延遲與失敗次數)"""
+    provider = get_provider()
+    started = time.perf_counter()
+    try:
+        quotes = provider.fetch_quotes(symbols)
+    except Exception:
+        CRAWLER_FETCH_FAILURES.inc(provider.name, "quotes", "error")
+        raise
+    finally:
+        CRAWLER_FETCH_DURATION.observe(time.perf_counter() - started, provider.name, "quotes")
+    missing = sum(1 for symbol in symbols if quotes.get(symbol) is None)
+    if missing:
+        CRAWLER_FETCH_FAILURES.inc(provider.name, "quotes", "empty", amount=missing)
+    return quotes
@@ -0,0 +1,80 @@
+"""
+日 K 線欄位式讀取
+以 COPY ... TO STDOUT (FORMAT binary) 讀取，整段位元組直接以 NumPy 結構化 dtype
+解碼為 float64/int64 陣列，不會為每一列建立 dict 或 Decimal 物件
+"""
+from datetime import date
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..core.async_database import copy_query
+
+# PostgreSQL 二進位 COPY 格式：簽章 (11) + flags (4) + 擴充標頭長度 (4)，結尾為 int16 -1
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+COPY_HEADER_SIZE = 19
+
+# 每列：欄位數 (int16)，每個欄位為長度 (int32) + 值；所有欄位皆為 NOT NULL 的定長型別
+ROW_DTYPE = np.dtype([
+    ('fields', '>i2'),
+    ('date_len', '>i4'), ('date', '>i4'),  # 自 2000-01-01 起的天數
+    ('open_len', '>i4'), ('open', '>f8'),
+    ('high_len', '>i4'), ('high', '>f8'),
+    ('low_len', '>i4'), ('low', '>f8'),
+    ('close_len', '>i4'), ('close', '>f8'),
+    ('volume_len', '>i4'), ('volume', '>i8'),
+])
+
+PG_EPOCH_DAYS = 10957  # 1970-01-01 至 2000-01-01 的天數
+
+PRICE_QUERY = """
+    SELECT date, open::float8, high::float8, low::float8, close::float8, volume
+    FROM stock_prices
+    WHERE symbol = $1 AND date >= $2 AND date <= $3
+    ORDER BY date ASC
+"""
+
+
+def decode_price_copy(data: bytes) -> Dict[str, np.ndarray]:
+    """
+    解碼二進位 COPY 輸出
+
+    Returns:
+        date (datetime64[D]) / open / high / low / close (float64) / volume (int64) 陣列
+    """
+    if data[:len(COPY_SIGNATURE)] != COPY_SIGNATURE:
+        raise ValueError("Invalid binary COPY signature")
+    extension = int.from_bytes(data[15:COPY_HEADER_SIZE], 'big')
+    start = COPY_HEADER_SIZE + extension
+    end = len(data) - 2  # 結尾標記
+
+    rows = np.frombuffer(data, dtype=ROW_DTYPE, offset=start, count=(end - start) // ROW_DTYPE.itemsize)
+    if len(rows) and (rows['fields'] != 6).any():
+        raise ValueError("Unexpected column layout in binary COPY data")
+
+    return {
+        'date': (rows['date'].astype(np.int64) + PG_EPOCH_DAYS).astype('datetime64[D]'),
+        'open': rows['open'].astype(np.float64),
+        'high': rows['high'].astype(np.float64),
+        'low': rows['low'].astype(np.float64),
+        'close': rows['close'].astype(np.float64),
+        'volume': rows['volume'].astype(np.int64),
+    }
+
+
+async def load_price_arrays(
+    symbol: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> Dict[str, np.ndarray]:
+    """讀取區間內 (含兩端) 的日 K 線為欄位陣列"""
+    data = await copy_query(PRICE_QUERY, symbol, start or date.min, end or date.max)
+    return decode_price_copy(data)
+
+
+def arrays_to_frame(arrays: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """轉為回測使用的 DataFrame (date 為 YYYY-MM-DD 字串)"""
+    frame = pd.DataFrame({k: v for k, v in arrays.items() if k != 'date'})
+    frame.insert(0, 'date', np.datetime_as_string(arrays['date'], unit='D'))
+    return frame
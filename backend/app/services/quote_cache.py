@@ -0,0 +1,159 @@
+"""
+即時報價快取
+依交易時段調整 TTL：盤中短 (QUOTE_TTL_MARKET_OPEN)，收盤後長 (STOCK_DATA_CACHE_TTL，
+最多到下一次開盤)。熱門股票在到期前於背景預先更新。
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from ..core.config import settings
+from .market_data import fetch_quotes
+from .trading_calendar import TAIPEI_TZ, get_trading_calendar
+
+
+class QuoteCache:
+    """執行緒安全的報價快取 (LRU + 依交易時段的 TTL)"""
+
+    def __init__(
+        self,
+        session_ttl: float = 15,
+        closed_ttl: float = 86400,
+        refresh_ahead_ratio: float = 0.2,
+        hot_threshold: int = 3,
+        max_entries: int = 5000
+    ):
+        self.session_ttl = session_ttl
+        self.closed_ttl = closed_ttl
+        self.refresh_ahead_ratio = refresh_ahead_ratio
+        self.hot_threshold = hot_threshold
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="quote-refresh")
+
+        self.hits = 0
+        self.misses = 0
+        self.background_refreshes = 0
+
+    def _ttl(self) -> float:
+        """目前時段的 TTL (秒)；收盤後不超過下一次開盤"""
+        calendar = get_trading_calendar()
+        now = datetime.now(TAIPEI_TZ)
+        if calendar.is_market_open(now):
+            return self.session_ttl
+        return min(self.closed_ttl, max((calendar.next_open(now) - now).total_seconds(), self.session_ttl))
+
+    def _store(self, quotes: Dict[str, Optional[Dict]]):
+        now = time.time()
+        ttl = self._ttl()
+        with self._lock:
+            for symbol, quote in quotes.items():
+                self._refreshing.discard(symbol)
+                if quote is None:
+                    continue
+                self._entries[symbol] = {
+                    'quote': quote,
+                    'ttl': ttl,
+                    'expires_at': now + ttl,
+                    'hits': 0,
+                }
+                self._entries.move_to_end(symbol)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _refresh(self, symbols: List[str]):
+        try:
+            self._store(fetch_quotes(symbols))
+            self.background_refreshes += 1
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(symbols)
+
+    def get_many(self, symbols: List[str]) -> Dict[str, Optional[Dict]]:
+        """
+        取得多檔股票報價
+
+        快取命中的直接回傳，未命中的合併為一次批次抓取
+
+        Returns:
+            {symbol: 報價}，依傳入順序；取得失敗的為 None
+        """
+        now = time.time()
+        found: Dict[str, Optional[Dict]] = {}
+        missing: List[str] = []
+        refresh: List[str] = []
+
+        with self._lock:
+            for symbol in dict.fromkeys(symbols):
+                entry = self._entries.get(symbol)
+                if entry is None or entry['expires_at'] <= now:
+                    self.misses += 1
+                    missing.append(symbol)
+                    continue
+
+                self.hits += 1
+                entry['hits'] += 1
+                self._entries.move_to_end(symbol)
+                found[symbol] = entry['quote']
+
+                # 熱門股票快到期時在背景先行更新
+                remaining = entry['expires_at'] - now
+                if (entry['hits'] >= self.hot_threshold
+                        and remaining < entry['ttl'] * self.refresh_ahead_ratio
+                        and symbol not in self._refreshing):
+                    self._refreshing.add(symbol)
+                    refresh.append(symbol)
+
+        if refresh:
+            self._executor.submit(self._refresh, refresh)
+
+        if missing:
+            fetched = fetch_quotes(missing)
+            self._store(fetched)
+            found.update(fetched)
+
+        return {symbol: found.get(symbol) for symbol in symbols}
+
+    def get(self, symbol: str) -> Optional[Dict]:
+        """取得單一股票報價"""
+        return self.get_many([symbol])[symbol]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            'size': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            'background_refreshes': self.background_refreshes,
+            'ttl_seconds': self._ttl(),
+        }
+
+
+# 全域報價快取
+_quote_cache: Optional[QuoteCache] = None
+
+
+def get_quote_cache() -> QuoteCache:
+    """取得報價快取"""
+    global _quote_cache
+    if _quote_cache is None:
+        _quote_cache = QuoteCache(
+            session_ttl=settings.QUOTE_TTL_MARKET_OPEN,
+            closed_ttl=settings.STOCK_DATA_CACHE_TTL,
+            refresh_ahead_ratio=settings.QUOTE_REFRESH_AHEAD_RATIO,
+            hot_threshold=settings.QUOTE_HOT_THRESHOLD
+        )
+    return _quote_cache
@@ -0,0 +1,90 @@
+"""
+序列化回應快取
+保存已編碼的回應本文，以 (請求鍵, 資料版本) 判斷是否可用：資料版本改變後舊項目
+不再命中，下一次寫入時直接覆蓋，不需要另外失效。依總位元組數做 LRU 淘汰。
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+from ..core.config import settings
+
+
+class ResponseCache:
+    """執行緒安全的回應本文快取 (依位元組數的 LRU)"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_item_bytes: int = 4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+
+        # key -> (version, body, media_type)
+        self._entries: "OrderedDict[Hashable, Tuple[int, bytes, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: int) -> Optional[Tuple[bytes, str]]:
+        """
+        取得快取的本文
+
+        Returns:
+            (body, media_type)；未命中或版本不同時為 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, key: Hashable, version: int, body: bytes, media_type: str):
+        """寫入本文 (超過 max_item_bytes 的不快取)"""
+        if len(body) > self.max_item_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[1])
+            self._entries[key] = (version, body, media_type)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+            }
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """取得回應快取"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+            max_item_bytes=settings.RESPONSE_CACHE_MAX_ITEM_BYTES
+        )
+    return _response_cache
@@ -0,0 +1,188 @@
+"""
+回測結果快取
+以內容定址：鍵為 (回測請求的標準化雜湊, 回測區間的價格資料版本) 的雜湊。
+區間內的價格被 save_to_db 改寫後版本改變，舊結果不再命中 (不需要另外失效)，
+由 LRU 淘汰；磁碟層的舊檔案在超過上限時依修改時間清除。
+
+記憶體層保存結果物件本身；磁碟層 (可選) 保存 zlib(MessagePack)，重新啟動後仍可命中，
+讀到時放回記憶體層。
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from ..core.config import settings
+from ..core.encoding import decode_msgpack, encode_msgpack
+
+logger = logging.getLogger(__name__)
+
+# 回測引擎的計算方式改變 (結果不同) 時遞增，使舊的磁碟快取全部失效
+ENGINE_REVISION = 1
+
+
+def result_key(request_digest: str, data_version: int) -> str:
+    """結果快取的鍵"""
+    return hashlib.sha256(f"{ENGINE_REVISION}:{request_digest}:{data_version}".encode()).hexdigest()
+
+
+class BacktestResultCache:
+    """執行緒安全的回測結果快取 (記憶體 LRU + 可選的磁碟層)"""
+
+    def __init__(self, max_entries: int = 256, disk_dir: str = "", max_disk_entries: int = 5000):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_entries = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_entries = sum(1 for name in os.listdir(disk_dir) if name.endswith('.bin'))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.bin")
+
+    def _remember(self, key: str, results: Dict):
+        with self._lock:
+            self._entries[key] = results
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        取得快取的回測結果 (先查記憶體，再查磁碟)
+
+        Returns:
+            結果；未命中時為 None
+        """
+        with self._lock:
+            results = self._entries.get(key)
+            if results is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return results
+
+        if self.disk_dir:
+            results = self._read_disk(key)
+            if results is not None:
+                self._remember(key, results)
+                with self._lock:
+                    self.disk_hits += 1
+                return results
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, results: Dict):
+        """寫入回測結果 (啟用磁碟層時同時寫入檔案)"""
+        self._remember(key, results)
+        if self.disk_dir:
+            self._write_disk(key, results)
+
+    def _read_disk(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return decode_msgpack(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # 損毀的檔案視為未命中，下一次寫入時覆蓋
+            logger.warning(f"Discarding unreadable backtest cache file {key}: {e}")
+            return None
+
+    def _write_disk(self, key: str, results: Dict):
+        path = self._path(key)
+        existed = os.path.exists(path)
+        try:
+            # 先寫入暫存檔再改名，讀取端不會讀到寫到一半的檔案
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(zlib.compress(encode_msgpack(results), 6))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write backtest cache file {key}: {e}")
+            return
+
+        with self._lock:
+            if not existed:
+                self._disk_entries += 1
+            over_limit = self._disk_entries > self.max_disk_entries
+        if over_limit:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """刪除最舊的檔案，使數量回到上限的 90%"""
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith('.bin'):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+        files.sort()
+        target = int(self.max_disk_entries * 0.9)
+        removed = 0
+        for _, path in files[:max(len(files) - target, 0)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._disk_entries = len(files) - removed
+
+    def clear(self):
+        """清除記憶體層與磁碟層"""
+        with self._lock:
+            self._entries.clear()
+            self._disk_entries = 0
+        if self.disk_dir:
+            for entry in os.scandir(self.disk_dir):
+                if entry.name.endswith('.bin'):
+                    os.remove(entry.path)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'disk_enabled': bool(self.disk_dir),
+                'disk_entries': self._disk_entries,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': round(hits / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+            }
+
+
+_result_cache: Optional[BacktestResultCache] = None
+
+
+def get_result_cache() -> BacktestResultCache:
+    """取得回測結果快取"""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = BacktestResultCache(
+            max_entries=settings.BACKTEST_CACHE_SIZE,
+            disk_dir=settings.BACKTEST_CACHE_DIR,
+            max_disk_entries=settings.BACKTEST_CACHE_DISK_MAX_ENTRIES
+        )
+    return _result_cache
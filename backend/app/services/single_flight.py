@@ -0,0 +1,96 @@
+"""
+Single-flight 請求合併
+同一個鍵同時只執行一次，其餘並行呼叫者等待同一個結果，
+避免熱門股票被多個請求重複抓取、重複寫入與重複回測
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    以鍵合併並行中的非同步工作
+
+    cancel_abandoned=True 時，所有等待者都被取消 (例如用戶端全部斷線)
+    後會一併取消共用的工作
+    """
+
+    def __init__(self, name: str, cancel_abandoned: bool = False):
+        self.name = name
+        self.cancel_abandoned = cancel_abandoned
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        執行或加入同鍵的工作
+
+        Args:
+            key: 合併用的鍵
+            fn: 無參數、回傳 awaitable 的函數，只有第一個呼叫者會執行
+
+        Returns:
+            工作結果 (例外同樣會傳給所有等待者)
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t, k=key: self._finish(k, t))
+        else:
+            self.coalesced += 1
+
+        # shield: 單一呼叫者被取消時不影響其他等待者
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self.cancel_abandoned and self._waiters[key] == 1 and not task.done():
+                self.abandoned += 1
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()  # 所有等待者都已離開時避免 "exception never retrieved"
+
+    def record_hit(self):
+        """記錄不需進入 single-flight 就能滿足的請求 (例如資料庫已有足夠資料)"""
+        self.hits += 1
+
+    def stats(self) -> Dict:
+        return {
+            'name': self.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'abandoned': self.abandoned,
+            'in_flight': len(self._in_flight),
+        }
+
+
+# 全域合併群組
+_groups: Dict[str, SingleFlight] = {}
+
+
+def get_single_flight(name: str, cancel_abandoned: bool = False) -> SingleFlight:
+    """取得 (或建立) 指定名稱的合併群組"""
+    if name not in _groups:
+        _groups[name] = SingleFlight(name, cancel_abandoned=cancel_abandoned)
+    return _groups[name]
+
+
+def single_flight_stats() -> Dict[str, Dict]:
+    """所有合併群組的統計"""
+    return {name: group.stats() for name, group in _groups.items()}
@@ -1,11 +1,20 @@
 """
 股票資料爬蟲服務
-使用 yfinance 獲取股票歷史資料
+透過行情資料來源 (預設 yfinance) 獲取股票歷史資料
 """
-import yfinance as yf
+import logging
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import pandas as pd
+from psycopg2.extras import execute_values
+
+from ..core.database import ensure_price_partitions, refresh_price_aggregates
+from .data_versions import record_price_change
+from .data_validator import quarantine_rows, validate_prices
+from .market_data import PRICE_COLUMNS, fetch_history
+from .quote_cache import get_quote_cache
+
+logger = logging.getLogger(__name__)
 
 
 class StockCrawler:
@@ -29,48 +38,26 @@ class StockCrawler:
             DataFrame 包含股票資料，或 None 如果失敗
         """
         try:
-            print(f"Fetching stock data: {symbol}")
-            print(f"   Date range: {start_date} to {end_date}")
+            # 透過資料來源獲取資料 (已整理為 date/open/high/low/close/volume)
+            df = fetch_history(symbol, start_date, end_date)
 
-            # 使用 yfinance 獲取資料
-            stock = yf.Ticker(symbol)
-            df = stock.history(start=start_date, end=end_date)
-
-            if df.empty:
-                print(f"WARNING: No stock data found for: {symbol}")
+            if df is None or df.empty:
+                logger.warning("No stock data found", extra={
+                    'symbol': symbol, 'start_date': start_date, 'end_date': end_date
+                })
                 return None
 
-            # 重設索引，將日期變成欄位
-            df = df.reset_index()
-
-            # 重新命名欄位
-            df = df.rename(columns={
-                'Date': 'date',
-                'Open': 'open',
-                'High': 'high',
-                'Low': 'low',
-                'Close': 'close',
-                'Volume': 'volume'
-            })
-
-            # 只保留需要的欄位
-            df = df[['date', 'open', 'high', 'low', 'close', 'volume']]
-
-            # 轉換日期格式
-            df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
-
-            print(f"Successfully fetched {len(df)} records")
-
+            logger.debug("Fetched stock data", extra={'symbol': symbol, 'rows': len(df)})
             return df
 
         except Exception as e:
-            print(f"ERROR: Fetch failed: {str(e)}")
+            logger.error(f"Fetch failed: {e}", extra={'symbol': symbol})
             return None
 
     @staticmethod
     def get_latest_price(symbol: str) -> Optional[Dict]:
         """
-        獲取股票最新價格
+        獲取股票最新價格 (經由報價快取)
 
         Args:
             symbol: 股票代號
@@ -79,21 +66,10 @@ class StockCrawler:
             包含最新價格資訊的字典
         """
         try:
-            stock = yf.Ticker(symbol)
-            info = stock.info
-
-            return {
-                'symbol': symbol,
-                'current_price': info.get('currentPrice', 0),
-                'previous_close': info.get('previousClose', 0),
-                'open': info.get('open', 0),
-                'day_high': info.get('dayHigh', 0),
-                'day_low': info.get('dayLow', 0),
-                'volume': info.get('volume', 0),
-            }
+            return get_quote_cache().get(symbol)
 
         except Exception as e:
-            print(f"ERROR: Failed to get latest price: {str(e)}")
+            logger.error(f"Failed to get latest price: {e}", extra={'symbol': symbol})
             return None
 
     @staticmethod
@@ -111,7 +87,28 @@ class StockCrawler:
         """
         try:
             cursor = conn.cursor()
-            count = 0
+
+            # 去除缺值與重複日期後一次批次寫入
+            # (同一批 ON CONFLICT DO UPDATE 不可重複更新同一列)
+            clean = df.dropna(subset=PRICE_COLUMNS).drop_duplicates(subset='date', keep='last')
+            records = list(zip(
+                [symbol] * len(clean),
+                clean['date'].astype(str).tolist(),
+                clean['open'].astype(float).tolist(),
+                clean['high'].astype(float).tolist(),
+                clean['low'].astype(float).tolist(),
+                clean['close'].astype(float).tolist(),
+                clean['volume'].astype('int64').tolist()
+            ))
+            skipped = len(df) - len(records)
+            if skipped:
+                logger.warning("Skipped rows with missing values or duplicate dates",
+                               extra={'symbol': symbol, 'skipped': skipped})
+
+            # stock_prices 依年份分區，寫入前建立缺少的分區。需在寫入 stocks 之前：
+            # 建立分區 (外鍵) 要鎖定 stocks，先寫入 stocks 會與其他寫入者互相等待
+            dates = pd.to_datetime(clean['date'])
+            ensure_price_partitions(cursor, dates.dt.year.unique())
 
             # 確保 stocks 表中已有該股票，避免外鍵限制觸發
             cursor.execute("""
@@ -120,45 +117,70 @@ class StockCrawler:
                 ON CONFLICT (symbol) DO NOTHING
             """, (symbol, symbol))
 
-            for _, row in df.iterrows():
-                try:
-                    cursor.execute("SAVEPOINT price_insert")
-                    cursor.execute("""
-                        INSERT INTO stock_prices
-                        (symbol, date, open, high, low, close, volume)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (symbol, date)
-                        DO UPDATE SET
-                            open = EXCLUDED.open,
-                            high = EXCLUDED.high,
-                            low = EXCLUDED.low,
-                            close = EXCLUDED.close,
-                            volume = EXCLUDED.volume
-                    """, (
-                        symbol,
-                        row['date'],
-                        float(row['open']),
-                        float(row['high']),
-                        float(row['low']),
-                        float(row['close']),
-                        int(row['volume'])
-                    ))
-                    cursor.execute("RELEASE SAVEPOINT price_insert")
-                    count += 1
-                except Exception as e:
-                    cursor.execute("ROLLBACK TO SAVEPOINT price_insert")
-                    print(f"WARNING: Insert failed for {row['date']}: {str(e)}")
-                    continue
+            execute_values(cursor, """
+                INSERT INTO stock_prices
+                (symbol, date, open, high, low, close, volume)
+                VALUES %s
+                ON CONFLICT (symbol, date)
+                DO UPDATE SET
+                    open = EXCLUDED.open,
+                    high = EXCLUDED.high,
+                    low = EXCLUDED.low,
+                    close = EXCLUDED.close,
+                    volume = EXCLUDED.volume
+            """, records, page_size=1000)
+            count = len(records)
+
+            # 同一交易中更新受影響的週 / 月 K 線與資料版本 (ETag / 回應快取)
+            if count:
+                refresh_price_aggregates(cursor, symbol, dates.min().date(), dates.max().date())
+                record_price_change(cursor, symbol, dates.min().date(), dates.max().date())
+            cursor.close()
 
             conn.commit()
-            print(f"Successfully saved {count} records to database")
+            logger.debug("Saved stock prices", extra={'symbol': symbol, 'rows': count})
             return count
 
         except Exception as e:
-            print(f"ERROR: Failed to save to database: {str(e)}")
+            logger.error(f"Failed to save to database: {e}", extra={'symbol': symbol})
             conn.rollback()
             return 0
 
+    @staticmethod
+    def ingest(conn, symbol: str, df: pd.DataFrame) -> Dict:
+        """
+        檢查資料品質後存入資料庫
+
+        未通過檢查的列先寫入 stock_prices_quarantine 並提交，再寫入有效資料；
+        有效資料寫入失敗 (回滾) 時，隔離記錄與 quarantined 計數不受影響
+
+        Args:
+            conn: 資料庫連接
+            symbol: 股票代號
+            df: 股票資料 DataFrame
+
+        Returns:
+            摘要 (total/valid/rejected/checks/saved/quarantined) 與通過檢查的資料 (data)
+        """
+        valid, rejected, summary = validate_prices(df)
+        if summary['rejected']:
+            logger.warning("Rows failed validation", extra={
+                'symbol': symbol, 'rejected': summary['rejected'],
+                'checks': {k: v for k, v in summary['checks'].items() if v},
+            })
+
+        try:
+            summary['quarantined'] = quarantine_rows(conn, symbol, rejected)
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to quarantine rows: {e}", extra={'symbol': symbol})
+            conn.rollback()
+            summary['quarantined'] = 0
+
+        summary['saved'] = StockCrawler.save_to_db(conn, symbol, valid)
+        summary['data'] = valid
+        return summary
+
     @staticmethod
     def calculate_moving_average(df: pd.DataFrame, period: int) -> pd.Series:
         """
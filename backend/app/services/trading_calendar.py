@@ -0,0 +1,176 @@
+"""
+臺灣證券交易所交易日曆
+週末、證交所休市日 (內建檔案) 與手動加入的颱風休市，
+提供 O(1) 的日期→交易日序號查詢與向量化的交易日數計算
+"""
+import csv
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Optional, Union
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from ..core.config import settings
+
+TAIPEI_TZ = ZoneInfo("Asia/Taipei")
+MARKET_OPEN = time(9, 0)
+MARKET_CLOSE = time(13, 30)
+
+DateLike = Union[str, date, np.datetime64]
+
+
+def _to_day(value: DateLike) -> np.datetime64:
+    """轉為 numpy 日期 (datetime64[D])"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return np.datetime64(value, 'D')
+
+
+def load_holiday_file(path: str) -> Dict[date, str]:
+    """讀取休市日檔案 (date,name,type，# 開頭為註解)"""
+    holidays = {}
+    if not os.path.exists(path):
+        return holidays
+
+    with open(path, encoding='utf-8') as f:
+        rows = csv.DictReader(line for line in f if line.strip() and not line.startswith('#'))
+        for row in rows:
+            holidays[date.fromisoformat(row['date'])] = row['name']
+    return holidays
+
+
+class TradingCalendar:
+    """
+    交易日曆
+
+    交易日序號以 first_day 之後的第一個交易日為 0。索引範圍外的日期
+    仍可查詢 (以 numpy 工作日規則計算)，只是不會有序號。
+
+    first_day 預設為休市日資料最早年份的 1 月 1 日：更早的年份沒有休市日資料，
+    每個平日都會被當成交易日，交易日數只是上限 (見 is_covered)。
+    """
+
+    def __init__(
+        self,
+        holidays: Dict[date, str],
+        first_day: Optional[date] = None,
+        last_day: Optional[date] = None
+    ):
+        self.closures: Dict[date, str] = dict(holidays)
+        if first_day is None:
+            first_year = min((d.year for d in self.closures), default=date.today().year)
+            first_day = date(first_year, 1, 1)
+        self.first_day = first_day
+        if last_day is None:
+            last_year = max((d.year for d in self.closures), default=date.today().year)
+            last_day = date(max(last_year, date.today().year) + 1, 12, 31)
+        self.last_day = last_day
+        self._build()
+
+    def _build(self):
+        """重建交易日陣列與日期→序號索引"""
+        self._busdaycal = np.busdaycalendar(
+            weekmask='1111100',
+            holidays=np.array(sorted(self.closures), dtype='datetime64[D]')
+        )
+        days = np.arange(_to_day(self.first_day), _to_day(self.last_day) + 1, dtype='datetime64[D]')
+        self.sessions = days[np.is_busday(days, busdaycal=self._busdaycal)]
+        self._index: Dict[date, int] = {d: i for i, d in enumerate(self.sessions.tolist())}
+
+    def add_closure(self, day: DateLike, reason: str = "颱風停止交易"):
+        """手動加入臨時休市日 (例如颱風)"""
+        self.closures[_to_day(day).item()] = reason
+        self._build()
+
+    def is_session(self, day: DateLike) -> bool:
+        """是否為交易日"""
+        d = _to_day(day)
+        item = d.item()
+        if self.first_day <= item <= self.last_day:
+            return item in self._index
+        return bool(np.is_busday(d, busdaycal=self._busdaycal))
+
+    def session_mask(self, days: Iterable[DateLike]) -> np.ndarray:
+        """向量化判斷多個日期是否為交易日"""
+        return np.is_busday(np.asarray(days, dtype='datetime64[D]'), busdaycal=self._busdaycal)
+
+    def is_covered(self, day: DateLike) -> bool:
+        """該日期是否在休市日資料涵蓋的範圍內 (first_day 之前的交易日判斷不含國定假日)"""
+        return _to_day(day).item() >= self.first_day
+
+    def session_index(self, day: DateLike) -> Optional[int]:
+        """交易日序號 (非交易日或超出索引範圍時為 None)"""
+        return self._index.get(_to_day(day).item())
+
+    def count_sessions(self, start: DateLike, end: DateLike) -> Union[int, np.ndarray]:
+        """
+        計算 [start, end] 區間內 (含頭尾) 的交易日數
+
+        start / end 可為單一日期或等長的日期陣列 (向量化)
+        """
+        starts = np.asarray(start, dtype='datetime64[D]')
+        ends = np.asarray(end, dtype='datetime64[D]') + 1
+        counts = np.maximum(np.busday_count(starts, ends, busdaycal=self._busdaycal), 0)
+        return int(counts) if counts.ndim == 0 else counts
+
+    def sessions_in_range(self, start: DateLike, end: DateLike) -> np.ndarray:
+        """[start, end] 區間內的交易日 (datetime64[D] 陣列)"""
+        lo = np.searchsorted(self.sessions, _to_day(start), side='left')
+        hi = np.searchsorted(self.sessions, _to_day(end), side='right')
+        return self.sessions[lo:hi]
+
+    def offset(self, day: DateLike, sessions: int) -> date:
+        """
+        交易日加減
+
+        非交易日會先往前 (sessions >= 0) 或往後 (sessions < 0) 對齊到最近的交易日
+        """
+        roll = 'backward' if sessions >= 0 else 'forward'
+        return np.busday_offset(_to_day(day), sessions, roll=roll, busdaycal=self._busdaycal).item()
+
+    def warmup_start(self, start: DateLike, bars: int) -> date:
+        """指標需要 bars 根暖機 K 線時，實際應載入資料的起始日"""
+        return np.busday_offset(_to_day(start), -bars, roll='forward', busdaycal=self._busdaycal).item()
+
+    def missing_sessions(self, dates: Iterable[DateLike], start: DateLike, end: DateLike) -> np.ndarray:
+        """區間內應有交易但 dates 中沒有的日期 (缺漏偵測)"""
+        have = np.asarray(list(dates), dtype='datetime64[D]')
+        return np.setdiff1d(self.sessions_in_range(start, end), have, assume_unique=False)
+
+    def last_completed_session(self, now: Optional[datetime] = None) -> date:
+        """最近一個已收盤的交易日"""
+        now = now or datetime.now(TAIPEI_TZ)
+        today = now.date()
+        if self.is_session(today) and now.time() >= MARKET_CLOSE:
+            return today
+        return self.offset(today - timedelta(days=1), 0)
+
+    def next_open(self, now: Optional[datetime] = None) -> datetime:
+        """下一次開盤時間"""
+        now = now or datetime.now(TAIPEI_TZ)
+        day = now.date()
+        if not (self.is_session(day) and now.time() < MARKET_OPEN):
+            day = np.busday_offset(_to_day(day) + 1, 0, roll='forward', busdaycal=self._busdaycal).item()
+        return datetime.combine(day, MARKET_OPEN, tzinfo=TAIPEI_TZ)
+
+    def is_market_open(self, now: Optional[datetime] = None) -> bool:
+        """目前是否為盤中時間"""
+        now = now or datetime.now(TAIPEI_TZ)
+        return self.is_session(now.date()) and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+# 全域交易日曆
+_calendar: Optional[TradingCalendar] = None
+
+
+def get_trading_calendar() -> TradingCalendar:
+    """取得交易日曆 (內建休市檔 + MARKET_EXTRA_CLOSURES)"""
+    global _calendar
+    if _calendar is None:
+        holidays = load_holiday_file(settings.TRADING_CALENDAR_FILE)
+        for value in settings.MARKET_EXTRA_CLOSURES.split(','):
+            if value.strip():
+                holidays[date.fromisoformat(value.strip())] = "臨時休市"
+        _calendar = TradingCalendar(holidays)
+    return _calendar
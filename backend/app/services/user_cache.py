@@ -0,0 +1,171 @@
+"""
+已登入用戶快取
+以 Token 的 sub (username) 為鍵，讓每個需要認證的請求不必都查詢 users 表。
+users 表的更新 / 刪除由觸發器發出 NOTIFY user_changed，背景監聽執行緒收到後
+移除對應項目；監聽中斷期間可能漏接通知，因此重新連線時會清空快取，TTL 則是
+最後的保險 (最長延遲生效時間)。
+"""
+import logging
+import select
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import psycopg2
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+USER_CHANGED_CHANNEL = "user_changed"
+
+
+class UserCache:
+    """執行緒安全的用戶快取 (LRU + 固定 TTL)"""
+
+    def __init__(self, ttl: float = 30, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 每次失效都會遞增；查詢前後版本不同時不寫入，避免把失效前讀到的舊資料放回快取
+        self._version = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def version(self) -> int:
+        """目前的失效版本 (查詢資料庫前取得，寫入時傳給 put)"""
+        with self._lock:
+            return self._version
+
+    def get(self, username: str) -> Optional[Dict]:
+        """取得快取中的用戶，未命中或已過期時為 None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry['expires_at'] <= now:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(username)
+            return entry['user']
+
+    def put(self, username: str, user: Dict, version: int):
+        """寫入用戶；若取得 version 之後發生過失效則略過"""
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[username] = {
+                'user': user,
+                'expires_at': time.monotonic() + self.ttl,
+            }
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        """移除單一用戶 (停用、刪除或資料變更時)"""
+        with self._lock:
+            self._version += 1
+            self.invalidations += 1
+            self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            'size': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            'invalidations': self.invalidations,
+            'ttl_seconds': self.ttl,
+            'listening': _listener is not None and _listener.ready.is_set(),
+        }
+
+
+class UserChangeListener(threading.Thread):
+    """以 LISTEN user_changed 接收 users 表的變更並使快取失效"""
+
+    def __init__(self, cache: UserCache, dsn: str, reconnect_seconds: float = 5.0):
+        super().__init__(name="user-change-listener", daemon=True)
+        self.cache = cache
+        self.dsn = dsn
+        self.reconnect_seconds = reconnect_seconds
+        self._stop_event = threading.Event()
+        self.ready = threading.Event()  # 已開始 LISTEN
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {USER_CHANGED_CHANNEL}")
+                cursor.close()
+                # 連線建立前的通知已無法取得
+                self.cache.clear()
+                self.ready.set()
+
+                while not self._stop_event.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.cache.invalidate(conn.notifies.pop(0).payload)
+            except Exception as e:
+                self.ready.clear()
+                logger.warning(f"User change listener disconnected: {e}")
+                self.cache.clear()
+                self._stop_event.wait(self.reconnect_seconds)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+# 全域用戶快取
+_user_cache: Optional[UserCache] = None
+_listener: Optional[UserChangeListener] = None
+
+
+def get_user_cache() -> UserCache:
+    """取得用戶快取"""
+    global _user_cache
+    if _user_cache is None:
+        _user_cache = UserCache(
+            ttl=settings.AUTH_USER_CACHE_TTL,
+            max_entries=settings.AUTH_USER_CACHE_SIZE
+        )
+    return _user_cache
+
+
+def start_user_listener() -> UserChangeListener:
+    """啟動 users 表變更監聽 (應用啟動時呼叫)"""
+    global _listener
+    if _listener is None or not _listener.is_alive():
+        _listener = UserChangeListener(get_user_cache(), settings.DATABASE_URL)
+        _listener.start()
+    return _listener
+
+
+def stop_user_listener():
+    """停止監聽"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener.join(timeout=5)
+        _listener = None
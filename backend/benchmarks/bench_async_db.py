@@ -0,0 +1,121 @@
+"""
+讀取路徑壓測：psycopg2 (在事件迴圈中阻塞) vs asyncpg
+
+模擬 async 路由的行為：以固定速率送出查詢一年日 K 線的請求，同時有一個慢查詢
+(pg_sleep) 持續執行。psycopg2 模式下每個查詢都會阻塞事件迴圈，慢查詢會拖慢
+所有請求；asyncpg 模式下查詢彼此並行。
+
+使用方式 (在 backend 目錄，需本機 PostgreSQL)：
+    python -m benchmarks.bench_async_db --rate 200 --duration 5
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.core.async_database import close_async_db, fetch_all
+from app.core.database import close_db, db_connection
+from app.services.market_data import SyntheticProvider
+from app.services.stock_crawler import StockCrawler
+
+SYMBOL = "2330.TW"
+START, END = "2023-01-01", "2023-12-31"
+QUERY = """
+    SELECT date::text as date, open, high, low, close, volume
+    FROM stock_prices
+    WHERE symbol = {p1} AND date >= {p2} AND date <= {p3}
+    ORDER BY date ASC
+"""
+
+
+def sync_query():
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(QUERY.format(p1='%s', p2='%s', p3='%s'), (SYMBOL, START, END))
+        rows = cursor.fetchall()
+        cursor.close()
+    return rows
+
+
+def sync_slow(seconds: float):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_sleep(%s)", (seconds,))
+        cursor.close()
+
+
+async def async_query():
+    from datetime import date
+    return await fetch_all(
+        QUERY.format(p1='$1', p2='$2', p3='$3'), SYMBOL, date.fromisoformat(START), date.fromisoformat(END)
+    )
+
+
+async def async_slow(seconds: float):
+    await fetch_all("SELECT pg_sleep($1)", seconds)
+
+
+async def run(mode: str, rate: float, duration: float, slow_seconds: float) -> np.ndarray:
+    """
+    以固定到達率送出請求 (open-loop)，延遲從預定到達時間起算，
+    因此事件迴圈被阻塞造成的排隊時間也會被計入
+    """
+    latencies = []
+    done = asyncio.Event()
+
+    async def request(scheduled: float):
+        if mode == 'sync':
+            sync_query()
+        else:
+            await async_query()
+        latencies.append(time.perf_counter() - scheduled)
+
+    async def slow_client():
+        while not done.is_set():
+            if mode == 'sync':
+                sync_slow(slow_seconds)
+            else:
+                await async_slow(slow_seconds)
+            await asyncio.sleep(0)
+
+    slow = asyncio.create_task(slow_client())
+    tasks = []
+    begin = time.perf_counter()
+    for i in range(int(rate * duration)):
+        scheduled = begin + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(request(scheduled)))
+    await asyncio.gather(*tasks)
+    done.set()
+    await slow
+    if mode == 'async':
+        await close_async_db()
+    return np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rate', type=float, default=200, help="每秒請求數")
+    parser.add_argument('--duration', type=float, default=5, help="秒")
+    parser.add_argument('--slow-seconds', type=float, default=0.05)
+    args = parser.parse_args()
+
+    df = SyntheticProvider(seed=1).fetch_history(SYMBOL, START, "2024-01-01")
+    with db_connection() as conn:
+        StockCrawler.save_to_db(conn, SYMBOL, df)
+
+    print(f"{args.rate:.0f} req/s for {args.duration:.0f}s, concurrent slow query {args.slow_seconds}s")
+    for mode in ('sync', 'async'):
+        started = time.perf_counter()
+        ms = asyncio.run(run(mode, args.rate, args.duration, args.slow_seconds))
+        elapsed = time.perf_counter() - started
+        print(f"{mode:>5}: p50={np.percentile(ms, 50):7.1f}ms  p99={np.percentile(ms, 99):7.1f}ms  "
+              f"max={ms.max():7.1f}ms  completed in {elapsed:.1f}s")
+    close_db()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+日誌壓測：請求路徑上同步寫出 vs 佇列 + 背景寫出
+
+以 httpx.ASGITransport 在同一個事件迴圈中以固定並行數呼叫 /api/backtest/run
+(相同請求，第二次起由回測結果快取回傳，請求本身很快，日誌的成本最明顯)。
+輸出目標模擬被塞住的終端機 / 日誌管線：每次寫入延遲 --sink-latency-ms 毫秒。
+
+模式：
+    off          不輸出日誌 (基準)
+    inline       handler 直接掛在根 logger，DEBUG 全部在請求路徑上同步寫出 (舊版 print 的行為)
+    queue        setup_logging()，INFO
+    queue-debug  setup_logging()，DEBUG 依 request_id 取樣 (LOG_DEBUG_SAMPLE_RATE)
+
+使用方式 (在 backend 目錄，需本機 PostgreSQL)：
+    python -m benchmarks.bench_logging --requests 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import time
+
+import httpx
+import numpy as np
+
+# 壓測由同一個用戶端送出大量請求，不受限流影響
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from app.core.async_database import close_async_db
+from app.core.structured_logging import (
+    RequestContextFilter,
+    TextFormatter,
+    logging_stats,
+    setup_logging,
+    shutdown_logging,
+)
+from app.main import app
+from app.services.market_data import SyntheticProvider, set_provider
+
+REQUEST = {"symbol": "2330.TW", "start_date": "2020-01-01", "end_date": "2023-12-31", "strategy_type": "rsi"}
+
+
+class SlowSink(io.TextIOBase):
+    """每次寫入都延遲的輸出 (time.sleep 會釋放 GIL，與真正的阻塞 I/O 相同)"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lines = 0
+
+    def write(self, text: str) -> int:
+        time.sleep(self.latency)
+        self.lines += text.count("\n")
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def configure(mode: str, sink: SlowSink):
+    root = logging.getLogger()
+    shutdown_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    if mode == 'off':
+        root.setLevel(logging.CRITICAL + 1)
+    elif mode == 'inline':
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(TextFormatter())
+        handler.addFilter(RequestContextFilter())
+        root.addHandler(handler)
+        root.setLevel(logging.DEBUG)
+    elif mode == 'queue':
+        setup_logging(level="INFO", stream=sink)
+    elif mode == 'queue-debug':
+        setup_logging(level="DEBUG", stream=sink)
+    # 壓測用戶端本身的請求日誌不計入
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+async def run(mode: str, requests: int, concurrency: int, sink_latency: float):
+    sink = SlowSink(sink_latency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        configure('off', sink)
+        response = await client.post("/api/backtest/run", json=REQUEST)
+        assert response.status_code == 200, response.text
+        configure(mode, sink)
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/api/backtest/run", json=REQUEST)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*[one() for _ in range(requests)])
+        elapsed = time.perf_counter() - started
+
+    stats = logging_stats()
+    shutdown_logging()
+    await close_async_db()
+
+    ms = np.array(latencies) * 1000
+    print(f"{mode:<12}{requests / elapsed:>9.0f} req/s  p50={np.median(ms):6.2f}ms  "
+          f"p99={np.percentile(ms, 99):7.2f}ms  lines={sink.lines:>6}  dropped={stats['dropped']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--sink-latency-ms', type=float, default=0.2)
+    args = parser.parse_args()
+
+    set_provider(SyntheticProvider(seed=1))
+    print(f"{args.requests} requests, concurrency {args.concurrency}, "
+          f"sink latency {args.sink_latency_ms}ms per write\n")
+    for mode in ('off', 'inline', 'queue', 'queue-debug'):
+        asyncio.run(run(mode, args.requests, args.concurrency, args.sink_latency_ms / 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+登入風暴壓測：bcrypt 在事件迴圈中執行 + 每次認證查詢 users vs 執行緒池 + 用戶快取
+
+以 httpx.ASGITransport 在同一個事件迴圈中呼叫應用程式 (不經網路)：
+1. storm: 同時送出大量登入，並每 5ms 探測一次 /health，量測其他請求被拖慢的程度
+2. auth: 以固定並行數呼叫需要認證的 /api/auth/me
+
+inline 模式重現舊版行為 (同步 verify_password、不使用用戶快取)。
+
+使用方式 (在 backend 目錄，需本機 PostgreSQL)：
+    python -m benchmarks.bench_login_storm --logins 48 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+import numpy as np
+
+# 壓測由同一個用戶端送出大量請求，不受限流影響
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from app.api import auth
+from app.core.async_database import close_async_db
+from app.core.database import close_db, db_connection
+from app.core.security import get_password_hash, shutdown_password_executor, verify_password
+from app.main import app
+from app.services.user_cache import get_user_cache
+
+USERNAME = "bench_login_storm"
+PASSWORD = "BenchPassword123!"
+
+
+def create_user():
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO users (username, email, hashed_password)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (username) DO UPDATE SET hashed_password = EXCLUDED.hashed_password
+        """, (USERNAME, f"{USERNAME}@example.com", get_password_hash(PASSWORD)))
+        conn.commit()
+        cursor.close()
+
+
+def delete_user():
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM users WHERE username = %s", (USERNAME,))
+        conn.commit()
+        cursor.close()
+
+
+def summary(values) -> str:
+    ms = np.array(values) * 1000
+    return f"p50={np.median(ms):7.1f}ms  p99={np.percentile(ms, 99):7.1f}ms  max={ms.max():7.1f}ms"
+
+
+async def timed(client: httpx.AsyncClient, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    return response.status_code, time.perf_counter() - started
+
+
+async def storm(client: httpx.AsyncClient, logins: int):
+    form = {"username": USERNAME, "password": PASSWORD}
+    done = asyncio.Event()
+    probes = []
+
+    async def probe():
+        while not done.is_set():
+            probes.append((await timed(client, "GET", "/health"))[1])
+            await asyncio.sleep(0.005)
+
+    probe_task = asyncio.create_task(probe())
+    started = time.perf_counter()
+    results = await asyncio.gather(*[timed(client, "POST", "/api/auth/login", data=form) for _ in range(logins)])
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe_task
+
+    ok = [seconds for status, seconds in results if status == 200]
+    print(f"  storm : {len(ok)}/{logins} ok in {elapsed:5.2f}s ({len(ok) / elapsed:5.1f} logins/s)  login {summary(ok)}")
+    print(f"  health: {len(probes)} probes  {summary(probes)}")
+
+
+async def authenticated(client: httpx.AsyncClient, requests: int, concurrency: int):
+    response = await client.post("/api/auth/login", data={"username": USERNAME, "password": PASSWORD})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            status, seconds = await timed(client, "GET", "/api/auth/me", headers=headers)
+            assert status == 200
+            latencies.append(seconds)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(requests)])
+    elapsed = time.perf_counter() - started
+    print(f"  auth  : {requests / elapsed:7.0f} req/s  {summary(latencies)}")
+
+
+async def run(mode: str, logins: int, requests: int, concurrency: int):
+    original = auth.verify_password_async
+    cache = get_user_cache()
+    ttl = cache.ttl
+    if mode == 'inline':
+        async def verify_inline(plain_password, hashed_password):
+            return verify_password(plain_password, hashed_password)
+
+        auth.verify_password_async = verify_inline
+        cache.ttl = 0
+    cache.clear()
+
+    print(mode)
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.get("/health")
+            await storm(client, logins)
+            await authenticated(client, requests, concurrency)
+    finally:
+        auth.verify_password_async = original
+        cache.ttl = ttl
+        await close_async_db()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=48)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    create_user()
+    try:
+        for mode in ('inline', 'pooled'):
+            asyncio.run(run(mode, args.logins, args.requests, args.concurrency))
+    finally:
+        delete_user()
+        shutdown_password_executor()
+        close_db()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+日 K 線讀取比較：逐列 (asyncpg Record -> dict -> DataFrame + to_numeric) vs 二進位 COPY 欄位解碼
+
+使用方式 (在 backend 目錄，需本機 PostgreSQL)：
+    python -m benchmarks.bench_price_loader --years 10
+"""
+import argparse
+import asyncio
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from app.core.async_database import close_async_db, fetch_all
+from app.core.database import close_db, db_connection
+from app.services.market_data import SyntheticProvider
+from app.services.price_loader import arrays_to_frame, load_price_arrays
+from app.services.stock_crawler import StockCrawler
+
+SYMBOL = "2330.TW"
+
+
+async def load_rows(start: date, end: date) -> pd.DataFrame:
+    """舊版讀取路徑"""
+    rows = await fetch_all("""
+        SELECT date::text as date, open, high, low, close, volume
+        FROM stock_prices
+        WHERE symbol = $1 AND date >= $2 AND date <= $3
+        ORDER BY date ASC
+    """, SYMBOL, start, end)
+    df = pd.DataFrame(rows)
+    for col in ['open', 'high', 'low', 'close', 'volume']:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+async def load_columnar(start: date, end: date) -> pd.DataFrame:
+    return arrays_to_frame(await load_price_arrays(SYMBOL, start, end))
+
+
+async def run(repeat: int, start: date, end: date):
+    results = {}
+    for name, loader in (('rows', load_rows), ('columnar', load_columnar)):
+        await loader(start, end)  # 預熱連接池
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            df = await loader(start, end)
+            timings.append(time.perf_counter() - started)
+        ms = np.array(timings) * 1000
+        results[name] = df
+        print(f"{name:>9}: {len(df)} bars  median={np.median(ms):6.2f}ms  p95={np.percentile(ms, 95):6.2f}ms")
+    pd.testing.assert_frame_equal(results['rows'], results['columnar'], check_dtype=False)
+    await close_async_db()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    end = date(2024, 12, 31)
+    start = date(end.year - args.years + 1, 1, 1)
+    df = SyntheticProvider(seed=1).fetch_history(SYMBOL, start.isoformat(), end.isoformat())
+    with db_connection() as conn:
+        StockCrawler.save_to_db(conn, SYMBOL, df)
+
+    asyncio.run(run(args.repeat, start, end))
+    close_db()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+stock_prices 儲存結構比較：舊版單一 heap + 三個 B-tree vs 依年份分區 + BRIN
+
+在獨立的 schema 中建立兩種結構，以 COPY 匯入相同的合成資料 (逐檔依日期排序，
+與爬蟲的寫入順序一致)，比較匯入時間、表與索引大小，以及常見的區間查詢：
+個股一年 (回測)、全市場一個月 (橫斷面)、每檔最新日期 (排程更新)
+
+使用方式 (在 backend 目錄，需本機 PostgreSQL)：
+    python -m benchmarks.bench_price_partitions --symbols 200 --years 20
+"""
+import argparse
+import io
+import time
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+from app.core.config import settings
+from app.core.database import create_stock_prices_table, ensure_price_partitions
+
+SCHEMA = "bench_price_layout"
+COLUMNS = "symbol, date, open, high, low, close, volume"
+
+LEGACY_DDL = [
+    """
+    CREATE TABLE stock_prices (
+        id SERIAL PRIMARY KEY,
+        symbol VARCHAR(20) NOT NULL,
+        date DATE NOT NULL,
+        open NUMERIC(12, 2) NOT NULL,
+        high NUMERIC(12, 2) NOT NULL,
+        low NUMERIC(12, 2) NOT NULL,
+        close NUMERIC(12, 2) NOT NULL,
+        volume BIGINT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (symbol) REFERENCES stocks(symbol) ON DELETE CASCADE,
+        UNIQUE(symbol, date)
+    )
+    """,
+    "CREATE INDEX idx_stock_prices_symbol ON stock_prices(symbol)",
+    "CREATE INDEX idx_stock_prices_date ON stock_prices(date DESC)",
+    "CREATE INDEX idx_stock_prices_symbol_date ON stock_prices(symbol, date DESC)",
+]
+
+QUERIES = {
+    'symbol_1y': (
+        "SELECT date, open, high, low, close, volume FROM stock_prices "
+        "WHERE symbol = %(symbol)s AND date >= %(year_start)s AND date <= %(year_end)s ORDER BY date"
+    ),
+    'market_1m': (
+        "SELECT symbol, date, close FROM stock_prices "
+        "WHERE date >= %(month_start)s AND date < %(month_end)s"
+    ),
+    'latest_per_symbol': (
+        "SELECT symbol, MAX(date) FROM stock_prices GROUP BY symbol"
+    ),
+}
+
+
+def make_csv(symbols: int, years: int) -> io.StringIO:
+    """產生合成日 K 線 CSV (逐檔、依日期排序)"""
+    days = pd.bdate_range(end='2024-12-31', periods=years * 250)
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(symbols):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(days))))
+        frames.append(pd.DataFrame({
+            'symbol': f"{1000 + i}.TW",
+            'date': days.strftime('%Y-%m-%d'),
+            'open': close.round(2),
+            'high': (close * 1.01).round(2),
+            'low': (close * 0.99).round(2),
+            'close': close.round(2),
+            'volume': rng.integers(1000, 100000, len(days)),
+        }))
+    buffer = io.StringIO()
+    pd.concat(frames).to_csv(buffer, index=False, header=False)
+    return buffer
+
+
+def setup(cursor, layout: str, symbols: int, years: range):
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    cursor.execute("CREATE TABLE stocks (symbol VARCHAR(20) PRIMARY KEY)")
+    cursor.execute(
+        "INSERT INTO stocks SELECT (1000 + g)::text || '.TW' FROM generate_series(0, %s) g", (symbols - 1,)
+    )
+    if layout == 'legacy':
+        for ddl in LEGACY_DDL:
+            cursor.execute(ddl)
+    else:
+        create_stock_prices_table(cursor)
+        ensure_price_partitions(cursor, years)
+
+
+def relation_sizes(cursor) -> tuple:
+    """(資料大小, 索引大小) MB，分區表加總所有分區"""
+    cursor.execute("""
+        SELECT COALESCE(SUM(pg_table_size(c.oid)), 0), COALESCE(SUM(pg_indexes_size(c.oid)), 0)
+        FROM pg_class c
+        WHERE c.oid = 'stock_prices'::regclass
+           OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = 'stock_prices'::regclass)
+    """)
+    table, indexes = cursor.fetchone()
+    return table / 2 ** 20, indexes / 2 ** 20
+
+
+def time_query(cursor, sql: str, params: dict, repeat: int) -> float:
+    """執行多次取中位數 (ms)"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=200)
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    csv = make_csv(args.symbols, args.years)
+    rows = args.symbols * args.years * 250
+    years = range(2025 - args.years - 1, 2025)
+    params = {
+        'symbol': "1000.TW",
+        'year_start': '2020-01-01', 'year_end': '2020-12-31',
+        'month_start': '2020-06-01', 'month_end': '2020-07-01',
+    }
+
+    conn = psycopg2.connect(settings.DATABASE_URL)
+    cursor = conn.cursor()
+    print(f"{rows} rows ({args.symbols} symbols x {args.years} years)")
+    try:
+        for layout in ('legacy', 'partitioned'):
+            setup(cursor, layout, args.symbols, years)
+            conn.commit()
+
+            csv.seek(0)
+            started = time.perf_counter()
+            cursor.copy_expert(f"COPY stock_prices ({COLUMNS}) FROM STDIN WITH (FORMAT csv)", csv)
+            conn.commit()
+            load = time.perf_counter() - started
+            cursor.execute("ANALYZE stock_prices")
+            conn.commit()
+
+            table_mb, index_mb = relation_sizes(cursor)
+            timings = {name: time_query(cursor, sql, params, args.repeat) for name, sql in QUERIES.items()}
+            print(f"{layout:>12}: load={load:6.2f}s ({rows / load:9.0f} rows/s)  "
+                  f"table={table_mb:7.1f}MB  indexes={index_mb:7.1f}MB  "
+                  + "  ".join(f"{name}={ms:7.2f}ms" for name, ms in timings.items()))
+    finally:
+        conn.rollback()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+長區間價格查詢：一次載入 vs 伺服器端游標串流
+
+量測第一個位元組與全部輸出的時間，並以 tracemalloc 量測產生回應本文時的記憶體峰值。
+一次載入的路徑包含回應本文的 JSON 序列化
+
+使用方式 (在 backend 目錄，需本機 PostgreSQL)：
+    python -m benchmarks.bench_price_stream --start 1900-01-01
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from datetime import date
+
+from starlette.requests import Request
+
+from app.api.stocks import get_stock_prices
+from app.core.async_database import close_async_db
+from app.core.config import settings
+from app.core.database import close_db, db_connection, ensure_price_partitions
+
+SYMBOL = "BENCH.TW"
+JSON_REQUEST = Request({'type': 'http', 'headers': [(b'accept', b'application/json')]})
+
+
+def load_rows(start: date):
+    """以 generate_series 寫入每個日曆日一筆 (只為產生大量資料列)"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO stocks (symbol, name) VALUES (%s, %s) ON CONFLICT (symbol) DO NOTHING
+        """, (SYMBOL, SYMBOL))
+        ensure_price_partitions(cursor, range(start.year, 2025))
+        cursor.execute("DELETE FROM stock_prices WHERE symbol = %s", (SYMBOL,))
+        cursor.execute("""
+            INSERT INTO stock_prices (symbol, date, open, high, low, close, volume)
+            SELECT %s, d::date, 100 + g %% 7, 108, 99, 101 + g %% 5, 1000 + g
+            FROM generate_series(%s::date, '2024-12-31'::date, '1 day') WITH ORDINALITY AS s(d, g)
+        """, (SYMBOL, start))
+        rows = cursor.rowcount
+        cursor.execute("ANALYZE stock_prices")
+        conn.commit()
+        cursor.close()
+    return rows
+
+
+async def measure(mode: str, start: date, trace: bool):
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    first = None
+    size = 0
+    if mode == 'buffered':
+        settings.PRICE_STREAM_MIN_DAYS = 10 ** 6
+        response = await get_stock_prices(JSON_REQUEST, SYMBOL, start.isoformat(), "2024-12-31")
+        size = len(response.body)
+        first = time.perf_counter()
+    else:
+        settings.PRICE_STREAM_MIN_DAYS = 0
+        response = await get_stock_prices(JSON_REQUEST, SYMBOL, start.isoformat(), "2024-12-31")
+        async for chunk in response.body_iterator:
+            if first is None:
+                first = time.perf_counter()
+            size += len(chunk)
+    total = time.perf_counter() - started
+    if not trace:
+        return first - started, total, size
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+async def run(start: date):
+    for mode in ('buffered', 'streamed'):
+        # tracemalloc 會大幅拖慢 Python 物件配置，時間與記憶體分開量測
+        first, total, size = await measure(mode, start, trace=False)
+        peak = await measure(mode, start, trace=True)
+        print(f"{mode:>9}: first byte={1000 * first:8.1f}ms  total={1000 * total:8.1f}ms  "
+              f"peak={peak / 2 ** 20:7.1f}MB  body={size / 2 ** 20:5.1f}MB")
+    await close_async_db()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--start', default='1900-01-01')
+    args = parser.parse_args()
+
+    start = date.fromisoformat(args.start)
+    print(f"{load_rows(start)} rows")
+    try:
+        asyncio.run(run(start))
+    finally:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM stocks WHERE symbol = %s", (SYMBOL,))
+            conn.commit()
+            cursor.close()
+        close_db()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+回應編碼比較：jsonable_encoder + JSONResponse (舊版) vs orjson vs MessagePack，
+以及各自經 gzip / brotli 壓縮後的大小與耗時
+
+以模擬資料執行一次移動平均回測，量測 /api/backtest/run 回應本文 (含資金曲線與 OHLCV)
+的編碼時間；不需要資料庫
+
+使用方式 (在 backend 目錄)：
+    python -m benchmarks.bench_response_encoding --years 10
+"""
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.api.backtest import BacktestRequest, run_strategy
+from app.core.compression import Compressor
+from app.core.encoding import encode_json, encode_msgpack
+from app.services.market_data import SyntheticProvider
+
+
+def as_lists(value):
+    """舊版引擎回傳 Python list"""
+    if isinstance(value, dict):
+        return {k: as_lists(v) for k, v in value.items()}
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return value
+
+
+def timed(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return result, np.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    end = date(2024, 12, 31)
+    start = date(end.year - args.years + 1, 1, 1)
+    df = SyntheticProvider(seed=1).fetch_history("2330.TW", start.isoformat(), end.isoformat())
+    request = BacktestRequest(symbol="2330.TW", start_date=start.isoformat(), end_date=end.isoformat())
+    content = {'success': True, 'message': '回測完成', 'results': run_strategy(request, df)}
+    legacy = as_lists(content)
+    print(f"{len(df)} bars, {len(content['results']['trades'])} trades\n")
+
+    encoders = {
+        'jsonable_encoder': lambda: JSONResponse(jsonable_encoder(legacy)).body,
+        'orjson': lambda: encode_json(content),
+        'msgpack': lambda: encode_msgpack(content),
+    }
+    print(f"{'encoding':<24}{'encode':>10}{'compress':>10}{'bytes':>12}")
+    for name, encode in encoders.items():
+        body, encode_ms = timed(encode, args.repeat)
+        print(f"{name:<24}{encode_ms:>8.2f}ms{'':>10}{len(body):>12,}")
+        if name == 'jsonable_encoder':
+            continue
+        for encoding in ('gzip', 'br'):
+            compressed, compress_ms = timed(lambda: Compressor(encoding).finish(body), args.repeat)
+            print(f"{name + ' + ' + encoding:<24}{encode_ms:>8.2f}ms{compress_ms:>8.2f}ms{len(compressed):>12,}")
+
+
+if __name__ == '__main__':
+    main()
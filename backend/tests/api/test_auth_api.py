@@ -8,9 +8,14 @@ API Integration Tests for Authentication Endpoints
 4. 獲取當前用戶資訊
 5. 登出功能
 6. 錯誤處理
+7. 認證快取 (命中與停用時失效)
 """
+import time
+
 import pytest
 from fastapi.testclient import TestClient
+from app.core.database import db_connection
+from app.services.user_cache import get_user_cache, start_user_listener, stop_user_listener
 
 
 class TestUserRegistration:
@@ -165,6 +170,65 @@ class TestTokenAuthentication:
         assert response.status_code == 401
 
 
+class TestAuthCache:
+    """測試認證用戶快取"""
+
+    @pytest.fixture
+    def cached_user(self, client):
+        user = {
+            "username": "cacheuser",
+            "email": "cacheuser@example.com",
+            "password": "Test123456!",
+        }
+        client.post("/api/auth/register", json=user)
+        token = client.post("/api/auth/login", data={
+            "username": user["username"], "password": user["password"]
+        }).json()["access_token"]
+
+        yield user["username"], {"Authorization": f"Bearer {token}"}
+
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM users WHERE username = %s", (user["username"],))
+            conn.commit()
+            cursor.close()
+
+    def test_repeated_requests_hit_cache(self, client, cached_user):
+        """測試：同一 Token 的後續請求不再查詢資料庫"""
+        username, headers = cached_user
+        get_user_cache().invalidate(username)
+
+        client.get("/api/auth/me", headers=headers)
+        hits = get_user_cache().stats()['hits']
+        response = client.get("/api/auth/me", headers=headers)
+
+        assert response.status_code == 200
+        assert response.json()["username"] == username
+        assert get_user_cache().stats()['hits'] == hits + 1
+
+    def test_deactivated_user_rejected(self, client, cached_user):
+        """測試：停用用戶後 (直接更新 users 表) 快取立即失效，Token 不再有效"""
+        username, headers = cached_user
+        assert start_user_listener().ready.wait(5)
+        try:
+            assert client.get("/api/auth/me", headers=headers).status_code == 200
+
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("UPDATE users SET is_active = FALSE WHERE username = %s", (username,))
+                conn.commit()
+                cursor.close()
+
+            deadline = time.monotonic() + 5
+            while get_user_cache().get(username) is not None and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            response = client.get("/api/auth/me", headers=headers)
+            assert response.status_code == 401
+        finally:
+            stop_user_listener()
+
+
 class TestLogout:
     """測試登出功能"""
 
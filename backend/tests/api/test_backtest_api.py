@@ -0,0 +1,477 @@
+"""
+API Integration Tests for Backtest Endpoints
+
+測試內容：
+1. 比較已儲存的策略 (共用價格載入與指標計算，依績效排名)
+2. 多檔股票的串流比較 (Server-Sent Events、取消)
+3. 回應編碼 (JSON / MessagePack / 壓縮)
+4. 回測歷史記錄 (寫入、分頁、資金曲線與交易明細)
+5. 回測結果快取 (價格寫入與回測區間重疊時失效)
+6. /metrics 指標
+7. 相同請求的合併 (依呼叫者分開)
+8. 錯誤處理
+"""
+import asyncio
+import json
+import httpx
+import numpy as np
+import pytest
+from app.api import backtest
+from app.core import database
+from app.core.database import db_connection
+from app.core.encoding import decode_msgpack
+from app.main import app
+from app.services.market_data import SyntheticProvider
+from app.services.result_cache import get_result_cache
+from app.services.stock_crawler import StockCrawler
+
+SYMBOL = "2317.TW"
+OTHER_SYMBOL = "1301.TW"
+START, END = "2023-01-01", "2023-12-31"
+
+SAVED_STRATEGIES = [
+    {"name": "MA 5/20", "strategy_type": "moving_average", "short_period": 5, "long_period": 20},
+    {"name": "MA 5/20 copy", "strategy_type": "moving_average", "short_period": 5, "long_period": 20},
+    {"name": "MA 10/60", "strategy_type": "moving_average", "short_period": 10, "long_period": 60},
+    {"name": "RSI 14", "strategy_type": "rsi", "rsi_period": 14},
+    {"name": "BB 20", "strategy_type": "bollinger_bands", "bb_period": 20, "bb_std_dev": 2.0},
+]
+
+
+@pytest.fixture
+def stored_prices():
+    """寫入回測區間的模擬價格資料"""
+    df = SyntheticProvider(seed=5).fetch_history(SYMBOL, START, "2024-01-01")
+    with db_connection() as conn:
+        StockCrawler.save_to_db(conn, SYMBOL, df)
+    return df
+
+
+@pytest.fixture
+def other_prices():
+    """第二檔股票的模擬價格資料"""
+    df = SyntheticProvider(seed=7).fetch_history(OTHER_SYMBOL, START, "2024-01-01")
+    with db_connection() as conn:
+        StockCrawler.save_to_db(conn, OTHER_SYMBOL, df)
+    return df
+
+
+def parse_events(body: str):
+    """解析 Server-Sent Events 本文為 [(事件名稱, 資料)] (略過註解行)"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def saved_strategies(client, authenticated_headers, stored_prices):
+    """建立數個策略，測試結束後刪除"""
+
+    created = [
+        client.post("/api/strategies/", json=strategy, headers=authenticated_headers).json()
+        for strategy in SAVED_STRATEGIES
+    ]
+    yield created
+
+    for strategy in created:
+        client.delete(f"/api/strategies/{strategy['id']}", headers=authenticated_headers)
+
+
+class TestBacktestEncoding:
+    """測試回測結果的回應編碼"""
+
+    REQUEST = {"symbol": SYMBOL, "start_date": START, "end_date": END, "strategy_type": "moving_average"}
+
+    def test_msgpack_matches_json(self, client, stored_prices):
+        """測試：MessagePack 回應的陣列與 JSON 回應相同"""
+        as_json = client.post("/api/backtest/run", json=self.REQUEST)
+        as_msgpack = client.post(
+            "/api/backtest/run", json=self.REQUEST, headers={"Accept": "application/msgpack"}
+        )
+
+        assert as_json.headers["content-type"] == "application/json"
+        assert as_msgpack.headers["content-type"] == "application/msgpack"
+        expected = as_json.json()["results"]
+        results = decode_msgpack(as_msgpack.content)["results"]
+        assert isinstance(results["portfolio_values"], np.ndarray)
+        np.testing.assert_allclose(results["portfolio_values"], expected["portfolio_values"])
+        np.testing.assert_allclose(results["ohlc"]["close"], expected["ohlc"]["close"])
+        assert results["ohlc"]["volume"].tolist() == expected["ohlc"]["volume"]
+        assert results["total_return"] == expected["total_return"]
+        assert len(as_msgpack.content) < len(as_json.content)
+
+    @pytest.mark.parametrize("encoding", ["gzip", "br"])
+    def test_compressed_above_threshold(self, client, stored_prices, encoding):
+        """測試：大型回應依 Accept-Encoding 壓縮並保留 Content-Length"""
+        response = client.post("/api/backtest/run", json=self.REQUEST, headers={"Accept-Encoding": encoding})
+
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == encoding
+        assert int(response.headers["content-length"]) < len(response.content)
+        assert response.json()["results"]["total_trades"] >= 0
+
+
+class TestResultCache:
+    """測試回測結果快取"""
+
+    REQUEST = {"symbol": SYMBOL, "start_date": START, "end_date": END, "strategy_type": "rsi"}
+
+    def run(self, client, **overrides):
+        response = client.post("/api/backtest/run", json={**self.REQUEST, **overrides})
+        assert response.status_code == 200
+        return response.json()["results"]
+
+    def test_repeat_run_is_cached(self, client, stored_prices):
+        """測試：相同請求第二次直接由快取回傳相同結果；參數不同時不命中"""
+        cache = get_result_cache()
+        first = self.run(client)
+        before = cache.stats()
+        second = self.run(client)
+        after = cache.stats()
+
+        assert after["memory_hits"] == before["memory_hits"] + 1
+        assert second == first
+
+        self.run(client, rsi_period=10)
+        assert cache.stats()["misses"] == after["misses"] + 1
+
+    def test_invalidated_only_by_overlapping_writes(self, client, stored_prices):
+        """測試：寫入回測區間外的價格不影響快取；區間內的價格被改寫後重新計算"""
+        cache = get_result_cache()
+        self.run(client)
+
+        later = SyntheticProvider(seed=5).fetch_history(SYMBOL, "2024-02-01", "2024-02-29")
+        with db_connection() as conn:
+            StockCrawler.save_to_db(conn, SYMBOL, later)
+        hits = cache.stats()["memory_hits"]
+        self.run(client)
+        assert cache.stats()["memory_hits"] == hits + 1
+
+        changed = stored_prices[stored_prices["date"] >= "2023-06-01"].head(5).copy()
+        changed["volume"] *= 2
+        with db_connection() as conn:
+            StockCrawler.save_to_db(conn, SYMBOL, changed)
+        misses = cache.stats()["misses"]
+        self.run(client)
+        assert cache.stats()["misses"] == misses + 1
+
+    def test_stats_endpoint(self, client):
+        """測試：統計端點回報命中率"""
+        stats = client.get("/api/system/backtest-cache").json()
+        assert {"entries", "memory_hits", "disk_hits", "misses", "hit_ratio"} <= set(stats)
+
+
+class TestMetrics:
+    """測試 /metrics 指標"""
+
+    def test_backtest_and_route_metrics(self, client, stored_prices):
+        """測試：回測後輸出依路由樣板的延遲、依策略的計算時間與處理的 K 線數"""
+        request = {"symbol": SYMBOL, "start_date": START, "end_date": END, "strategy_type": "bollinger_bands",
+                   "bb_period": 17}
+        assert client.post("/api/backtest/run", json=request).status_code == 200
+        client.get(f"/api/stocks/{SYMBOL}")
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        text = response.text
+        assert 'http_request_duration_seconds_count{method="POST",route="/api/backtest/run",status="200"}' in text
+        assert 'route="/api/stocks/{symbol}"' in text
+        assert 'backtest_duration_seconds_count{strategy_type="bollinger_bands"}' in text
+        assert 'backtest_bars_processed_total{strategy_type="bollinger_bands"}' in text
+        assert 'db_pool_wait_seconds_count{pool="async"}' in text
+        assert 'cache_hit_ratio{cache="backtest_result"}' in text
+
+    def test_scrape_does_not_create_sync_pool(self, client, monkeypatch):
+        """測試：同步連接池尚未建立 (資料庫無法連線) 時抓取不建立連接池，仍回應 200"""
+        monkeypatch.setattr(database, "_connection_pool", None)
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert database._connection_pool is None
+        assert 'db_pool_connections{pool="sync",state="in_use"} 0' in response.text
+        assert "backtest_queue_depth" in response.text
+
+
+class TestRunCoalescing:
+    """測試相同回測請求的合併"""
+
+    REQUEST = {"symbol": SYMBOL, "start_date": START, "end_date": END, "strategy_type": "rsi"}
+
+    def test_coalesced_per_client(self, monkeypatch):
+        """測試：同一呼叫者的相同請求合併；不同呼叫者各自執行 (各自計入並行上限)"""
+        client_keys = []
+
+        async def slow_backtest(request, client_key):
+            client_keys.append(client_key)
+            await asyncio.sleep(0.05)
+            return {"total_return": 1.0, "total_trades": 0}
+
+        monkeypatch.setattr(backtest, "execute_backtest", slow_backtest)
+
+        async def post_from(host):
+            transport = httpx.ASGITransport(app=app, client=(host, 1234))
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                return await http.post("/api/backtest/run", json=self.REQUEST)
+
+        async def run():
+            return await asyncio.gather(post_from("10.0.0.1"), post_from("10.0.0.1"), post_from("10.0.0.2"))
+
+        responses = asyncio.run(run())
+
+        assert [r.status_code for r in responses] == [200, 200, 200]
+        assert sorted(client_keys) == ["ip:10.0.0.1", "ip:10.0.0.2"]
+
+
+class TestBacktestHistory:
+    """測試回測歷史記錄"""
+
+    REQUEST = {"symbol": SYMBOL, "start_date": START, "end_date": END, "strategy_type": "moving_average"}
+
+    def test_run_is_persisted(self, client, authenticated_headers, stored_prices):
+        """測試：登入後的回測寫入歷史，可取回相同的資金曲線與交易明細"""
+        response = client.post("/api/backtest/run", json=self.REQUEST, headers=authenticated_headers)
+        data = response.json()
+        backtest_id = data["backtest_id"]
+        results = data["results"]
+        assert backtest_id is not None
+
+        history = client.get("/api/backtest/history", headers=authenticated_headers).json()["history"]
+        summary = next(h for h in history if h["id"] == backtest_id)
+        assert summary["symbol"] == SYMBOL
+        assert summary["total_return"] == pytest.approx(results["total_return"], abs=1e-4)
+        assert summary["total_trades"] == results["total_trades"]
+        assert summary["curve_length"] == len(results["portfolio_values"])
+        assert "curve" not in summary
+
+        record = client.get(
+            f"/api/backtest/history/{backtest_id}", params={"include": "curve,transactions"},
+            headers=authenticated_headers
+        ).json()["backtest"]
+        assert record["parameters"]["short_period"] == 5
+        assert record["curve"]["dates"] == results["dates"]
+        np.testing.assert_array_equal(record["curve"]["portfolio_values"], results["portfolio_values"])
+        assert len(record["transactions"]) == results["total_trades"]
+        first, trade = record["transactions"][0], results["trades"][0]
+        assert first["traded_at"].startswith(trade["date"])
+        assert first["action"] == trade["action"]
+        assert first["shares"] == trade["shares"]
+        assert first["signal"] == trade["signal"]
+
+    def test_summary_only_by_default(self, client, authenticated_headers, stored_prices):
+        """測試：未指定 include 時不回傳資金曲線與交易明細"""
+        backtest_id = client.post(
+            "/api/backtest/run", json=self.REQUEST, headers=authenticated_headers
+        ).json()["backtest_id"]
+
+        record = client.get(f"/api/backtest/history/{backtest_id}", headers=authenticated_headers).json()["backtest"]
+
+        assert "curve" not in record and "transactions" not in record
+        assert record["id"] == backtest_id
+
+    def test_pagination(self, client, authenticated_headers, stored_prices):
+        """測試：以 next_before 取得下一頁，由新到舊且不重複"""
+        ids = [
+            client.post(
+                "/api/backtest/run", json={**self.REQUEST, "short_period": period}, headers=authenticated_headers
+            ).json()["backtest_id"]
+            for period in (3, 4, 6)
+        ]
+
+        first = client.get(
+            "/api/backtest/history", params={"limit": 2, "symbol": SYMBOL}, headers=authenticated_headers
+        ).json()
+        second = client.get(
+            "/api/backtest/history", params={"limit": 2, "symbol": SYMBOL, "before": first["next_before"]},
+            headers=authenticated_headers
+        ).json()
+
+        assert [h["id"] for h in first["history"]] == [ids[2], ids[1]]
+        assert second["history"][0]["id"] == ids[0]
+
+    def test_anonymous_run_not_persisted(self, client, stored_prices):
+        """測試：未登入的回測不寫入歷史"""
+        response = client.post("/api/backtest/run", json=self.REQUEST)
+
+        assert response.status_code == 200
+        assert response.json()["backtest_id"] is None
+
+    def test_history_requires_authentication(self, client):
+        """測試：未登入時回傳 401"""
+        assert client.get("/api/backtest/history").status_code == 401
+
+    def test_unknown_record(self, client, authenticated_headers):
+        """測試：不存在或他人的記錄回傳 404，不支援的 include 回傳 400"""
+        assert client.get("/api/backtest/history/999999999", headers=authenticated_headers).status_code == 404
+        assert client.get(
+            "/api/backtest/history/1", params={"include": "ohlc"}, headers=authenticated_headers
+        ).status_code == 400
+
+
+class TestCompareStrategies:
+    """測試已儲存策略比較 API (POST /api/backtest/compare)"""
+
+    def test_ranks_all_saved_strategies(self, client, authenticated_headers, saved_strategies):
+        """測試：所有策略依報酬率排名，結果與逐一回測相同"""
+        ids = [s["id"] for s in saved_strategies]
+        response = client.post("/api/backtest/compare", json={
+            "symbol": SYMBOL, "start_date": START, "end_date": END, "strategy_ids": ids
+        }, headers=authenticated_headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        results = data["results"]
+        assert sorted(r["strategy_id"] for r in results) == sorted(ids)
+        assert [r["rank"] for r in results] == [1, 2, 3, 4, 5]
+        returns = [r["total_return"] for r in results]
+        assert returns == sorted(returns, reverse=True)
+        # 相同參數的兩個 MA 5/20 為同一組；MA 5/20 與 BB 20 共用 SMA(20)
+        assert data["indicator_groups"] == 4
+        assert data["indicators_computed"] == 6
+
+        for definition, strategy in zip(SAVED_STRATEGIES, saved_strategies):
+            single = client.post("/api/backtest/run", json={
+                "symbol": SYMBOL, "start_date": START, "end_date": END, **definition
+            }).json()["results"]
+            row = next(r for r in results if r["strategy_id"] == strategy["id"])
+            assert row["total_return"] == single["total_return"]
+            assert row["total_trades"] == single["total_trades"]
+
+    def test_sort_by_sharpe_ratio(self, client, authenticated_headers, saved_strategies):
+        """測試：依夏普比率排名"""
+        response = client.post("/api/backtest/compare", json={
+            "symbol": SYMBOL, "start_date": START, "end_date": END,
+            "strategy_ids": [s["id"] for s in saved_strategies], "sort_by": "sharpe_ratio"
+        }, headers=authenticated_headers)
+
+        assert response.status_code == 200
+        sharpe = [r["sharpe_ratio"] for r in response.json()["results"]]
+        assert sharpe == sorted(sharpe, reverse=True)
+
+    def test_requires_authentication(self, client):
+        """測試：未登入時回傳 401"""
+        response = client.post("/api/backtest/compare", json={
+            "symbol": SYMBOL, "start_date": START, "end_date": END
+        })
+
+        assert response.status_code == 401
+
+    def test_invalid_sort_by(self, client, authenticated_headers):
+        """測試：不支援的排序欄位回傳 400"""
+        response = client.post("/api/backtest/compare", json={
+            "symbol": SYMBOL, "start_date": START, "end_date": END, "sort_by": "name"
+        }, headers=authenticated_headers)
+
+        assert response.status_code == 400
+
+
+class TestCompareStream:
+    """測試串流比較 API (POST /api/backtest/compare/stream)"""
+
+    def test_streams_results_for_each_symbol(self, client, authenticated_headers, saved_strategies, other_prices):
+        """測試：每筆 (股票, 策略) 完成即送出，最後的排名與單檔比較相同"""
+        ids = [s["id"] for s in saved_strategies]
+        response = client.post("/api/backtest/compare/stream", json={
+            "symbols": [SYMBOL, OTHER_SYMBOL], "start_date": START, "end_date": END, "strategy_ids": ids
+        }, headers={**authenticated_headers, "Accept-Encoding": "gzip"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert "content-encoding" not in response.headers
+        events = parse_events(response.text)
+        names = [name for name, _ in events]
+        assert names[0] == "started" and names[-1] == "done"
+        total = events[0][1]["total"]
+        assert total == 10
+        assert names.count("result") == names.count("progress") == total
+
+        progress = [data for name, data in events if name == "progress"]
+        assert [p["completed"] for p in progress] == list(range(1, total + 1))
+        assert progress[-1]["leader"]["total_return"] == max(
+            data["total_return"] for name, data in events if name == "result"
+        )
+
+        ranked = events[-1][1]["results"]
+        assert [r["rank"] for r in ranked] == list(range(1, total + 1))
+        single = client.post("/api/backtest/compare", json={
+            "symbol": SYMBOL, "start_date": START, "end_date": END, "strategy_ids": ids
+        }, headers=authenticated_headers).json()["results"]
+        streamed = {r["strategy_id"]: r for r in ranked if r["symbol"] == SYMBOL}
+        for row in single:
+            assert streamed[row["strategy_id"]]["total_return"] == row["total_return"]
+
+    def test_cancel_stops_pending_work(self, monkeypatch):
+        """測試：收到取消後送出 cancelled，尚未完成的回測被取消"""
+        cancelled_symbols = []
+
+        async def first_result_then_hang(symbol, start_date, end_date, groups, client_key, semaphore, on_result):
+            strategy_id, _ = next(iter(groups.values()))[0]
+            on_result(strategy_id, {"total_return": 5.0})
+            try:
+                await asyncio.Event().wait()
+            finally:
+                cancelled_symbols.append(symbol)
+
+        monkeypatch.setattr(backtest, "run_comparison_groups", first_result_then_hang)
+        strategies = [
+            {"id": i, "name": f"MA {i}", "strategy_type": "moving_average",
+             **dict.fromkeys(backtest.STRATEGY_PARAMETER_COLUMNS)}
+            for i in (1, 2)
+        ]
+        comparison = backtest.StreamComparisonRequest(
+            symbols=[SYMBOL, OTHER_SYMBOL], start_date=START, end_date=END
+        )
+
+        async def run():
+            stream = backtest.comparison_events("job", comparison, strategies, "user:test")
+            assert "job" not in backtest.stream_jobs
+            events = [await stream.__anext__() for _ in range(5)]
+            assert backtest.stream_jobs["job"]["owner"] == "user:test"
+            backtest.stream_jobs["job"]["cancelled"].set()
+            events += [chunk async for chunk in stream]
+            return parse_events(b"".join(events).decode())
+
+        events = asyncio.run(run())
+
+        assert [name for name, _ in events] == [
+            "started", "result", "progress", "result", "progress", "cancelled"
+        ]
+        assert events[2][1]["leader"]["total_return"] == 5.0
+        assert events[-1][1] == {"job_id": "job", "completed": 2, "total": 4}
+        assert sorted(cancelled_symbols) == sorted([SYMBOL, OTHER_SYMBOL])
+        assert "job" not in backtest.stream_jobs
+
+    def test_unsent_response_does_not_register_job(self, monkeypatch):
+        """測試：回應尚未開始送出 (或從未送出) 時不會留下工作"""
+        async def saved(user_id, strategy_ids=None):
+            return [{"id": 1, "name": "MA", "strategy_type": "moving_average",
+                     **dict.fromkeys(backtest.STRATEGY_PARAMETER_COLUMNS)}]
+
+        monkeypatch.setattr(backtest, "load_saved_strategies", saved)
+        comparison = backtest.StreamComparisonRequest(symbols=[SYMBOL], start_date=START, end_date=END)
+
+        async def run():
+            response = await backtest.stream_saved_strategies(comparison, {"id": 1, "username": "test"})
+            assert backtest.stream_jobs == {}
+            await response.body_iterator.aclose()
+
+        asyncio.run(run())
+        assert backtest.stream_jobs == {}
+
+    def test_cancel_unknown_job(self, client, authenticated_headers):
+        """測試：取消不存在的工作回傳 404"""
+        response = client.delete("/api/backtest/jobs/unknown", headers=authenticated_headers)
+
+        assert response.status_code == 404
+
+    def test_too_many_symbols(self, client, authenticated_headers):
+        """測試：超過股票數上限回傳 400"""
+        symbols = [f"{1000 + i}.TW" for i in range(backtest.settings.BACKTEST_STREAM_MAX_SYMBOLS + 1)]
+        response = client.post("/api/backtest/compare/stream", json={
+            "symbols": symbols, "start_date": START, "end_date": END
+        }, headers=authenticated_headers)
+
+        assert response.status_code == 400
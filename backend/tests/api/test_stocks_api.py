@@ -0,0 +1,326 @@
+"""
+API Integration Tests for Stock Endpoints
+
+測試內容：
+1. 股票清單與詳情 (非同步讀取路徑)
+2. 歷史價格查詢與日期篩選 (含跨年度分區)
+3. 週 / 月 K 線彙整
+4. MessagePack 欄位式回應
+5. 條件式 GET (ETag / Last-Modified / 304) 與回應快取
+6. 錯誤處理
+"""
+import json
+
+import pandas as pd
+import pytest
+from app.api import stocks
+from app.core.database import db_connection
+from app.core.encoding import decode_msgpack
+from app.services.market_data import SyntheticProvider
+from app.services.response_cache import get_response_cache
+from app.services.stock_crawler import StockCrawler
+
+
+@pytest.fixture
+def stored_prices():
+    """寫入一段模擬價格資料"""
+    df = SyntheticProvider(seed=11).fetch_history("2330.TW", "2024-01-01", "2024-03-01")
+    with db_connection() as conn:
+        StockCrawler.save_to_db(conn, "2330.TW", df)
+    return df
+
+
+class TestStockList:
+    """測試股票清單 API"""
+
+    def test_list_stocks(self, client):
+        """測試：回傳啟用中的股票並依代號排序"""
+        response = client.get("/api/stocks/")
+
+        assert response.status_code == 200
+        stocks = response.json()
+        assert set(stocks[0]) == {"symbol", "name", "exchange", "industry", "sector", "is_active"}
+        symbols = [s["symbol"] for s in stocks]
+        assert "2330.TW" in symbols
+        assert symbols == sorted(symbols)
+
+    def test_stock_detail(self, client):
+        """測試：取得單一股票資訊"""
+        response = client.get("/api/stocks/2330.TW")
+
+        assert response.status_code == 200
+        assert response.json()["name"] == "台積電"
+
+    def test_stock_detail_not_found(self, client):
+        """測試：不存在的股票回傳 404"""
+        response = client.get("/api/stocks/0000.TW")
+
+        assert response.status_code == 404
+
+
+class TestStockPrices:
+    """測試歷史價格 API"""
+
+    def test_prices_in_range(self, client, stored_prices):
+        """測試：依日期區間篩選且依日期排序"""
+        response = client.get(
+            "/api/stocks/2330.TW/prices",
+            params={"start_date": "2024-02-01", "end_date": "2024-02-29"}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        dates = [p["date"] for p in data["prices"]]
+        expected = stored_prices[stored_prices["date"] >= "2024-02-01"]["date"].tolist()
+        assert dates == expected
+        assert data["count"] == len(expected)
+
+    def test_invalid_date_returns_400(self, client):
+        """測試：日期格式錯誤回傳 400"""
+        response = client.get("/api/stocks/2330.TW/prices", params={"start_date": "2024/01/01"})
+
+        assert response.status_code == 400
+
+    def test_prices_span_year_partitions(self, client):
+        """測試：跨年度寫入時自動建立年份分區，查詢可跨分區"""
+        df = SyntheticProvider(seed=12).fetch_history("2317.TW", "2009-12-01", "2010-02-01")
+        with db_connection() as conn:
+            StockCrawler.save_to_db(conn, "2317.TW", df)
+            cursor = conn.cursor()
+            cursor.execute("SELECT to_regclass('stock_prices_y2009'), to_regclass('stock_prices_y2010')")
+            assert all(cursor.fetchone())
+            cursor.close()
+
+        response = client.get(
+            "/api/stocks/2317.TW/prices",
+            params={"start_date": "2009-12-01", "end_date": "2010-02-01"}
+        )
+
+        assert response.status_code == 200
+        assert response.json()["count"] == len(df)
+
+    def test_unbounded_range_is_streamed(self, client):
+        """測試：未指定起日時串流輸出，內容與一般回應相同"""
+        df = SyntheticProvider(seed=13).fetch_history("2454.TW", "2024-01-01", "2024-03-01")
+        with db_connection() as conn:
+            StockCrawler.save_to_db(conn, "2454.TW", df)
+
+        streamed = client.get("/api/stocks/2454.TW/prices")
+        buffered = client.get(
+            "/api/stocks/2454.TW/prices",
+            params={"start_date": "2024-01-01", "end_date": "2024-03-01"}
+        )
+
+        assert streamed.status_code == 200
+        assert "content-length" not in streamed.headers
+        assert "content-length" in buffered.headers
+        assert streamed.json() == buffered.json()
+        assert streamed.json()["count"] == len(df)
+
+    def test_ndjson_format(self, client, stored_prices):
+        """測試：format=ndjson 每行一筆價格"""
+        response = client.get(
+            "/api/stocks/2330.TW/prices",
+            params={"start_date": "2024-01-01", "end_date": "2024-03-01", "format": "ndjson"}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [p["date"] for p in lines] == stored_prices["date"].tolist()
+        assert set(lines[0]) == {"date", "open", "high", "low", "close", "volume"}
+
+    @pytest.mark.parametrize("interval", ["1d", "1mo"])
+    def test_msgpack_columns(self, client, stored_prices, interval):
+        """測試：Accept: application/msgpack 回傳欄位陣列，內容與 JSON 相同"""
+        params = {"start_date": "2024-01-01", "end_date": "2024-03-01", "interval": interval}
+        rows = client.get("/api/stocks/2330.TW/prices", params=params).json()["prices"]
+        response = client.get(
+            "/api/stocks/2330.TW/prices", params=params, headers={"Accept": "application/msgpack"}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/msgpack"
+        data = decode_msgpack(response.content)
+        assert data["count"] == len(rows)
+        columns = data["columns"]
+        assert columns["date"] == [r["date"] for r in rows]
+        assert columns["close"].tolist() == [r["close"] for r in rows]
+        assert columns["volume"].tolist() == [r["volume"] for r in rows]
+
+    def test_invalid_format_returns_400(self, client):
+        """測試：不支援的格式回傳 400"""
+        response = client.get("/api/stocks/2330.TW/prices", params={"format": "xml"})
+
+        assert response.status_code == 400
+
+
+class TestConditionalGet:
+    """測試以資料版本產生的 ETag / Last-Modified"""
+
+    PARAMS = {"start_date": "2024-01-01", "end_date": "2024-03-01"}
+
+    @pytest.fixture
+    def prices(self):
+        df = SyntheticProvider(seed=21).fetch_history("2891.TW", "2024-01-01", "2024-03-01")
+        with db_connection() as conn:
+            StockCrawler.save_to_db(conn, "2891.TW", df)
+        return df
+
+    def test_not_modified_until_data_changes(self, client, prices):
+        """測試：相同 ETag 回傳 304；寫入新資料後 ETag 改變並回傳新內容"""
+        first = client.get("/api/stocks/2891.TW/prices", params=self.PARAMS)
+        etag = first.headers["etag"]
+        assert etag.startswith('W/"')
+        assert "last-modified" in first.headers
+
+        cached = client.get("/api/stocks/2891.TW/prices", params=self.PARAMS, headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["etag"] == etag
+
+        since = client.get(
+            "/api/stocks/2891.TW/prices", params=self.PARAMS,
+            headers={"If-Modified-Since": first.headers["last-modified"]}
+        )
+        assert since.status_code == 304
+
+        patch = prices[prices["date"] == "2024-02-01"].assign(close=999.0)
+        with db_connection() as conn:
+            StockCrawler.save_to_db(conn, "2891.TW", patch)
+
+        changed = client.get("/api/stocks/2891.TW/prices", params=self.PARAMS, headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        row = next(p for p in changed.json()["prices"] if p["date"] == "2024-02-01")
+        assert row["close"] == 999.0
+
+    def test_streamed_etag_matches_body(self, client, prices, monkeypatch):
+        """測試：串流開始前才提交的寫入不會出現在內容中，ETag 與內容屬於同一版本"""
+        original = stocks.stream_prices
+        patch = prices[prices["date"] == "2024-02-01"].assign(close=999.0)
+
+        def write_then_stream(*args, **kwargs):
+            with db_connection() as conn:
+                StockCrawler.save_to_db(conn, "2891.TW", patch)
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(stocks, "stream_prices", write_then_stream)
+        streamed = client.get("/api/stocks/2891.TW/prices")
+        monkeypatch.undo()
+
+        assert "content-length" not in streamed.headers
+        row = next(p for p in streamed.json()["prices"] if p["date"] == "2024-02-01")
+        assert row["close"] != 999.0
+
+        changed = client.get("/api/stocks/2891.TW/prices", headers={"If-None-Match": streamed.headers["etag"]})
+        assert changed.status_code == 200
+        row = next(p for p in changed.json()["prices"] if p["date"] == "2024-02-01")
+        assert row["close"] == 999.0
+        cached = client.get("/api/stocks/2891.TW/prices", headers={"If-None-Match": changed.headers["etag"]})
+        assert cached.status_code == 304
+
+    def test_etag_depends_on_parameters_and_encoding(self, client, prices):
+        """測試：不同查詢參數或編碼的 ETag 不同"""
+        etags = {
+            client.get("/api/stocks/2891.TW/prices", params=self.PARAMS).headers["etag"],
+            client.get("/api/stocks/2891.TW/prices", params={**self.PARAMS, "interval": "1w"}).headers["etag"],
+            client.get(
+                "/api/stocks/2891.TW/prices", params=self.PARAMS, headers={"Accept": "application/msgpack"}
+            ).headers["etag"],
+        }
+
+        assert len(etags) == 3
+
+    def test_repeat_requests_served_from_cache(self, client, prices):
+        """測試：資料未變更時重複請求由回應快取提供相同本文"""
+        cache = get_response_cache()
+        first = client.get("/api/stocks/2891.TW/prices", params=self.PARAMS)
+        hits = cache.stats()["hits"]
+        second = client.get("/api/stocks/2891.TW/prices", params=self.PARAMS)
+
+        assert cache.stats()["hits"] == hits + 1
+        assert second.content == first.content
+
+    def test_stock_list_version(self, client):
+        """測試：股票清單新增股票後 ETag 改變"""
+        etag = client.get("/api/stocks/").headers["etag"]
+        assert client.get("/api/stocks/", headers={"If-None-Match": etag}).status_code == 304
+
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO stocks (symbol, name) VALUES ('9999.TW', 'ETag test')")
+            conn.commit()
+        try:
+            response = client.get("/api/stocks/", headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert "9999.TW" in [s["symbol"] for s in response.json()]
+        finally:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM stocks WHERE symbol = '9999.TW'")
+                conn.commit()
+
+
+def expected_bars(df, freq: str):
+    """以 pandas 彙整日 K 線 (週期起日為 date)"""
+    frame = df.assign(period=pd.to_datetime(df['date']).dt.to_period(freq).dt.start_time.dt.strftime('%Y-%m-%d'))
+    grouped = frame.groupby('period')
+    return pd.DataFrame({
+        'open': grouped['open'].first(),
+        'high': grouped['high'].max(),
+        'low': grouped['low'].min(),
+        'close': grouped['close'].last(),
+        'volume': grouped['volume'].sum(),
+    }).round(2)
+
+
+class TestAggregatedPrices:
+    """測試週 / 月 K 線"""
+
+    @pytest.fixture
+    def daily(self):
+        df = SyntheticProvider(seed=14).fetch_history("2308.TW", "2023-01-01", "2024-06-30")
+        with db_connection() as conn:
+            StockCrawler.save_to_db(conn, "2308.TW", df)
+        return df
+
+    @pytest.mark.parametrize("interval,freq", [("1w", "W-SUN"), ("1mo", "M"), ("3mo", "Q"), ("1y", "Y")])
+    def test_matches_daily_resample(self, client, daily, interval, freq):
+        """測試：彙整結果與由日 K 線重新計算相同"""
+        response = client.get(
+            "/api/stocks/2308.TW/prices",
+            params={"start_date": "2023-01-01", "end_date": "2024-06-30", "interval": interval}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["interval"] == interval
+        got = pd.DataFrame(data["prices"]).set_index("date")[["open", "high", "low", "close", "volume"]]
+        expected = expected_bars(daily.round(2), freq)
+        assert got.index.tolist() == expected.index.tolist()
+        pd.testing.assert_frame_equal(got, expected, check_dtype=False, check_names=False)
+
+    def test_incremental_update_on_overwrite(self, client, daily):
+        """測試：覆寫日 K 線後只重算受影響的週期"""
+        patch = daily[daily["date"] == "2024-06-03"].assign(high=9999.0, volume=1)
+        with db_connection() as conn:
+            StockCrawler.save_to_db(conn, "2308.TW", patch)
+
+        response = client.get(
+            "/api/stocks/2308.TW/prices",
+            params={"start_date": "2024-05-27", "end_date": "2024-06-09", "interval": "1w"}
+        )
+
+        weeks = {p["date"]: p for p in response.json()["prices"]}
+        assert weeks["2024-06-03"]["high"] == 9999.0
+        assert weeks["2024-05-27"]["high"] < 9999.0
+        week = daily[(daily["date"] >= "2024-06-03") & (daily["date"] <= "2024-06-09")]
+        original = daily.loc[daily["date"] == "2024-06-03", "volume"].iloc[0]
+        assert weeks["2024-06-03"]["volume"] == int(week["volume"].sum() - original + 1)
+
+    def test_invalid_interval_returns_400(self, client):
+        """測試：不支援的週期回傳 400"""
+        response = client.get("/api/stocks/2308.TW/prices", params={"interval": "2d"})
+
+        assert response.status_code == 400
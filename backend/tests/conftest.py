@@ -11,6 +11,9 @@ import sys
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+# 測試由同一個 IP 連續發出大量請求，關閉限流 (限流本身由 test_rate_limit.py 測試)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
 from app.main import app
 from app.core.database import get_db, init_db
 from app.core.security import get_password_hash
@@ -0,0 +1,123 @@
+"""
+Unit tests for the backtest executor
+
+測試內容：
+1. 工作在工作池中執行並記錄等待時間
+2. 每位用戶的並行上限
+3. 佇列上限
+4. 逾時
+5. 等待用戶額度 (批次比較)
+"""
+import asyncio
+import threading
+import pytest
+from app.services.backtest_executor import (
+    BacktestExecutor,
+    BacktestQueueFull,
+    BacktestUserLimitExceeded,
+)
+
+
+def blocking_work(event: threading.Event, value):
+    event.wait(5)
+    return value
+
+
+class TestBacktestExecutor:
+    """測試回測執行器"""
+
+    def test_runs_in_pool_and_records_stats(self):
+        """測試：在工作執行緒中執行並更新統計"""
+        executor = BacktestExecutor(max_workers=2, kind="thread")
+
+        async def run():
+            return await executor.run("user:a", lambda x: (x * 2, threading.current_thread().name), 21)
+
+        value, thread_name = asyncio.run(run())
+        stats = executor.stats()
+        executor.shutdown()
+
+        assert value == 42
+        assert thread_name.startswith("backtest")
+        assert stats['completed'] == 1
+        assert stats['queue_depth'] == 0
+        assert stats['active_users'] == 0
+
+    def test_per_user_limit(self):
+        """測試：同一用戶超過上限被拒絕，其他用戶不受影響"""
+        executor = BacktestExecutor(max_workers=4, max_per_user=1, kind="thread")
+        event = threading.Event()
+
+        async def run():
+            first = asyncio.create_task(executor.run("user:a", blocking_work, event, 1))
+            await asyncio.sleep(0.01)
+            with pytest.raises(BacktestUserLimitExceeded):
+                await executor.run("user:a", blocking_work, event, 2)
+            other = asyncio.create_task(executor.run("user:b", blocking_work, event, 3))
+            await asyncio.sleep(0.01)
+            event.set()
+            return await asyncio.gather(first, other)
+
+        assert asyncio.run(run()) == [1, 3]
+        assert executor.stats()['rejected_user_limit'] == 1
+        executor.shutdown()
+
+    def test_queue_full(self):
+        """測試：工作者與佇列都滿時拒絕新工作"""
+        executor = BacktestExecutor(max_workers=1, max_per_user=10, max_queue=1, kind="thread")
+        event = threading.Event()
+
+        async def run():
+            tasks = [asyncio.create_task(executor.run("user:a", blocking_work, event, i)) for i in range(2)]
+            await asyncio.sleep(0.01)
+            assert executor.stats()['queue_depth'] == 1
+            with pytest.raises(BacktestQueueFull):
+                await executor.run("user:b", blocking_work, event, 9)
+            event.set()
+            return await asyncio.gather(*tasks)
+
+        assert asyncio.run(run()) == [0, 1]
+        executor.shutdown()
+
+    def test_timeout_releases_queued_slot(self):
+        """測試：逾時拋出 TimeoutError，尚未開始的工作被取消並釋放額度"""
+        executor = BacktestExecutor(max_workers=1, max_per_user=10, kind="thread")
+        event = threading.Event()
+
+        async def run():
+            running = asyncio.create_task(executor.run("user:a", blocking_work, event, 1))
+            await asyncio.sleep(0.01)
+            with pytest.raises(asyncio.TimeoutError):
+                await executor.run("user:a", blocking_work, event, 2, timeout=0.05)
+            assert executor.stats()['queue_depth'] == 0
+            event.set()
+            return await running
+
+        assert asyncio.run(run()) == 1
+        assert executor.stats()['timeouts'] == 1
+        executor.shutdown()
+
+    def test_wait_for_slot(self):
+        """測試：wait_for_slot 在用戶額度已滿時等待，前一個工作結束後執行而不拒絕"""
+        executor = BacktestExecutor(max_workers=4, max_per_user=1, kind="thread")
+        event = threading.Event()
+
+        async def run():
+            first = asyncio.create_task(executor.run("user:a", blocking_work, event, 1))
+            await asyncio.sleep(0.01)
+            waiting = [
+                asyncio.create_task(executor.run("user:a", blocking_work, event, i, wait_for_slot=True))
+                for i in (2, 3)
+            ]
+            await asyncio.sleep(0.01)
+            assert not any(task.done() for task in waiting)
+            assert executor.stats()['active_users'] == 1
+            event.set()
+            return await asyncio.gather(first, *waiting)
+
+        assert asyncio.run(run()) == [1, 2, 3]
+        stats = executor.stats()
+        assert stats['rejected_user_limit'] == 0
+        assert stats['slot_waits'] == 2
+        assert stats['active_users'] == 0
+        executor.shutdown()
@@ -0,0 +1,54 @@
+"""
+Unit tests for backtest history encoding
+
+測試內容：
+1. 資金曲線壓縮後可完整還原
+2. 交易明細的 COPY 文字格式 (跳脫特殊字元)
+"""
+import numpy as np
+
+from app.services.backtest_history import copy_transactions, decode_curve, encode_curve
+
+
+class RecordingCursor:
+    """記錄 copy_expert 收到的內容"""
+
+    def copy_expert(self, sql, file):
+        self.sql = sql
+        self.data = file.read()
+
+
+class TestBacktestHistoryEncoding:
+    """測試歷史記錄的編碼"""
+
+    def test_curve_round_trip(self):
+        """測試：資金曲線壓縮後還原為相同的 float64 陣列"""
+        dates = [f"2024-01-{day:02d}" for day in range(1, 31)]
+        values = 100000 + np.cumsum(np.random.default_rng(1).normal(0, 500, len(dates)))
+
+        blob = encode_curve(dates, values)
+        curve = decode_curve(blob)
+
+        assert curve["dates"] == dates
+        assert curve["portfolio_values"].dtype == np.float64
+        np.testing.assert_array_equal(curve["portfolio_values"], values)
+        assert len(blob) < values.nbytes + sum(len(d) for d in dates)
+
+    def test_copy_transactions_format(self):
+        """測試：每筆交易一行，signal 中的 tab / 換行 / 反斜線不破壞格式"""
+        cursor = RecordingCursor()
+        trades = [
+            {"date": "2024-01-02", "action": "BUY", "price": 101.5, "shares": 10, "amount": 1015.0,
+             "signal": "cross\tabove\\long\nline"},
+            {"date": "2024-01-09 13:25", "action": "SELL", "price": 99.25, "shares": 10, "amount": 992.5},
+        ]
+
+        assert copy_transactions(cursor, 7, trades) == 2
+        lines = cursor.data.splitlines()
+        assert lines[0].split("\t") == ["7", "1", "2024-01-02", "BUY", "101.5", "10.0", "1015.0", "cross above\\\\long line"]
+        assert lines[1].split("\t")[:4] == ["7", "2", "2024-01-09 13:25", "SELL"]
+        assert cursor.sql.startswith("COPY backtest_transactions")
+
+    def test_no_transactions(self):
+        """測試：沒有交易時不執行 COPY"""
+        assert copy_transactions(RecordingCursor(), 1, []) == 0
@@ -0,0 +1,90 @@
+"""
+Unit tests for tick-to-bar aggregation
+
+測試內容：
+1. 分段彙整結果與一次性 resample 相同
+2. 跨分段的 K 線正確合併
+3. 延遲的逐筆被捨棄
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.bar_aggregator import BarAggregator, aggregate_file, parse_timeframes
+
+
+def make_ticks(n=5000, seed=0):
+    """產生一個交易日的隨機逐筆 (台北時間，無時區)"""
+    rng = np.random.default_rng(seed)
+    offsets = np.sort(rng.integers(0, 270 * 60 * 1000, n))
+    return pd.DataFrame({
+        'ts': pd.Timestamp('2024-03-04 09:00') + pd.to_timedelta(offsets, unit='ms'),
+        'price': np.round(600 + np.cumsum(rng.normal(0, 0.5, n)), 1),
+        'volume': rng.integers(1, 50, n),
+    })
+
+
+def expected_bars(ticks, rule):
+    """以 pandas resample 計算的參考結果"""
+    grouped = ticks.set_index('ts').resample(rule)
+    bars = pd.DataFrame({
+        'open': grouped['price'].first(),
+        'high': grouped['price'].max(),
+        'low': grouped['price'].min(),
+        'close': grouped['price'].last(),
+        'volume': grouped['volume'].sum(),
+    }).dropna()
+    return bars.reset_index(drop=True)
+
+
+def run_chunks(ticks, chunksize, timeframes=('1m', '5m', '15m')):
+    aggregator = BarAggregator(timeframes)
+    collected = {tf: [] for tf in timeframes}
+    for start in range(0, len(ticks), chunksize):
+        for tf, bars in aggregator.update(ticks.iloc[start:start + chunksize]).items():
+            collected[tf].append(bars)
+    for tf, bars in aggregator.flush().items():
+        collected[tf].append(bars)
+    return aggregator, {tf: pd.concat(frames, ignore_index=True) for tf, frames in collected.items()}
+
+
+class TestBarAggregator:
+    """測試串流式 K 線彙整"""
+
+    @pytest.mark.parametrize('chunksize', [7, 333, 5000])
+    def test_chunked_matches_resample(self, chunksize):
+        """測試：任意分段大小的結果都與一次性 resample 相同"""
+        ticks = make_ticks(3000)
+        _, bars = run_chunks(ticks, chunksize)
+
+        for tf, rule in [('1m', '1min'), ('5m', '5min'), ('15m', '15min')]:
+            expected = expected_bars(ticks, rule)
+            got = bars[tf][['open', 'high', 'low', 'close', 'volume']].astype(float)
+            pd.testing.assert_frame_equal(got, expected.astype(float))
+
+        assert bars['15m']['ts'].iloc[0] == pd.Timestamp('2024-03-04 09:00', tz='Asia/Taipei')
+
+    def test_late_ticks_are_dropped(self):
+        """測試：早於已處理時間的逐筆被捨棄並計數"""
+        ticks = make_ticks(100)
+        aggregator = BarAggregator(['1m'])
+        aggregator.update(ticks.iloc[50:])
+        aggregator.update(ticks.iloc[:10])
+
+        assert aggregator.late_ticks == 10
+        assert aggregator.ticks == 50
+
+    def test_aggregate_file(self, tmp_path):
+        """測試：從 CSV 分段讀取並產出 K 線"""
+        ticks = make_ticks(3000, seed=1)
+        path = tmp_path / "ticks.csv"
+        ticks.to_csv(path, index=False)
+
+        total = sum(len(bars) for tf, bars in aggregate_file(str(path), ['5m'], chunksize=400))
+
+        assert total == len(expected_bars(ticks, '5min'))
+
+    def test_parse_timeframes_rejects_unknown(self):
+        """測試：不支援的週期拋出錯誤"""
+        assert parse_timeframes("1m, 15m") == ['1m', '15m']
+        with pytest.raises(ValueError):
+            parse_timeframes("1m,2h")
@@ -0,0 +1,159 @@
+"""
+Unit tests for the elastic connection pool
+
+測試內容：
+1. 溢出連接在歸還時關閉
+2. 取用逾時與耗盡統計
+3. 過期與失效連接的回收
+4. 多執行緒下連接數不超過上限
+"""
+import threading
+import time
+import pytest
+from psycopg2 import extensions
+from app.core.connection_pool import ElasticConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query):
+        if self.conn.broken:
+            raise Exception("server closed the connection unexpectedly")
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """模擬 psycopg2 連接"""
+
+    def __init__(self, dsn):
+        self.closed = 0
+        self.broken = False
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def get_transaction_status(self):
+        return self.status
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(**kwargs):
+    options = dict(pool_size=2, max_overflow=1, acquire_timeout=0.05, minconn=0, connect=FakeConnection)
+    options.update(kwargs)
+    return ElasticConnectionPool("fake", **options)
+
+
+class TestElasticConnectionPool:
+    """測試彈性連接池"""
+
+    def test_overflow_connection_closed_on_return(self):
+        """測試：超過核心數的連接歸還時關閉"""
+        pool = make_pool()
+        conns = [pool.getconn() for _ in range(3)]
+        assert pool.stats()['overflow'] == 1
+
+        for conn in conns:
+            pool.putconn(conn)
+
+        stats = pool.stats()
+        assert stats['idle'] == 2
+        assert stats['total'] == 2
+        assert stats['overflow_closed'] == 1
+        assert sum(c.closed for c in conns) == 1
+
+    def test_acquire_timeout(self):
+        """測試：連接全部使用中時逾時並記錄耗盡"""
+        pool = make_pool()
+        [pool.getconn() for _ in range(3)]
+
+        with pytest.raises(PoolTimeout):
+            pool.getconn()
+        assert pool.stats()['exhausted'] == 1
+
+    def test_waiter_receives_returned_connection(self):
+        """測試：等待中的取用在連接歸還後取得連接"""
+        pool = make_pool(acquire_timeout=2)
+        conns = [pool.getconn() for _ in range(3)]
+        threading.Timer(0.05, pool.putconn, args=(conns[0],)).start()
+
+        conn = pool.getconn()
+
+        assert conn is conns[0]
+        assert pool.stats()['waits'] == 1
+        assert pool.stats()['checkout_wait']['max_ms'] >= 40
+
+    def test_open_transaction_rolled_back(self):
+        """測試：歸還時回滾未結束的交易"""
+        pool = make_pool()
+        conn = pool.getconn()
+        conn.status = extensions.TRANSACTION_STATUS_INTRANS
+        pool.putconn(conn)
+
+        assert conn.rollbacks == 1
+        assert pool.getconn() is conn
+
+    def test_expired_connection_recycled(self):
+        """測試：超過最長存活時間的連接被替換"""
+        pool = make_pool(max_lifetime=0.01)
+        conn = pool.getconn()
+        time.sleep(0.02)
+        pool.putconn(conn)
+
+        assert conn.closed
+        assert pool.getconn() is not conn
+        assert pool.stats()['recycled'] == 1
+
+    def test_broken_idle_connection_replaced(self):
+        """測試：閒置連接驗證失敗時建立新連接"""
+        pool = make_pool(pre_ping_idle=0)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.broken = True
+
+        fresh = pool.getconn()
+
+        assert fresh is not conn
+        assert conn.closed
+        assert pool.stats()['invalidated'] == 1
+
+    def test_thread_safety(self):
+        """測試：多執行緒同時取用時總連接數不超過上限"""
+        pool = make_pool(pool_size=3, max_overflow=2, acquire_timeout=5)
+        in_use = []
+        peak = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(200):
+                conn = pool.getconn()
+                with lock:
+                    in_use.append(conn)
+                    peak.append(len(in_use))
+                with lock:
+                    in_use.remove(conn)
+                pool.putconn(conn)
+
+        threads = [threading.Thread(target=worker) for _ in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stats = pool.stats()
+        assert max(peak) <= 5
+        assert stats['in_use'] == 0
+        assert stats['total'] <= 3
+        assert stats['checkouts'] == 16 * 200
+        assert stats['exhausted'] == 0
@@ -0,0 +1,72 @@
+"""
+Unit tests for the background data refresher
+
+測試內容：
+1. 寫入失敗 (save_to_db 回滾並回傳 0) 時重試並記為失敗，last_date 不前進
+2. 寫入成功時更新狀態與 last_date
+"""
+import asyncio
+from contextlib import nullcontext
+from datetime import date
+
+from app.services import data_refresher, stock_crawler
+from app.services.data_refresher import DataRefresher
+from app.services.market_data import SyntheticProvider
+from app.services.stock_crawler import StockCrawler
+
+LAST_DATE = date(2024, 1, 31)
+
+
+class FakeConnection:
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def make_refresher(monkeypatch, saved):
+    """以模擬資料來源與假的寫入建立 refresher (saved(valid) 為寫入的筆數)"""
+    provider = SyntheticProvider(seed=3)
+    monkeypatch.setattr(data_refresher, "fetch_history", lambda symbol, start, end: provider.fetch_history(
+        symbol, "2024-02-01", "2024-03-01"
+    ))
+    monkeypatch.setattr(data_refresher, "db_connection", lambda: nullcontext(FakeConnection()))
+    monkeypatch.setattr(stock_crawler, "quarantine_rows", lambda conn, symbol, rejected: len(rejected))
+    monkeypatch.setattr(StockCrawler, "save_to_db", staticmethod(lambda conn, symbol, df: saved(df)))
+    return DataRefresher(max_retries=2, backoff_seconds=0)
+
+
+def refresh(refresher):
+    return asyncio.run(refresher._refresh_symbol(asyncio.Semaphore(1), "2330.TW", LAST_DATE))
+
+
+class TestRefreshSymbol:
+    """測試單一股票的增量更新"""
+
+    def test_save_failure_is_retried_and_reported(self, monkeypatch):
+        """測試：寫入失敗回傳 0 時視為失敗，重試後記為 failed 且 last_date 不變"""
+        calls = []
+
+        def failing(df):
+            calls.append(len(df))
+            return 0
+
+        refresher = make_refresher(monkeypatch, failing)
+        assert refresh(refresher) == 0
+
+        status = refresher.symbol_status["2330.TW"]
+        assert len(calls) == 2
+        assert status['status'] == 'failed'
+        assert status['last_date'] == LAST_DATE
+        assert "valid rows" in status['error']
+
+    def test_successful_save_advances_last_date(self, monkeypatch):
+        """測試：全部寫入時狀態為 ok，last_date 前進到最新日期"""
+        refresher = make_refresher(monkeypatch, len)
+        saved = refresh(refresher)
+
+        status = refresher.symbol_status["2330.TW"]
+        assert saved > 0
+        assert status['status'] == 'ok'
+        assert status['last_date'] > LAST_DATE
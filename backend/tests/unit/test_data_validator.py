@@ -0,0 +1,101 @@
+"""
+Unit tests for price data validation
+
+測試內容：
+1. 正常資料全部通過
+2. 各項檢查能標記出錯誤列
+3. 單一異常跳動不會連帶標記相鄰列
+4. 向量化的中位數與日期解析與 pandas 結果相同
+"""
+import numpy as np
+import pandas as pd
+from app.services.data_validator import _centred_median, validate_prices
+from app.services.market_data import SyntheticProvider
+
+
+def make_frame(rows):
+    return pd.DataFrame(rows, columns=['date', 'open', 'high', 'low', 'close', 'volume'])
+
+
+class TestValidatePrices:
+    """測試資料品質檢查"""
+
+    def test_clean_data_passes(self):
+        """測試：模擬資料全部通過"""
+        df = SyntheticProvider(seed=5).fetch_history("2330.TW", "2023-01-01", "2024-01-01")
+        valid, rejected, summary = validate_prices(df)
+
+        assert len(valid) == len(df)
+        assert rejected.empty
+        assert summary['rejected'] == 0
+
+    def test_each_check_flags_bad_rows(self):
+        """測試：各類錯誤被標記並附上原因"""
+        df = make_frame([
+            ['2024-01-02', 100.0, 105.0, 99.0, 104.0, 1000],    # 正常
+            ['2024-01-03', 100.0, 95.0, 99.0, 98.0, 1000],      # high < low
+            ['2024-01-04', np.nan, 105.0, 99.0, 104.0, 1000],   # 缺值
+            ['2024-01-05', 100.0, 105.0, 99.0, 104.0, 0],       # 交易日零成交量
+            ['2024-01-08', -1.0, 105.0, 99.0, 104.0, 1000],     # 非正價格
+            ['2024-01-09', 110.0, 105.0, 99.0, 104.0, 1000],    # 開盤價超出區間
+            ['2024-01-10', 100.0, 105.0, 99.0, 104.0, 1000],    # 重複日期 (保留後者)
+            ['2024-01-10', 101.0, 106.0, 100.0, 105.0, 1000],
+        ])
+        valid, rejected, summary = validate_prices(df)
+
+        assert valid['date'].tolist() == ['2024-01-02', '2024-01-10']
+        assert valid['open'].tolist() == [100.0, 101.0]
+        assert summary['rejected'] == 6
+        reasons = dict(zip(rejected['date'], rejected['reasons']))
+        assert 'high_below_low' in reasons['2024-01-03']
+        assert 'missing_values' in reasons['2024-01-04']
+        assert reasons['2024-01-05'] == 'zero_volume'
+        assert 'non_positive' in reasons['2024-01-08']
+        assert reasons['2024-01-09'] == 'price_outside_range'
+        assert reasons['2024-01-10'] == 'duplicate_date'
+
+    def test_single_spike_only_flags_itself(self):
+        """測試：單一錯誤 K 線 (價格放大 100 倍) 只標記該列"""
+        df = SyntheticProvider(seed=9).fetch_history("2317.TW", "2024-01-01", "2024-03-01")
+        df.loc[10, ['open', 'high', 'low', 'close']] *= 100
+        valid, rejected, summary = validate_prices(df)
+
+        assert summary['checks']['price_spike'] == 1
+        assert rejected['date'].tolist() == [df.loc[10, 'date']]
+        assert len(valid) == len(df) - 1
+
+    def test_zero_volume_on_holiday_is_allowed(self):
+        """測試：非交易日的零成交量不視為錯誤"""
+        df = make_frame([['2024-01-06', 100.0, 105.0, 99.0, 104.0, 0]])  # 週六
+        _, rejected, summary = validate_prices(df)
+
+        assert rejected.empty
+        assert summary['checks']['zero_volume'] == 0
+
+
+class TestVectorizedHelpers:
+    """測試向量化的輔助計算"""
+
+    def test_centred_median_matches_rolling(self):
+        """測試：與 rolling(5, center=True, min_periods=1).median() 相同 (含缺值與頭尾)"""
+        rng = np.random.default_rng(0)
+        close = rng.uniform(10, 100, 500)
+        close[rng.random(500) < 0.1] = np.nan
+        close[200:206] = np.nan
+        expected = pd.Series(close).rolling(5, center=True, min_periods=1).median().to_numpy()
+
+        np.testing.assert_allclose(_centred_median(close), expected, equal_nan=True)
+        assert _centred_median(np.array([5.0, 1.0])).tolist() == [3.0, 3.0]
+
+    def test_unparseable_date_is_missing(self):
+        """測試：無法解析的日期標記為缺值，其他列照常檢查"""
+        df = make_frame([
+            ['2024-01-02', 100.0, 105.0, 99.0, 104.0, 1000],
+            ['not a date', 100.0, 105.0, 99.0, 104.0, 1000],
+            [pd.Timestamp('2024-01-04'), 100.0, 105.0, 99.0, 104.0, 0],
+        ])
+        _, rejected, summary = validate_prices(df)
+
+        assert summary['checks']['missing_values'] == 1
+        assert summary['checks']['zero_volume'] == 1
+        assert summary['rejected'] == 2
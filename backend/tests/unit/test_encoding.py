@@ -0,0 +1,96 @@
+"""
+Unit tests for response encodings and compression
+
+測試內容：
+1. orjson 直接序列化 NumPy 陣列、純量與 Decimal
+2. MessagePack 的數值陣列 ext 型別可還原
+3. Accept / Accept-Encoding 協商
+4. gzip / brotli 串流壓縮可正確解壓
+"""
+import gzip
+import json
+from decimal import Decimal
+
+import brotli
+import numpy as np
+import pytest
+from starlette.requests import Request
+
+from app.core.compression import Compressor, choose_encoding
+from app.core.encoding import decode_msgpack, encode_json, encode_msgpack, wants_msgpack
+
+CONTENT = {
+    'final_value': np.float64(123.5),
+    'total_trades': np.int64(3),
+    'capital': Decimal('100000.50'),
+    'portfolio_values': np.array([1.0, 2.5, np.nan]),
+    'volume': np.array([10, 20, 30], dtype=np.int64),
+    'dates': ['2024-01-02', '2024-01-03', '2024-01-04'],
+}
+
+
+def request_with(accept: str) -> Request:
+    return Request({'type': 'http', 'headers': [(b'accept', accept.encode())]})
+
+
+class TestEncoders:
+    """測試回應編碼"""
+
+    def test_json_serializes_numpy(self):
+        """測試：NumPy 陣列與純量直接輸出，NaN 為 null"""
+        data = json.loads(encode_json(CONTENT))
+
+        assert data['final_value'] == 123.5
+        assert data['total_trades'] == 3
+        assert data['capital'] == 100000.5
+        assert data['portfolio_values'] == [1.0, 2.5, None]
+        assert data['volume'] == [10, 20, 30]
+
+    def test_msgpack_round_trip(self):
+        """測試：數值陣列還原為相同 dtype 的 NumPy 陣列"""
+        data = decode_msgpack(encode_msgpack(CONTENT))
+
+        np.testing.assert_array_equal(data['portfolio_values'], CONTENT['portfolio_values'])
+        assert data['volume'].dtype == np.int64
+        assert data['dates'] == CONTENT['dates']
+        assert data['total_trades'] == 3
+
+    @pytest.mark.parametrize("accept,expected", [
+        ("application/msgpack", True),
+        ("application/json, application/x-msgpack;q=0.9", True),
+        ("application/msgpack;q=0", False),
+        ("*/*", False),
+        ("", False),
+    ])
+    def test_wants_msgpack(self, accept, expected):
+        """測試：依 Accept 標頭選擇 MessagePack"""
+        assert wants_msgpack(request_with(accept)) is expected
+
+
+class TestCompression:
+    """測試回應壓縮"""
+
+    @pytest.mark.parametrize("accept_encoding,expected", [
+        ("gzip, deflate, br", "br"),
+        ("gzip", "gzip"),
+        ("br;q=0, gzip", "gzip"),
+        ("*", "br"),
+        ("identity", None),
+        ("", None),
+    ])
+    def test_choose_encoding(self, accept_encoding, expected):
+        """測試：優先使用 brotli，q=0 視為不接受"""
+        assert choose_encoding(accept_encoding) == expected
+
+    @pytest.mark.parametrize("encoding,decompress", [
+        ("gzip", gzip.decompress),
+        ("br", brotli.decompress),
+    ])
+    def test_streamed_chunks_decompress(self, encoding, decompress):
+        """測試：逐塊壓縮後可還原完整內容"""
+        chunks = [json.dumps({'row': i}).encode() * 50 for i in range(20)]
+        compressor = Compressor(encoding)
+
+        body = b"".join(compressor.compress(chunk) for chunk in chunks[:-1]) + compressor.finish(chunks[-1])
+
+        assert decompress(body) == b"".join(chunks)
@@ -0,0 +1,41 @@
+"""
+Unit tests for the shared indicator cache
+
+測試內容：
+1. 相同參數只計算一次 (MACD 與 EMA 共用)
+2. 預先計算後數值與直接計算相同
+"""
+import pandas as pd
+
+from app.services.indicators import IndicatorCache
+from app.services.market_data import SyntheticProvider
+
+
+def price_frame() -> pd.DataFrame:
+    return SyntheticProvider(seed=7).fetch_history("2330.TW", "2023-01-01", "2024-01-01")
+
+
+class TestIndicatorCache:
+    """測試指標快取"""
+
+    def test_same_parameters_computed_once(self):
+        """測試：重複取用相同指標不會重新計算"""
+        cache = IndicatorCache(price_frame())
+
+        first = cache.sma(20)
+        assert cache.sma(20) is first
+        cache.macd(12, 26, 9)
+        cache.ema(12)
+
+        # sma(20), ema(12), ema(26), macd
+        assert cache.computed == 4
+
+    def test_precomputed_values_match(self):
+        """測試：預先計算的指標與直接以 pandas 計算的結果相同"""
+        df = price_frame()
+        cache = IndicatorCache(df).compute([('sma', 5), ('rolling_std', 20), ('rsi', 14)])
+
+        pd.testing.assert_series_equal(cache.sma(5), df['close'].rolling(window=5).mean())
+        pd.testing.assert_series_equal(cache.rolling_std(20), df['close'].rolling(window=20).std())
+        assert cache.rsi(14).dropna().between(0, 100).all()
+        assert cache.computed == 3
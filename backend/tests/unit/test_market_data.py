@@ -0,0 +1,155 @@
+"""
+Unit tests for market data providers
+
+測試內容：
+1. 本地檔案重播資料來源
+2. 模擬資料來源的可重現性
+3. StockCrawler 透過資料來源取得資料
+4. 報價快取只批次抓取未命中的股票
+"""
+import pytest
+import pandas as pd
+from app.services.market_data import (
+    FileReplayProvider,
+    SyntheticProvider,
+    set_provider,
+)
+from app.services.quote_cache import QuoteCache, get_quote_cache
+from app.services.stock_crawler import StockCrawler
+
+
+@pytest.fixture
+def replay_dir(tmp_path):
+    """建立含一檔股票 CSV 的重播目錄"""
+    df = pd.DataFrame({
+        'Date': ['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05'],
+        'Open': [100.0, 101.0, 102.0, 103.0],
+        'High': [105.0, 106.0, 107.0, 108.0],
+        'Low': [99.0, 100.0, 101.0, 102.0],
+        'Close': [104.0, 105.0, 106.0, 107.0],
+        'Volume': [1000, 2000, 3000, 4000],
+    })
+    df.to_csv(tmp_path / "2330.TW.csv", index=False)
+    return tmp_path
+
+
+@pytest.fixture
+def restore_provider():
+    """測試前後清空報價快取，結束後恢復預設資料來源"""
+    get_quote_cache().clear()
+    yield
+    set_provider(None)
+    get_quote_cache().clear()
+
+
+class TestFileReplayProvider:
+    """測試本地檔案重播"""
+
+    def test_fetch_history_range(self, replay_dir):
+        """測試：依日期區間切片（結束日不含）"""
+        provider = FileReplayProvider(str(replay_dir))
+        df = provider.fetch_history("2330.TW", "2024-01-03", "2024-01-05")
+
+        assert list(df.columns) == ['date', 'open', 'high', 'low', 'close', 'volume']
+        assert df['date'].tolist() == ['2024-01-03', '2024-01-04']
+
+    def test_missing_symbol_returns_empty(self, replay_dir):
+        """測試：沒有檔案的股票回傳空資料"""
+        provider = FileReplayProvider(str(replay_dir))
+        df = provider.fetch_history("9999.TW", "2024-01-01", "2024-12-31")
+
+        assert df.empty
+
+    def test_fetch_quote_uses_last_bars(self, replay_dir):
+        """測試：報價取自最後兩根 K 線"""
+        provider = FileReplayProvider(str(replay_dir))
+        quote = provider.fetch_quote("2330.TW")
+
+        assert quote['current_price'] == 107.0
+        assert quote['previous_close'] == 106.0
+        assert quote['volume'] == 4000
+
+
+class TestSyntheticProvider:
+    """測試模擬資料來源"""
+
+    def test_deterministic_across_ranges(self):
+        """測試：起日或迄日不同的重疊區間，所有欄位一致"""
+        provider = SyntheticProvider(seed=1)
+        full = provider.fetch_history("2330.TW", "2024-01-01", "2024-03-01")
+        later_start = provider.fetch_history("2330.TW", "2024-02-01", "2024-03-01")
+        earlier_end = provider.fetch_history("2330.TW", "2024-01-01", "2024-02-01")
+
+        for part in (later_start, earlier_end):
+            merged = full.merge(part, on='date', suffixes=('_full', '_part'))
+            assert len(merged) == len(part) > 0
+            for column in ('open', 'high', 'low', 'close', 'volume'):
+                assert (merged[f'{column}_full'] == merged[f'{column}_part']).all(), column
+
+    def test_bars_are_consistent(self):
+        """測試：high >= max(open, close) 且 low <= min(open, close)"""
+        df = SyntheticProvider(seed=7).fetch_history("2317.TW", "2020-01-01", "2024-01-01")
+
+        assert (df['high'] >= df[['open', 'close']].max(axis=1)).all()
+        assert (df['low'] <= df[['open', 'close']].min(axis=1)).all()
+        assert (df['volume'] > 0).all()
+
+
+class TestCrawlerWithProvider:
+    """測試 StockCrawler 透過資料來源取得資料"""
+
+    def test_crawler_uses_configured_provider(self, replay_dir, restore_provider):
+        """測試：StockCrawler 使用替換後的資料來源"""
+        set_provider(FileReplayProvider(str(replay_dir)))
+
+        df = StockCrawler.fetch_stock_data("2330.TW", "2024-01-01", "2024-02-01")
+
+        assert df is not None
+        assert len(df) == 4
+        assert StockCrawler.get_latest_price("2330.TW")['current_price'] == 107.0
+
+    def test_crawler_returns_none_when_empty(self, replay_dir, restore_provider):
+        """測試：查無資料時回傳 None"""
+        set_provider(FileReplayProvider(str(replay_dir)))
+
+        assert StockCrawler.fetch_stock_data("9999.TW", "2024-01-01", "2024-02-01") is None
+
+
+class CountingProvider(SyntheticProvider):
+    """記錄 fetch_quotes 呼叫的模擬資料來源"""
+
+    def __init__(self):
+        super().__init__(seed=3)
+        self.batches = []
+
+    def fetch_quotes(self, symbols):
+        self.batches.append(list(symbols))
+        return super().fetch_quotes(symbols)
+
+
+class TestQuoteCache:
+    """測試報價快取"""
+
+    def test_only_missing_symbols_are_fetched(self, restore_provider):
+        """測試：已快取的股票不重複抓取，未命中的一次批次抓取"""
+        provider = CountingProvider()
+        set_provider(provider)
+        cache = QuoteCache(session_ttl=60, closed_ttl=60)
+
+        cache.get_many(["2330.TW"])
+        quotes = cache.get_many(["2330.TW", "2317.TW", "2454.TW"])
+
+        assert provider.batches == [["2330.TW"], ["2317.TW", "2454.TW"]]
+        assert list(quotes) == ["2330.TW", "2317.TW", "2454.TW"]
+        assert cache.stats()['hits'] == 1
+
+    def test_expired_entries_are_refetched(self, restore_provider):
+        """測試：過期的報價重新抓取"""
+        provider = CountingProvider()
+        set_provider(provider)
+        cache = QuoteCache(session_ttl=0, closed_ttl=0)
+
+        cache.get("2330.TW")
+        cache.get("2330.TW")
+
+        assert len(provider.batches) == 2
@@ -0,0 +1,101 @@
+"""
+Unit tests for in-process metrics
+
+測試內容：
+1. 直方圖區間累加、_sum / _count
+2. 計數器與標籤跳脫
+3. 抓取時的收集函式與文字格式
+4. 收集函式失敗時只略過它的指標
+"""
+import pytest
+
+from app.core.metrics import Counter, Histogram, MetricFamily, Registry
+
+
+def sample_lines(registry: Registry):
+    return [line for line in registry.render().splitlines() if not line.startswith("#")]
+
+
+class TestHistogram:
+    """測試直方圖"""
+
+    def test_cumulative_buckets(self):
+        """測試：各區間為累計值，邊界值計入該區間，+Inf 等於總數"""
+        registry = Registry()
+        latency = registry.register(Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0)))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            latency.observe(value, "/a")
+
+        assert sample_lines(registry) == [
+            'latency_seconds_bucket{route="/a",le="0.1"} 2',
+            'latency_seconds_bucket{route="/a",le="1"} 3',
+            'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+            'latency_seconds_sum{route="/a"} 2.65',
+            'latency_seconds_count{route="/a"} 4',
+        ]
+        assert latency.count("/a") == 4
+        assert latency.count("/b") == 0
+
+
+class TestCounter:
+    """測試計數器"""
+
+    def test_total_suffix_and_escaping(self):
+        """測試：輸出加上 _total，標籤值中的引號、反斜線與換行跳脫"""
+        registry = Registry()
+        failures = registry.register(Counter("fetch_failures", "Failures", ("reason",)))
+        failures.inc('say "hi"\\\n')
+        failures.inc('say "hi"\\\n', amount=2)
+
+        assert failures.value('say "hi"\\\n') == 3
+        assert sample_lines(registry) == ['fetch_failures_total{reason="say \\"hi\\"\\\\\\n"} 3']
+
+    def test_duplicate_name_rejected(self):
+        """測試：同名指標只能登錄一次"""
+        registry = Registry()
+        registry.register(Counter("requests", "Requests"))
+        with pytest.raises(ValueError):
+            registry.register(Counter("requests", "Requests"))
+
+
+class TestCollectors:
+    """測試抓取時的收集函式"""
+
+    def test_families_rendered_at_scrape(self):
+        """測試：每次抓取都重新呼叫收集函式並輸出 HELP / TYPE"""
+        registry = Registry()
+        hits = [0]
+
+        def collect():
+            hits[0] += 1
+            return [
+                MetricFamily("cache_hits", "Hits", kind="counter").add(hits[0], cache="quote"),
+                MetricFamily("cache_hit_ratio", "Ratio").add(0.5, cache="quote"),
+            ]
+
+        registry.add_collector(collect)
+        registry.render()
+        text = registry.render()
+
+        assert "# TYPE cache_hits counter" in text
+        assert 'cache_hits_total{cache="quote"} 2' in text
+        assert "# TYPE cache_hit_ratio gauge" in text
+        assert 'cache_hit_ratio{cache="quote"} 0.5' in text
+
+    def test_failing_collector_skipped(self):
+        """測試：收集函式拋出例外 (含產生途中失敗) 時只略過它的指標，其他指標照常輸出"""
+        registry = Registry()
+        registry.register(Counter("requests", "Requests")).inc()
+
+        def broken():
+            raise ConnectionError("database unavailable")
+
+        def broken_midway():
+            yield MetricFamily("partial", "Partial").add(1)
+            raise RuntimeError("stats failed")
+
+        registry.add_collector(broken)
+        registry.add_collector(broken_midway)
+        registry.add_collector(lambda: [MetricFamily("queue_depth", "Depth").add(3)])
+
+        assert sample_lines(registry) == ["requests_total 1", "queue_depth 3"]
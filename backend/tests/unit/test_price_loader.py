@@ -0,0 +1,59 @@
+"""
+Unit Tests for Price Loader
+
+測試內容：
+1. 二進位 COPY 格式解碼
+2. 轉換為回測 DataFrame
+"""
+import struct
+
+import numpy as np
+import pytest
+
+from app.services.price_loader import COPY_SIGNATURE, arrays_to_frame, decode_price_copy
+
+
+def build_copy(rows, extension=b''):
+    """依 PostgreSQL 二進位 COPY 格式組出位元組 (date 為自 2000-01-01 起的天數)"""
+    data = COPY_SIGNATURE + struct.pack('>ii', 0, len(extension)) + extension
+    for day, o, h, l, c, v in rows:
+        data += struct.pack('>h', 6) + struct.pack('>ii', 4, day)
+        for price in (o, h, l, c):
+            data += struct.pack('>id', 8, price)
+        data += struct.pack('>iq', 8, v)
+    return data + struct.pack('>h', -1)
+
+
+class TestDecodePriceCopy:
+    """測試二進位 COPY 解碼"""
+
+    def test_decode_rows(self):
+        """測試：日期與數值欄位正確解碼為原生陣列"""
+        data = build_copy([(8766, 100.5, 101.0, 99.5, 100.0, 1200), (8767, 100.0, 102.25, 99.0, 102.0, 3400)])
+
+        arrays = decode_price_copy(data)
+
+        assert arrays['date'].tolist() == [np.datetime64('2024-01-01'), np.datetime64('2024-01-02')]
+        assert arrays['high'].tolist() == [101.0, 102.25]
+        assert arrays['volume'].dtype == np.int64
+        assert arrays['volume'].tolist() == [1200, 3400]
+        assert arrays['close'].dtype.isnative
+
+    def test_empty_result_and_header_extension(self):
+        """測試：沒有資料列、標頭含擴充區時仍可解碼"""
+        arrays = decode_price_copy(build_copy([], extension=b'\x00' * 6))
+
+        assert len(arrays['date']) == 0
+        assert arrays['open'].dtype == np.float64
+
+    def test_invalid_signature(self):
+        """測試：非二進位 COPY 資料拋出錯誤"""
+        with pytest.raises(ValueError):
+            decode_price_copy(b'date,open\n')
+
+    def test_arrays_to_frame(self):
+        """測試：date 欄位轉為 YYYY-MM-DD 字串"""
+        df = arrays_to_frame(decode_price_copy(build_copy([(8766, 1.0, 2.0, 0.5, 1.5, 10)])))
+
+        assert list(df.columns) == ['date', 'open', 'high', 'low', 'close', 'volume']
+        assert df['date'].tolist() == ['2024-01-01']
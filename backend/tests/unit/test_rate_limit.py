@@ -0,0 +1,195 @@
+"""
+Unit tests for the token-bucket rate limiter
+
+測試內容：
+1. 每分鐘 / 每小時 bucket 的扣除、補充與 Retry-After
+2. 閒置 key 的淘汰與 key 數量上限
+3. 中介層：路由成本、依用戶 / IP 分開計算、豁免路徑、429 回應
+4. 資料庫後端出錯時放行
+"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core import rate_limit
+from app.core.rate_limit import MemoryRateLimiter, PostgresRateLimiter, RateLimitMiddleware, route_cost
+from app.core.security import create_access_token
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMemoryRateLimiter:
+    """測試程序內限流"""
+
+    def test_minute_bucket_refills(self):
+        """測試：用完每分鐘額度後拒絕，依速率補充後再放行"""
+        clock = FakeClock()
+        limiter = MemoryRateLimiter(per_minute=6, per_hour=1000, clock=clock)
+
+        assert [limiter.take_sync("ip:a").allowed for _ in range(7)] == [True] * 6 + [False]
+        denied = limiter.take_sync("ip:a")
+        assert denied.retry_after == pytest.approx(10.0)
+
+        clock.now += 10
+        assert limiter.take_sync("ip:a").allowed
+        assert not limiter.take_sync("ip:a").allowed
+        assert limiter.stats()['limited'] == 3
+
+    def test_hour_bucket_limits_sustained_rate(self):
+        """測試：每分鐘額度補滿但每小時額度用完時仍拒絕"""
+        clock = FakeClock()
+        limiter = MemoryRateLimiter(per_minute=10, per_hour=15, clock=clock)
+
+        assert sum(limiter.take_sync("ip:a").allowed for _ in range(10)) == 10
+        clock.now += 60
+        assert sum(limiter.take_sync("ip:a").allowed for _ in range(10)) == 5
+        denied = limiter.take_sync("ip:a")
+        # 每小時 bucket 每 240 秒補充 1 個 token；60 秒內補充的 0.25 個尚未用完，還差 0.75 個
+        assert denied.retry_after == pytest.approx(180.0)
+
+    def test_cost_and_separate_keys(self):
+        """測試：成本一次扣除多個 token，不同呼叫者各自計算"""
+        limiter = MemoryRateLimiter(per_minute=10, per_hour=1000, clock=FakeClock())
+
+        assert limiter.take_sync("user:alice", 10).allowed
+        assert not limiter.take_sync("user:alice", 1).allowed
+        assert limiter.take_sync("user:bob", 1).remaining == 9
+
+    def test_idle_keys_evicted(self):
+        """測試：bucket 已補滿的閒置 key 被淘汰，結果與保留時相同"""
+        clock = FakeClock()
+        limiter = MemoryRateLimiter(per_minute=60, per_hour=3600, clock=clock)
+        for i in range(100):
+            limiter.take_sync(f"ip:{i}")
+        assert limiter.stats()['active_keys'] == 100
+
+        # 每小時 bucket 1 秒補充 1 個 token，1 秒後全部補滿
+        clock.now += 1
+        limiter.take_sync("ip:new")
+        stats = limiter.stats()
+        assert stats['active_keys'] == 1
+        assert stats['evicted'] == 100
+        assert limiter.take_sync("ip:0").remaining == 59
+
+    def test_max_keys(self):
+        """測試：超過 key 數量上限時淘汰最久未使用的 key"""
+        limiter = MemoryRateLimiter(per_minute=60, per_hour=1000, max_keys=3, clock=FakeClock())
+        for i in range(5):
+            limiter.take_sync(f"ip:{i}")
+
+        assert limiter.stats()['active_keys'] == 3
+        assert list(limiter._buckets) == ["ip:2", "ip:3", "ip:4"]
+
+
+def make_app(limiter, enabled=True):
+    app = FastAPI()
+
+    @app.get("/api/stocks/{symbol}/prices")
+    async def prices(symbol: str):
+        return {"symbol": symbol}
+
+    @app.post("/api/backtest/run")
+    async def run():
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    app.add_middleware(RateLimitMiddleware, limiter=limiter, enabled=enabled)
+    return app
+
+
+async def send_requests(app, requests, client=("10.0.0.1", 1234)):
+    transport = httpx.ASGITransport(app=app, client=client)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        return [await http.request(method, path, headers=headers or {}) for method, path, headers in requests]
+
+
+class TestRateLimitMiddleware:
+    """測試限流中介層"""
+
+    def test_route_cost(self):
+        """測試：回測成本高於價格讀取，且不超過每分鐘上限"""
+        assert route_cost("POST", "/api/backtest/run", 60) > route_cost("GET", "/api/stocks/2330.TW/prices", 60)
+        assert route_cost("POST", "/api/backtest/compare", 4) == 4
+        assert route_cost("POST", "/api/backtest/run/", 60) == route_cost("POST", "/api/backtest/run", 60)
+
+    def test_expensive_route_uses_more_tokens(self):
+        """測試：回測扣除 5 個 token，超過時回應 429 與 Retry-After"""
+        limiter = MemoryRateLimiter(per_minute=12, per_hour=1000, clock=FakeClock())
+        responses = asyncio.run(send_requests(make_app(limiter), [
+            ("POST", "/api/backtest/run", None),
+            ("POST", "/api/backtest/run", None),
+            ("POST", "/api/backtest/run", None),
+            ("GET", "/api/stocks/2330.TW/prices", None),
+            ("GET", "/api/stocks/2330.TW/prices", None),
+            ("GET", "/api/stocks/2330.TW/prices", None),
+        ]))
+
+        assert [r.status_code for r in responses] == [200, 200, 429, 200, 200, 429]
+        assert responses[2].headers["retry-after"] == "15"
+        assert responses[2].json()["detail"] == "請求過於頻繁，請稍後再試"
+
+    def test_user_and_ip_keys(self):
+        """測試：有效 Token 以用戶計算，無效 Token 退回以 IP 計算"""
+        limiter = MemoryRateLimiter(per_minute=1, per_hour=1000, clock=FakeClock())
+        token = create_access_token({"sub": "alice"})
+        path = "/api/stocks/2330.TW/prices"
+        responses = asyncio.run(send_requests(make_app(limiter), [
+            ("GET", path, {"Authorization": f"Bearer {token}"}),
+            ("GET", path, {"Authorization": f"Bearer {token}"}),
+            ("GET", path, {"Authorization": "Bearer invalid"}),
+            ("GET", path, None),
+        ]))
+
+        assert [r.status_code for r in responses] == [200, 429, 200, 429]
+        assert set(limiter._buckets) == {"user:alice", "ip:10.0.0.1"}
+
+    def test_exempt_and_disabled(self):
+        """測試：健康檢查不限流；停用時不扣除 token"""
+        limiter = MemoryRateLimiter(per_minute=1, per_hour=1000, clock=FakeClock())
+        responses = asyncio.run(send_requests(make_app(limiter), [("GET", "/health", None)] * 3))
+        assert [r.status_code for r in responses] == [200] * 3
+
+        disabled = make_app(limiter, enabled=False)
+        responses = asyncio.run(send_requests(disabled, [("POST", "/api/backtest/run", None)] * 3))
+        assert [r.status_code for r in responses] == [200] * 3
+        assert limiter.stats()['active_keys'] == 0
+
+
+class TestPostgresRateLimiter:
+    """測試資料庫後端 (資料庫行為見 tests/integration/test_rate_limit.py)"""
+
+    def test_fail_open(self, monkeypatch):
+        """測試：資料庫出錯時放行並計數"""
+        async def broken(*args):
+            raise ConnectionError("database unavailable")
+
+        monkeypatch.setattr(rate_limit, "fetch_one", broken)
+        limiter = PostgresRateLimiter(per_minute=1, per_hour=10)
+        decisions = [asyncio.run(limiter.take("ip:a")) for _ in range(3)]
+
+        assert all(d.allowed for d in decisions)
+        assert limiter.stats()['errors'] == 3
+
+    def test_decision_from_row(self, monkeypatch):
+        """測試：由資料庫回傳的剩餘 token 計算 Retry-After"""
+        async def denied(*args):
+            return {'allowed': False, 'minute_left': 0.5, 'hour_left': 100.0}
+
+        monkeypatch.setattr(rate_limit, "fetch_one", denied)
+        limiter = PostgresRateLimiter(per_minute=60, per_hour=3600)
+        decision = asyncio.run(limiter.take("ip:a", 5))
+
+        assert not decision.allowed
+        assert decision.retry_after == pytest.approx(4.5)
+        assert limiter.stats()['limited'] == 1
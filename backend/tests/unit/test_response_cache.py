@@ -0,0 +1,85 @@
+"""
+Unit tests for conditional GET helpers and the response cache
+
+測試內容：
+1. ETag 比對 (弱比較、多個值、*) 與 If-Modified-Since
+2. 回應快取依資料版本命中
+3. 依位元組數的 LRU 淘汰
+"""
+from datetime import datetime, timedelta, timezone
+
+from starlette.requests import Request
+
+from app.core.conditional import is_not_modified, make_etag, validator_headers
+from app.services.response_cache import ResponseCache
+
+
+def request_with(**headers) -> Request:
+    raw = [(name.replace('_', '-').lower().encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+class TestConditional:
+    """測試條件式 GET"""
+
+    UPDATED_AT = datetime(2024, 3, 1, 8, 30, 15, 123456, tzinfo=timezone.utc)
+
+    def test_etag_matching(self):
+        """測試：弱比較、清單中任一值或 * 皆視為相符"""
+        etag = make_etag("prices:2330.TW", 3)
+
+        assert etag != make_etag("prices:2330.TW", 4)
+        assert is_not_modified(request_with(If_None_Match=etag), etag)
+        assert is_not_modified(request_with(If_None_Match=f'"other", {etag.removeprefix("W/")}'), etag)
+        assert is_not_modified(request_with(If_None_Match="*"), etag)
+        assert not is_not_modified(request_with(If_None_Match='W/"other"'), etag)
+        assert not is_not_modified(request_with(), etag)
+
+    def test_if_modified_since(self):
+        """測試：Last-Modified 只精確到秒；If-None-Match 優先"""
+        etag = make_etag("stocks", 1)
+        last_modified = validator_headers(etag, self.UPDATED_AT)["Last-Modified"]
+        assert last_modified == "Fri, 01 Mar 2024 08:30:15 GMT"
+
+        assert is_not_modified(request_with(If_Modified_Since=last_modified), etag, self.UPDATED_AT)
+        assert not is_not_modified(
+            request_with(If_Modified_Since=last_modified), etag, self.UPDATED_AT + timedelta(seconds=1)
+        )
+        assert not is_not_modified(
+            request_with(If_Modified_Since=last_modified, If_None_Match='W/"other"'), etag, self.UPDATED_AT
+        )
+        assert not is_not_modified(request_with(If_Modified_Since="yesterday"), etag, self.UPDATED_AT)
+
+
+class TestResponseCache:
+    """測試回應快取"""
+
+    def test_hit_only_for_same_version(self):
+        """測試：版本相同才命中，新版本寫入後取代舊項目"""
+        cache = ResponseCache()
+        cache.put("stocks", 1, b"[1]", "application/json")
+
+        assert cache.get("stocks", 1) == (b"[1]", "application/json")
+        assert cache.get("stocks", 2) is None
+
+        cache.put("stocks", 2, b"[1,2]", "application/json")
+        stats = cache.stats()
+        assert cache.get("stocks", 2) == (b"[1,2]", "application/json")
+        assert stats["entries"] == 1
+        assert stats["bytes"] == 5
+        assert stats["hits"] == 1 and stats["misses"] == 1
+
+    def test_evicts_least_recently_used_by_size(self):
+        """測試：超過總大小時淘汰最久未使用的項目，過大的本文不快取"""
+        cache = ResponseCache(max_bytes=10, max_item_bytes=6)
+        cache.put("a", 1, b"aaaa", "application/json")
+        cache.put("b", 1, b"bbbb", "application/json")
+        cache.get("a", 1)
+        cache.put("c", 1, b"cccc", "application/json")
+        cache.put("d", 1, b"d" * 7, "application/json")
+
+        assert cache.get("a", 1) is not None
+        assert cache.get("b", 1) is None
+        assert cache.get("c", 1) is not None
+        assert cache.get("d", 1) is None
+        assert cache.stats()["evictions"] == 1
@@ -0,0 +1,91 @@
+"""
+Unit tests for the backtest result cache
+
+測試內容：
+1. 記憶體層 LRU 與命中率
+2. 磁碟層跨實例保留 (模擬重新啟動)、損毀檔案視為未命中
+3. 磁碟層超過上限時清除最舊的檔案
+"""
+import os
+
+import numpy as np
+
+from app.services.result_cache import BacktestResultCache, result_key
+
+RESULTS = {
+    'total_return': 12.5,
+    'dates': ['2024-01-02', '2024-01-03'],
+    'portfolio_values': np.array([100000.0, 101250.0]),
+    'trades': [{'date': '2024-01-02', 'action': 'BUY', 'price': 580.0, 'shares': 100}],
+}
+
+
+class TestResultKey:
+    """測試快取鍵"""
+
+    def test_depends_on_request_and_version(self):
+        """測試：請求雜湊或資料版本不同時鍵不同"""
+        assert result_key("abc", 1) == result_key("abc", 1)
+        assert result_key("abc", 1) != result_key("abc", 2)
+        assert result_key("abc", 1) != result_key("abd", 1)
+
+
+class TestMemoryTier:
+    """測試記憶體層"""
+
+    def test_lru_and_hit_ratio(self):
+        """測試：超過數量時淘汰最久未使用的結果，統計命中率"""
+        cache = BacktestResultCache(max_entries=2)
+        cache.put("a", {'n': 1})
+        cache.put("b", {'n': 2})
+        assert cache.get("a") == {'n': 1}
+        cache.put("c", {'n': 3})
+
+        assert cache.get("b") is None
+        assert cache.get("c") == {'n': 3}
+        stats = cache.stats()
+        assert stats['entries'] == 2
+        assert stats['memory_hits'] == 2 and stats['misses'] == 1
+        assert stats['hit_ratio'] == round(2 / 3, 4)
+        assert stats['evictions'] == 1
+
+
+class TestDiskTier:
+    """測試磁碟層"""
+
+    def test_survives_restart(self, tmp_path):
+        """測試：新的實例 (重新啟動) 從磁碟讀回相同的結果並放回記憶體層"""
+        BacktestResultCache(disk_dir=str(tmp_path)).put("k", RESULTS)
+
+        cache = BacktestResultCache(disk_dir=str(tmp_path))
+        assert cache.stats()['disk_entries'] == 1
+        restored = cache.get("k")
+        assert restored['total_return'] == 12.5
+        assert restored['dates'] == RESULTS['dates']
+        assert restored['trades'] == RESULTS['trades']
+        np.testing.assert_array_equal(restored['portfolio_values'], RESULTS['portfolio_values'])
+
+        cache.get("k")
+        stats = cache.stats()
+        assert stats['disk_hits'] == 1 and stats['memory_hits'] == 1
+
+    def test_corrupt_file_is_a_miss(self, tmp_path):
+        """測試：無法解碼的檔案視為未命中"""
+        (tmp_path / "k.bin").write_bytes(b"not zlib")
+        cache = BacktestResultCache(disk_dir=str(tmp_path))
+
+        assert cache.get("k") is None
+        cache.put("k", RESULTS)
+        assert BacktestResultCache(disk_dir=str(tmp_path)).get("k")['total_return'] == 12.5
+
+    def test_prunes_oldest_files(self, tmp_path):
+        """測試：超過上限時刪除修改時間最舊的檔案"""
+        cache = BacktestResultCache(max_entries=1, disk_dir=str(tmp_path), max_disk_entries=10)
+        for i in range(11):
+            cache.put(f"k{i}", {'n': i})
+            os.utime(tmp_path / f"k{i}.bin", (1000 + i, 1000 + i))
+
+        remaining = sorted(p.name for p in tmp_path.glob("*.bin"))
+        assert len(remaining) == 9
+        assert "k0.bin" not in remaining and "k1.bin" not in remaining
+        assert cache.stats()['disk_entries'] == 9
@@ -7,12 +7,18 @@ Unit tests for security functions (password hashing, JWT tokens)
 3. JWT Token 生成
 4. JWT Token 解碼
 5. Token 過期處理
+6. 密碼雜湊執行緒池 (不阻塞事件迴圈、等待上限)
 """
+import asyncio
 import pytest
 from datetime import timedelta
+from fastapi import HTTPException
+from app.core.config import settings
 from app.core.security import (
     get_password_hash,
+    get_password_hash_async,
     verify_password,
+    verify_password_async,
     create_access_token,
     decode_access_token
 )
@@ -61,6 +67,52 @@ class TestPasswordHashing:
             get_password_hash("")
 
 
+class TestPasswordThreadPool:
+    """測試密碼雜湊執行緒池"""
+
+    def test_verify_does_not_block_event_loop(self):
+        """測試：驗證密碼期間事件迴圈仍可處理其他工作"""
+        hashed = get_password_hash("TestPassword123!")
+
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.005)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            results = await asyncio.gather(*[
+                verify_password_async("TestPassword123!", hashed) for _ in range(4)
+            ])
+            task.cancel()
+            return results, ticks
+
+        results, ticks = asyncio.run(run())
+
+        assert results == [True] * 4
+        assert ticks > 5
+
+    def test_rejects_when_queue_full(self, monkeypatch):
+        """測試：等待中的工作達上限時回傳 503"""
+        monkeypatch.setattr(settings, "PASSWORD_HASH_MAX_PENDING", 1)
+
+        async def run():
+            return await asyncio.gather(
+                get_password_hash_async("TestPassword123!"),
+                get_password_hash_async("TestPassword123!"),
+                return_exceptions=True
+            )
+
+        first, second = asyncio.run(run())
+
+        assert first.startswith("$2b$")
+        assert isinstance(second, HTTPException)
+        assert second.status_code == 503
+
+
 class TestJWTTokens:
     """測試 JWT Token 功能"""
 
@@ -0,0 +1,96 @@
+"""
+Unit tests for single-flight request coalescing
+
+測試內容：
+1. 並行的相同鍵只執行一次
+2. 不同鍵各自執行
+3. 例外傳給所有等待者
+4. 所有等待者取消時一併取消工作
+"""
+import asyncio
+from app.services.single_flight import SingleFlight
+
+
+class TestSingleFlight:
+    """測試請求合併"""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """測試：並行相同鍵只執行一次"""
+        flight = SingleFlight("test")
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def run():
+            return await asyncio.gather(*[flight.do("key", work) for _ in range(5)])
+
+        results = asyncio.run(run())
+
+        assert results == ["result"] * 5
+        assert len(calls) == 1
+        assert flight.stats()['misses'] == 1
+        assert flight.stats()['coalesced'] == 4
+        assert flight.stats()['in_flight'] == 0
+
+    def test_different_keys_run_separately(self):
+        """測試：不同鍵各自執行"""
+        flight = SingleFlight("test")
+
+        async def run():
+            return await asyncio.gather(
+                flight.do("a", lambda: asyncio.sleep(0, result="a")),
+                flight.do("b", lambda: asyncio.sleep(0, result="b")),
+            )
+
+        assert asyncio.run(run()) == ["a", "b"]
+        assert flight.stats()['misses'] == 2
+
+    def test_exception_propagates_to_all_waiters(self):
+        """測試：例外傳給所有等待者，且之後可重新執行"""
+        flight = SingleFlight("test")
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def run():
+            return await asyncio.gather(
+                *[flight.do("key", fail) for _ in range(3)],
+                return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+
+        assert all(isinstance(r, ValueError) for r in results)
+        assert flight.stats()['in_flight'] == 0
+
+    def test_abandoned_work_is_cancelled(self):
+        """測試：cancel_abandoned 時，最後一個等待者取消才取消工作"""
+        flight = SingleFlight("test", cancel_abandoned=True)
+        state = {}
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                state['cancelled'] = True
+                raise
+
+        async def run():
+            first = asyncio.create_task(flight.do("key", work))
+            second = asyncio.create_task(flight.do("key", work))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            await asyncio.sleep(0.01)
+            state['after_first'] = state.get('cancelled', False)
+            second.cancel()
+            await asyncio.sleep(0.01)
+
+        asyncio.run(run())
+
+        assert state['after_first'] is False
+        assert state['cancelled'] is True
+        assert flight.stats()['abandoned'] == 1
@@ -0,0 +1,154 @@
+"""
+Unit tests for structured logging
+
+測試內容：
+1. text / json 格式輸出 request_id 與 extra 欄位
+2. DEBUG 記錄依 request_id 取樣 (同一請求全部保留或全部略過)
+3. 佇列已滿時丟棄記錄而不阻塞
+4. RequestIdMiddleware 沿用或產生 X-Request-ID
+"""
+import asyncio
+import io
+import json
+import logging
+import queue
+
+import pytest
+
+from app.core.structured_logging import (
+    DroppingQueueHandler,
+    JsonFormatter,
+    RequestContextFilter,
+    RequestIdMiddleware,
+    TextFormatter,
+    request_id_var,
+    setup_logging,
+    shutdown_logging,
+)
+
+
+def make_record(level=logging.INFO, msg="Backtest completed", **extra) -> logging.LogRecord:
+    record = logging.LogRecord("app.api.backtest", level, __file__, 1, msg, None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+@pytest.fixture
+def request_id():
+    token = request_id_var.set("req-1")
+    yield "req-1"
+    request_id_var.reset(token)
+
+
+class TestFormatters:
+    """測試輸出格式"""
+
+    def test_text_appends_fields(self, request_id):
+        """測試：text 格式在訊息後加上 request_id 與 key=value，含空白的值加引號"""
+        record = make_record(symbol="2330.TW", note="two words")
+        RequestContextFilter().filter(record)
+        line = TextFormatter().format(record)
+
+        assert line.endswith('Backtest completed request_id=req-1 symbol=2330.TW note="two words"')
+
+    def test_json_single_line(self, request_id):
+        """測試：json 格式為單行 JSON，包含等級、logger、request_id 與欄位"""
+        record = make_record(symbol="2330.TW", total_trades=18)
+        RequestContextFilter().filter(record)
+        entry = json.loads(JsonFormatter().format(record))
+
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "app.api.backtest"
+        assert entry["request_id"] == "req-1"
+        assert entry["symbol"] == "2330.TW" and entry["total_trades"] == 18
+
+
+class TestSampling:
+    """測試 DEBUG 取樣"""
+
+    def test_decided_per_request(self):
+        """測試：同一 request_id 的 DEBUG 記錄結果一致，INFO 以上與背景工作一律保留"""
+        sampler = RequestContextFilter(sample_rate=0.1)
+        kept = 0
+        for i in range(1000):
+            token = request_id_var.set(f"req-{i}")
+            try:
+                first = sampler.filter(make_record(logging.DEBUG))
+                assert sampler.filter(make_record(logging.DEBUG)) == first
+                assert sampler.filter(make_record(logging.INFO))
+                kept += first
+            finally:
+                request_id_var.reset(token)
+
+        assert 50 < kept < 150
+        assert sampler.sampled_out == 2 * (1000 - kept)
+        assert sampler.filter(make_record(logging.DEBUG))
+
+
+class TestQueueHandler:
+    """測試佇列 handler"""
+
+    def test_drops_when_full(self):
+        """測試：佇列已滿時丟棄並計數，不會阻塞"""
+        handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+        for _ in range(5):
+            handler.handle(make_record())
+
+        assert handler.queue.qsize() == 2
+        assert handler.dropped == 3
+
+    def test_listener_writes_in_background(self, request_id):
+        """測試：setup_logging 後的記錄由背景執行緒寫出，保留 extra 欄位與例外"""
+        stream = io.StringIO()
+        setup_logging(level="INFO", fmt="json", stream=stream)
+        try:
+            logger = logging.getLogger("test.structured")
+            logger.info("Saved %d rows", 3, extra={'symbol': '2330.TW'})
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("Save failed")
+        finally:
+            shutdown_logging()
+            setup_logging()
+
+        saved, failed = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert saved["message"] == "Saved 3 rows"
+        assert saved["symbol"] == "2330.TW" and saved["request_id"] == "req-1"
+        assert failed["level"] == "ERROR"
+        assert "ValueError: boom" in failed["exception"]
+
+
+class TestRequestIdMiddleware:
+    """測試請求 ID 中介層"""
+
+    def call(self, headers):
+        seen = {}
+
+        async def app(scope, receive, send):
+            seen["request_id"] = request_id_var.get()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "headers": headers}
+        asyncio.run(RequestIdMiddleware(app)(scope, None, send))
+        response_headers = dict(sent[0]["headers"])
+        return seen["request_id"], response_headers[b"x-request-id"].decode()
+
+    def test_reuses_incoming_header(self):
+        """測試：沿用用戶端傳入的 X-Request-ID 並在回應中帶回"""
+        assert self.call([(b"x-request-id", b"abc-123")]) == ("abc-123", "abc-123")
+
+    def test_generates_when_missing_or_invalid(self):
+        """測試：未提供或格式不合理時產生新的 ID"""
+        generated, echoed = self.call([])
+        assert len(generated) == 16 and generated == echoed
+
+        generated, _ = self.call([(b"x-request-id", b"bad id\nforged")])
+        assert generated != "bad id\nforged" and len(generated) == 16
+        assert request_id_var.get() is None
@@ -0,0 +1,168 @@
+"""
+Unit tests for TWSE trading calendar
+
+測試內容：
+1. 週末與休市日判斷
+2. 交易日序號與交易日加減
+3. 向量化交易日數計算
+4. 缺漏偵測與手動加入颱風休市
+5. 休市日資料涵蓋範圍之前的資料充足判斷
+"""
+import pytest
+from datetime import date, datetime
+import pandas as pd
+from app.api.backtest import has_price_coverage
+from app.services.trading_calendar import TradingCalendar, TAIPEI_TZ, get_trading_calendar
+
+
+@pytest.fixture
+def calendar():
+    """2024 年 10 月含國慶日的交易日曆"""
+    return TradingCalendar(
+        {date(2024, 10, 10): "國慶日"},
+        first_day=date(2024, 1, 1),
+        last_day=date(2024, 12, 31)
+    )
+
+
+class TestSessions:
+    """測試交易日判斷"""
+
+    def test_weekend_and_holiday_are_closed(self, calendar):
+        """測試：週末與國定假日不是交易日"""
+        assert calendar.is_session("2024-10-09") is True
+        assert calendar.is_session("2024-10-10") is False
+        assert calendar.is_session("2024-10-12") is False
+
+    def test_session_index_is_consecutive(self, calendar):
+        """測試：休市日前後的交易日序號連續"""
+        before = calendar.session_index("2024-10-09")
+        after = calendar.session_index("2024-10-11")
+
+        assert after == before + 1
+        assert calendar.session_index("2024-10-10") is None
+
+    def test_offset_skips_closures(self, calendar):
+        """測試：交易日加減跳過休市日"""
+        assert calendar.offset("2024-10-09", 1) == date(2024, 10, 11)
+        assert calendar.warmup_start("2024-10-14", 3) == date(2024, 10, 8)
+
+
+class TestCounting:
+    """測試交易日數計算"""
+
+    def test_count_sessions_inclusive(self, calendar):
+        """測試：區間含頭尾"""
+        assert calendar.count_sessions("2024-10-07", "2024-10-11") == 4
+
+    def test_count_sessions_vectorized(self, calendar):
+        """測試：多個區間一次計算"""
+        counts = calendar.count_sessions(
+            ["2024-10-07", "2024-10-14"],
+            ["2024-10-11", "2024-10-18"]
+        )
+
+        assert counts.tolist() == [4, 5]
+
+    def test_missing_sessions(self, calendar):
+        """測試：偵測缺漏的交易日（休市日不算缺漏）"""
+        missing = calendar.missing_sessions(
+            ["2024-10-07", "2024-10-09"], "2024-10-07", "2024-10-11"
+        )
+
+        assert missing.tolist() == [date(2024, 10, 8), date(2024, 10, 11)]
+
+
+class TestClosures:
+    """測試臨時休市與收盤判斷"""
+
+    def test_add_typhoon_closure(self, calendar):
+        """測試：手動加入颱風休市後重建索引"""
+        calendar.add_closure("2024-10-31", "颱風停止交易")
+
+        assert calendar.is_session("2024-10-31") is False
+        assert calendar.count_sessions("2024-10-28", "2024-11-01") == 4
+
+    def test_last_completed_session(self, calendar):
+        """測試：盤中時最近已收盤交易日為前一個交易日"""
+        during = datetime(2024, 10, 11, 10, 0, tzinfo=TAIPEI_TZ)
+        after = datetime(2024, 10, 11, 14, 0, tzinfo=TAIPEI_TZ)
+
+        assert calendar.last_completed_session(during) == date(2024, 10, 9)
+        assert calendar.last_completed_session(after) == date(2024, 10, 11)
+        assert calendar.is_market_open(during) is True
+
+
+# 2019 年證交所休市的平日 (元旦、春節、和平紀念日、兒童節、勞動節、端午、中秋、國慶)
+TWSE_2019_CLOSED_WEEKDAYS = [
+    "2019-01-01", "2019-01-31", "2019-02-01", "2019-02-04", "2019-02-05", "2019-02-06",
+    "2019-02-07", "2019-02-08", "2019-02-28", "2019-03-01", "2019-04-04", "2019-04-05",
+    "2019-05-01", "2019-06-07", "2019-09-13", "2019-10-10", "2019-10-11",
+]
+
+
+def twse_2019_frame() -> pd.DataFrame:
+    """2019 年實際交易日的日 K (只有 date 欄位)"""
+    weekdays = pd.bdate_range("2019-01-01", "2019-12-31").strftime("%Y-%m-%d")
+    return pd.DataFrame({'date': [d for d in weekdays if d not in TWSE_2019_CLOSED_WEEKDAYS]})
+
+
+def pre_coverage_frame(start_year: int, end_year: int) -> pd.DataFrame:
+    """多個年份的日 K (只有 date 欄位)，每年休市的平日與 2019 年相同月日"""
+    closed = {d[5:] for d in TWSE_2019_CLOSED_WEEKDAYS}
+    weekdays = pd.bdate_range(f"{start_year}-01-01", f"{end_year}-12-31").strftime("%Y-%m-%d")
+    return pd.DataFrame({'date': [d for d in weekdays if d[5:] not in closed]})
+
+
+class TestCoverage:
+    """測試休市日資料涵蓋範圍"""
+
+    def test_first_day_defaults_to_first_holiday_year(self):
+        """測試：first_day 預設為休市日資料最早的年份"""
+        calendar = TradingCalendar({date(2023, 1, 2): "元旦補假", date(2024, 10, 10): "國慶日"})
+
+        assert calendar.first_day == date(2023, 1, 1)
+        assert calendar.is_covered("2023-06-01") is True
+        assert calendar.is_covered("2019-06-01") is False
+
+    def test_real_pre_coverage_year_is_sufficient(self):
+        """測試：內建休市檔之前的年份，完整的實際交易日資料不會被判定為不足"""
+        calendar = get_trading_calendar()
+        df = twse_2019_frame()
+
+        assert not calendar.is_covered("2019-01-01")
+        # 沒有休市日資料時平日數多於實際交易日數，依比例檢查一定判定不足
+        assert len(df) == 244
+        assert len(df) < calendar.count_sessions("2019-01-01", "2019-12-31") * 0.95
+        assert has_price_coverage(df, "2019-01-01", "2019-12-31") is True
+
+    def test_empty_pre_coverage_range_is_insufficient(self):
+        """測試：跨越涵蓋範圍時，較早的部分沒有資料仍判定不足"""
+        calendar = get_trading_calendar()
+        covered = pd.Series(calendar.sessions_in_range("2023-01-01", "2023-12-31")).dt.strftime("%Y-%m-%d")
+        df = pd.DataFrame({'date': covered})
+
+        assert has_price_coverage(df, "2023-01-01", "2023-12-31") is True
+        assert has_price_coverage(df, "2019-01-01", "2023-12-31") is False
+        assert has_price_coverage(pd.concat([twse_2019_frame(), df]), "2019-01-01", "2019-12-31") is True
+        assert has_price_coverage(pd.concat([twse_2019_frame(), df]), "2019-01-01", "2023-12-31") is False
+        assert has_price_coverage(pd.concat([pre_coverage_frame(2019, 2022), df]), "2019-01-01", "2023-12-31") is True
+
+    def test_multi_year_pre_coverage_range(self):
+        """測試：多年的早期區間只有少數幾筆時判定不足，完整的交易日資料則足夠"""
+        full = pre_coverage_frame(2015, 2022)
+
+        assert has_price_coverage(full, "2015-01-01", "2022-12-31") is True
+        assert has_price_coverage(full.head(30), "2015-01-01", "2022-12-31") is False
+        assert has_price_coverage(full.tail(30), "2015-01-01", "2022-12-31") is False
+        # 缺少其中一整年
+        missing_year = full[~full['date'].str.startswith("2018")]
+        assert has_price_coverage(missing_year, "2015-01-01", "2022-12-31") is False
+
+    def test_short_pre_coverage_range_with_long_holiday(self):
+        """測試：包含農曆春節連續休市的短區間不會被判定為不足"""
+        df = twse_2019_frame()
+        february = df[df['date'].between("2019-01-28", "2019-02-15")]
+
+        assert has_price_coverage(february, "2019-01-28", "2019-02-15") is True
+        assert has_price_coverage(february.head(3), "2019-01-28", "2019-02-15") is False
@@ -0,0 +1,65 @@
+"""
+Unit tests for the authenticated user cache
+
+測試內容：
+1. 命中 / 未命中與 TTL 到期
+2. 失效後移除，失效前讀到的資料不會寫回
+3. 超過容量時淘汰最久未使用的項目
+"""
+import time
+
+from app.services.user_cache import UserCache
+
+USER = {'id': 1, 'username': 'alice', 'is_active': True}
+
+
+class TestUserCache:
+    """測試用戶快取"""
+
+    def test_hit_and_miss(self):
+        """測試：寫入後命中，未寫入的用戶未命中"""
+        cache = UserCache(ttl=30)
+        cache.put('alice', USER, cache.version())
+
+        assert cache.get('alice') == USER
+        assert cache.get('bob') is None
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+
+    def test_entry_expires(self):
+        """測試：超過 TTL 後未命中"""
+        cache = UserCache(ttl=0.05)
+        cache.put('alice', USER, cache.version())
+        time.sleep(0.1)
+
+        assert cache.get('alice') is None
+
+    def test_invalidate_removes_entry(self):
+        """測試：失效後需重新查詢"""
+        cache = UserCache(ttl=30)
+        cache.put('alice', USER, cache.version())
+        cache.invalidate('alice')
+
+        assert cache.get('alice') is None
+        assert cache.stats()['invalidations'] == 1
+
+    def test_put_skipped_after_concurrent_invalidation(self):
+        """測試：查詢期間發生失效時，查詢結果不寫入快取"""
+        cache = UserCache(ttl=30)
+        version = cache.version()
+        cache.invalidate('alice')  # 例如查詢進行中用戶被停用
+        cache.put('alice', USER, version)
+
+        assert cache.get('alice') is None
+
+    def test_evicts_least_recently_used(self):
+        """測試：超過容量時淘汰最久未使用的用戶"""
+        cache = UserCache(ttl=30, max_entries=2)
+        cache.put('alice', USER, cache.version())
+        cache.put('bob', USER, cache.version())
+        cache.get('alice')
+        cache.put('carol', USER, cache.version())
+
+        assert cache.get('bob') is None
+        assert cache.get('alice') is not None
+        assert cache.stats()['size'] == 2